@@ -4,14 +4,27 @@ __version__ = "0.1.3"
 
 # 核心组件
 from smart_agents.core.config import Config
-from smart_agents.core.llm import SmartAgentLLM
+from smart_agents.core.llm import SmartAgentLLM, AsyncSmartAgentLLM
 from smart_agents.core.message import Message
+from smart_agents.core.client_pool import ClientPool, global_client_pool
+from smart_agents.core.cache import LLMCache
+from smart_agents.core.semantic_cache import SemanticCache
+from smart_agents.core.singleflight import SingleFlight
+from smart_agents.core.batching import MicroBatcher
+from smart_agents.core.llm_pool import PooledLLM
+from smart_agents.core.resilience import RetryPolicy, HedgePolicy
+from smart_agents.core.rate_limit import RateLimiter
+from smart_agents.core.circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_states
+from smart_agents.core.tokenizer import Tokenizer, ContextBudget, get_tokenizer
+from smart_agents.core.history import HistoryPolicy
 
 # Agent实现
 from smart_agents.agents.simple_agent import SimpleAgent
 from smart_agents.agents.react_agent import ReActAgent
-from smart_agents.agents.reflection_agent import ReflectionAgent
-from smart_agents.agents.plan_solve_agent import PlanAndSolveAgent
+from smart_agents.agents.reflection_agent import ReflectionAgent, ConvergenceDetector
+from smart_agents.agents.plan_solve_agent import PlanAndSolveAgent, PlanCache
+from smart_agents.agents.function_call_agent import FunctionCallAgent
+from smart_agents.agents.tot_agent import TreeOfThoughtsAgent
 
 # 工具实现
 from .tools.registry import ToolRegistry, global_registry
@@ -28,13 +41,35 @@ __all__ = [
     # 核心组件
     "Config",
     "SmartAgentLLM",
+    "AsyncSmartAgentLLM",
     "Message",
+    "ClientPool",
+    "global_client_pool",
+    "LLMCache",
+    "SemanticCache",
+    "SingleFlight",
+    "MicroBatcher",
+    "PooledLLM",
+    "RetryPolicy",
+    "HedgePolicy",
+    "RateLimiter",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "get_circuit_states",
+    "Tokenizer",
+    "ContextBudget",
+    "get_tokenizer",
+    "HistoryPolicy",
 
     # Agent 范式
     "SimpleAgent",
     "ReActAgent",
     "ReflectionAgent",
+    "ConvergenceDetector",
     "PlanAndSolveAgent",
+    "PlanCache",
+    "FunctionCallAgent",
+    "TreeOfThoughtsAgent",
 
     # 工具系统
     "ToolRegistry",
@@ -2,12 +2,18 @@
 
 from .simple_agent import SimpleAgent
 from .react_agent import ReActAgent
-from .plan_solve_agent import PlanAndSolveAgent
-from .reflection_agent import ReflectionAgent
+from .plan_solve_agent import PlanAndSolveAgent, PlanCache
+from .reflection_agent import ReflectionAgent, ConvergenceDetector
+from .function_call_agent import FunctionCallAgent
+from .tot_agent import TreeOfThoughtsAgent
 
 __all__ = [
     "SimpleAgent",
     "ReActAgent",
     "PlanAndSolveAgent",
-    "ReflectionAgent"
+    "PlanCache",
+    "ReflectionAgent",
+    "ConvergenceDetector",
+    "FunctionCallAgent",
+    "TreeOfThoughtsAgent"
 ]
\ No newline at end of file
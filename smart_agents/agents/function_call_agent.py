@@ -0,0 +1,163 @@
+"""FunctionCall Agent实现 - 基于OpenAI原生 function calling 的工具调用智能体"""
+
+import json
+import logging
+import concurrent.futures
+from typing import Any
+
+from ..core.agent import Agent
+from ..core.llm import SmartAgentLLM
+from ..core.config import Config
+from ..core.message import Message
+from ..tools.registry import ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class FunctionCallAgent(Agent):
+    """
+    FunctionCall Agent - 使用原生 function calling 调用工具
+
+    与基于文本协议（[TOOL_CALL:...]、tool[input]）的 Agent 相比：
+    1. 工具以 JSON Schema 传给模型，无需在提示词中描述调用格式
+    2. 参数为结构化 JSON，不存在文本解析失败
+    3. 模型一轮返回的多个 tool_calls 会并行执行
+    """
+    def __init__(
+        self,
+        name: str,
+        llm: SmartAgentLLM,
+        tool_registry: ToolRegistry | None = None,
+        system_prompt: str | None = None,
+        config: Config | None = None,
+        max_tool_iterations: int = 5,
+        max_workers: int = 4,
+        tool_choice: str | dict[str, Any] = "auto",
+    ):
+        """
+        初始化FunctionCallAgent
+
+        Args:
+            name: Agent名称
+            llm: LLM实例
+            tool_registry: 工具注册表
+            system_prompt: 系统提示词
+            config: 配置对象
+            max_tool_iterations: 最多进行多少轮工具调用
+            max_workers: 同一轮中并行执行工具调用的线程数
+            tool_choice: 传给模型的 tool_choice 参数
+        """
+        super().__init__(name, llm, system_prompt, config)
+        self.tool_registry = tool_registry if tool_registry is not None else ToolRegistry()
+        self.max_tool_iterations = max_tool_iterations
+        self.max_workers = max_workers
+        self.tool_choice = tool_choice
+
+    def add_tool(self, tool):
+        """添加工具到工具注册表"""
+        self.tool_registry.register_tool(tool)
+
+    def run(self, input_text: str, **kwargs) -> str:
+        """运行Agent，返回最终回答"""
+        return self.run_structured(input_text, **kwargs)["content"]
+
+    def run_structured(self, input_text: str, **kwargs) -> dict[str, Any]:
+        """
+        运行Agent，返回结构化结果
+
+        Returns:
+            dict: content（最终回答）、tool_calls（每次工具调用的名称、参数、结果与状态）、
+                iterations（工具调用轮数）
+        """
+        print(f"\n🤖 {self.name} 开始处理问题: {input_text}")
+
+        messages: list[dict[str, Any]] = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        for msg in self._history:
+            messages.append({"role": msg.role, "content": msg.content})
+        messages.append({"role": "user", "content": input_text})
+
+        tools = self.tool_registry.get_openai_tools()
+        records: list[dict[str, Any]] = []
+        content = ""
+        iterations = 0
+
+        while True:
+            if not tools:
+                content = self.llm.invoke(messages, **kwargs) or ""
+                break
+
+            # 达到最大轮数后禁止继续调用工具，要求模型给出回答
+            tool_choice = self.tool_choice if iterations < self.max_tool_iterations else "none"
+            message = self.llm.invoke_with_tools(messages, tools, tool_choice, **kwargs)
+            tool_calls = message.tool_calls or []
+            if not tool_calls:
+                content = message.content or ""
+                break
+            if iterations >= self.max_tool_iterations:
+                # 部分服务端会忽略 tool_choice="none"，此时不再执行工具，直接结束
+                logger.warning("%s 已达到最大工具调用轮数 %d，模型仍请求调用工具，停止执行", self.name, self.max_tool_iterations)
+                content = message.content or f"错误：已达到最大工具调用轮数（{self.max_tool_iterations}），未能得到最终回答"
+                break
+
+            iterations += 1
+            logger.info("第 %d 轮工具调用（%d 个）", iterations, len(tool_calls))
+            messages.append({
+                "role": "assistant",
+                "content": message.content or "",
+                "tool_calls": [
+                    {
+                        "id": call.id,
+                        "type": "function",
+                        "function": {"name": call.function.name, "arguments": call.function.arguments},
+                    }
+                    for call in tool_calls
+                ],
+            })
+
+            results = self._execute_tool_calls(tool_calls)
+            for result in results:
+                messages.append({"role": "tool", "tool_call_id": result["id"], "content": result["result"]})
+            records.extend(results)
+
+        print(f"🎉 最终答案: {content}")
+        self.add_message(Message(input_text, "user"))
+        self.add_message(Message(content, "assistant"))
+
+        return {"content": content, "tool_calls": records, "iterations": iterations}
+
+    def _execute_tool_calls(self, tool_calls: list[Any]) -> list[dict[str, Any]]:
+        """并行执行同一轮的全部工具调用，结果顺序与调用顺序一致"""
+        if len(tool_calls) == 1:
+            return [self._execute_tool_call(tool_calls[0])]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(tool_calls))) as executor:
+            return list(executor.map(self._execute_tool_call, tool_calls))
+
+    def _execute_tool_call(self, call: Any) -> dict[str, Any]:
+        """执行单个工具调用"""
+        name = call.function.name
+        try:
+            arguments = json.loads(call.function.arguments or "{}")
+            if not isinstance(arguments, dict):
+                raise ValueError("参数必须是JSON对象")
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"❌ 工具 '{name}' 参数解析失败: {e}")
+            return {
+                "id": call.id,
+                "name": name,
+                "arguments": call.function.arguments,
+                "result": f"错误：参数解析失败: {e}",
+                "status": "error",
+            }
+
+        print(f"🎬 行动: {name}({arguments})")
+        result = self.tool_registry.execute_tool_call(name, arguments)
+        print(f"👀 观察: {result}")
+        return {
+            "id": call.id,
+            "name": name,
+            "arguments": arguments,
+            "result": str(result),
+            "status": "error" if str(result).startswith("错误") else "success",
+        }
@@ -1,28 +1,40 @@
 """Plan and Solve Agent实现 - 分解规划与逐步执行的智能体"""
 
+import re
 import ast
+import json
+import queue
+import threading
+import concurrent.futures
+from typing import Any, Iterable, Iterator
 from ..core.agent import Agent
 from ..core.agent import SmartAgentLLM
 from ..core.config import Config
+from ..core.message import Message
+from ..core.cache import LLMCache, make_cache_key
+from ..core.semantic_cache import SemanticCache
 
 # 默认规划器提示词模板
 DEFAULT_PLANNER_PROMPT = """
 你是一个顶级的AI规划专家。你的任务是将用户提出的复杂问题拆解为一个由多个简单步骤组成的行动计划。
-请确保计划中的每个步骤都是一个独立的、可执行的子任务，并且严格按照逻辑顺序排列。
-你的输出必须是一个Python列表，其中每个元素都是一个描述子任务的字符串。
+请确保计划中的每个步骤都是一个独立的、可执行的子任务，并明确写出它依赖哪些前序步骤的结果：
+互不依赖的步骤会被并行执行，每个步骤执行时只能看到其依赖步骤的结果。
+你的输出必须是一个Python列表，其中每个元素都是一个字典，包含 id（从1开始的整数）、step（子任务描述）、
+deps（依赖的前序步骤 id 列表，没有依赖时为空列表，只能引用排在它前面的步骤）。
+最后一个步骤负责汇总并给出问题的最终答案。
 
 问题：{question}
 
 请严格按照以下格式输出你的计划：
 ```python
-["步骤1", "步骤2", "步骤3", ...]
+[{{"id": 1, "step": "步骤1", "deps": []}}, {{"id": 2, "step": "步骤2", "deps": []}}, {{"id": 3, "step": "步骤3", "deps": [1, 2]}}, ...]
 ```
 """
 
 # 默认执行器提示词模板
 DEFAULT_EXECUTOR_PROMPT = """
 你是一位顶级的AI执行专家。你的任务是严格按照给定的计划，一步步地解决问题。
-你将收到原始问题、完整的计划、以及到目前为止已经完成的步骤和结果。
+你将收到原始问题、完整的计划、以及当前步骤所依赖的步骤和结果。
 请你专注于解决"当前步骤",并仅输出该步骤的最终答案，不要输出任何额外的解释或对话。
 
 # 原始问题:
@@ -31,7 +43,7 @@ DEFAULT_EXECUTOR_PROMPT = """
 # 完整计划:
 {plan}
 
-# 历史步骤与结果
+# 依赖步骤与结果
 {history}
 
 # 当前步骤
@@ -40,59 +52,491 @@ DEFAULT_EXECUTOR_PROMPT = """
 请仅输出针对"当前步骤"的回答：
 """
 
+# 模板槽位：引号/书名号内的内容、数字、中文问题中的英文词（通常是实体名）
+SLOT_PATTERN = re.compile(
+    r"“[^”]+”|\"[^\"]+\"|'[^']+'|《[^》]+》|\d+(?:\.\d+)?%?|[A-Za-z][A-Za-z0-9_.+#-]*"
+)
+CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]")
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题文本：统一大小写与空白，去掉结尾标点"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?？。.!！ ")
+
+
+def extract_slots(question: str) -> tuple[str, list[str]]:
+    """
+    将问题中的实体替换为槽位，返回 (问题模板, 槽位取值)
+
+    中文问题中的英文词视为实体；纯英文问题只把引号内容与数字视为实体，
+    避免整句都被替换。
+    """
+    has_cjk = bool(CJK_PATTERN.search(question))
+    values: list[str] = []
+
+    def replace(match: re.Match) -> str:
+        text = match.group(0)
+        if text[0].isalpha() and not has_cjk:
+            return text
+        values.append(text)
+        return f"{{slot{len(values) - 1}}}"
+
+    template = SLOT_PATTERN.sub(replace, question)
+    return normalize_question(template), values
+
+
+class PlanCache:
+    """
+    计划缓存 - 结构相同的问题直接复用已生成的计划
+
+    - 精确匹配：按槽位化、规范化后的问题模板查找，计划中的实体按新问题的槽位取值替换
+    - 相似匹配：可选，使用本地向量化（HashingEmbedder）查找最相近的问题模板
+    - 持久化：底层为 LLMCache，内存 LRU + 可选 SQLite 磁盘层，条目带 TTL
+    """
+    NAMESPACE = "plans"
+
+    def __init__(
+        self,
+        disk_path: str | None = None,
+        max_entries: int = 1024,
+        ttl: float | None = 7 * 24 * 3600,
+        disk_max_entries: int = 10_000,
+        similarity_threshold: float | None = None,
+        use_slots: bool = True,
+    ):
+        """
+        Args:
+            disk_path: SQLite 文件路径，None 表示只使用内存
+            max_entries: 内存中最多缓存的计划数
+            ttl: 计划有效期（秒），None 表示永不过期
+            disk_max_entries: 磁盘中最多缓存的计划数
+            similarity_threshold: 相似匹配的最小余弦相似度，None 表示只做精确匹配
+            use_slots: 是否将问题中的实体替换为槽位后再匹配
+        """
+        self.store = LLMCache(
+            max_entries=max_entries,
+            max_bytes=None,
+            ttl=ttl,
+            disk_path=disk_path,
+            disk_max_entries=disk_max_entries,
+        )
+        self.semantic = (
+            SemanticCache(threshold=similarity_threshold, max_entries_per_namespace=max_entries, ttl=ttl)
+            if similarity_threshold is not None else None
+        )
+        self.use_slots = use_slots
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _template(self, question: str) -> tuple[str, list[str]]:
+        if self.use_slots:
+            return extract_slots(question)
+        return normalize_question(question), []
+
+    @staticmethod
+    def _key(template: str) -> str:
+        return make_cache_key({"plan_template": template})
+
+    def get(self, question: str) -> list[dict[str, Any]] | None:
+        """查找可复用的计划，未命中返回 None"""
+        template, values = self._template(question)
+        entry = self.store.get(self._key(template))
+        similar = False
+        if entry is None and self.semantic is not None:
+            match = self.semantic.lookup(self.NAMESPACE, template)
+            if match is not None:
+                entry = self.store.get(match[0])
+                similar = entry is not None
+
+        if entry is not None:
+            data = json.loads(entry)
+            if data["slots"] == len(values):
+                if similar:
+                    self.similar_hits += 1
+                else:
+                    self.hits += 1
+                return [self._fill(step, values) for step in data["plan"]]
+
+        self.misses += 1
+        return None
+
+    def set(self, question: str, plan: list[dict[str, Any]]):
+        """缓存计划，步骤描述中出现的实体替换为槽位"""
+        if not plan:
+            return
+        template, values = self._template(question)
+        key = self._key(template)
+        entry = json.dumps(
+            {"slots": len(values), "plan": [self._templatize(step, values) for step in plan]},
+            ensure_ascii=False,
+        )
+        self.store.set(key, entry)
+        if self.semantic is not None:
+            self.semantic.add(self.NAMESPACE, template, key)
+
+    @staticmethod
+    def _templatize(step: dict[str, Any], values: list[str]) -> dict[str, Any]:
+        text = step["step"]
+        # 长的取值优先替换，避免短取值破坏长取值
+        for index in sorted(range(len(values)), key=lambda i: -len(values[i])):
+            value = values[index]
+            pattern = rf"(?<![A-Za-z0-9_.]){re.escape(value)}(?![A-Za-z0-9_.])" if value[0].isalnum() else re.escape(value)
+            text = re.sub(pattern, f"{{slot{index}}}", text)
+        return {**step, "step": text}
+
+    @staticmethod
+    def _fill(step: dict[str, Any], values: list[str]) -> dict[str, Any]:
+        text = step["step"]
+        for index, value in enumerate(values):
+            text = text.replace(f"{{slot{index}}}", value)
+        return {**step, "step": text}
+
+    def stats(self) -> dict[str, Any]:
+        """返回计划缓存统计"""
+        total = self.hits + self.similar_hits + self.misses
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.similar_hits) / total if total else 0.0,
+            "store": self.store.stats(),
+        }
+
+    def clear(self):
+        """清空所有缓存的计划"""
+        self.store.clear()
+        if self.semantic is not None:
+            self.semantic.clear()
+
+    def close(self):
+        """关闭磁盘连接"""
+        self.store.close()
+
+
 class Planner:
     """规划器 - 负责将复杂问题拆解成简单问题"""
-    def __init__(self, llm_client: SmartAgentLLM, prompt_template: str | None = None):
+    def __init__(self, llm_client: SmartAgentLLM, prompt_template: str | None = None, plan_cache: PlanCache | None = None):
         self.llm_client = llm_client
         self.prompt_template = prompt_template if prompt_template else DEFAULT_PLANNER_PROMPT
+        self.plan_cache = plan_cache
+
+    def _cached_plan(self, question: str) -> list[dict[str, Any]] | None:
+        if self.plan_cache is None:
+            return None
+        plan = self.plan_cache.get(question)
+        if plan is not None:
+            print(f"⚡ 命中计划缓存，跳过规划: {[step['step'] for step in plan]}")
+        return plan
+
+    def plan(self, question: str, **kwargs) -> list[dict[str, Any]]:
+        """生成执行计划，返回带依赖关系的步骤列表"""
+        cached = self._cached_plan(question)
+        if cached is not None:
+            return cached
 
-    def plan(self, question: str, **kwargs) -> list[str]:
-        """生成执行计划"""
         prompt = self.prompt_template.format(question = question)
         messages = [{"role": "user", "content": prompt}]
 
         print(f"--- 正在生成计划 ---")
         response_text = self.llm_client.invoke(messages, **kwargs)
         print(f"✅ 计划已生成: \n{response_text}")
+        plan = self._parse_plan(response_text)
+        if self.plan_cache is not None:
+            self.plan_cache.set(question, plan)
+        return plan
+
+    def plan_stream(self, question: str, **kwargs) -> Iterator[dict[str, Any]]:
+        """
+        流式生成执行计划，每个步骤在列表元素闭合时立即产出，执行器可以边规划边执行
+
+        流式解析失败（如输出没有按格式给出代码块）时，在生成结束后回退为完整解析
+        """
+        cached = self._cached_plan(question)
+        if cached is not None:
+            yield from cached
+            return
+
+        prompt = self.prompt_template.format(question = question)
+        messages = [{"role": "user", "content": prompt}]
+
+        print(f"--- 正在流式生成计划 ---")
+        parser = StreamingPlanParser()
+        response_text = ""
+        produced = 0
+        for chunk in self.llm_client.stream_invoke(messages, **kwargs):
+            response_text += chunk
+            for step in parser.feed(chunk):
+                produced += 1
+                print(f"📋 计划步骤 {step['id']}: {step['step']}")
+                yield step
+        print(f"✅ 计划已生成: \n{response_text}")
+
+        if produced:
+            if not parser.finished:
+                print("⚠️ 计划输出不完整，仅执行已解析的步骤")
+            elif self.plan_cache is not None:
+                self.plan_cache.set(question, parser.steps)
+            return
+
+        plan = self._parse_plan(response_text)
+        if self.plan_cache is not None:
+            self.plan_cache.set(question, plan)
+        yield from plan
 
+    def _parse_plan(self, response_text: str) -> list[dict[str, Any]]:
+        """从完整的LLM输出中解析计划"""
         try:
             # 提取结果中的代码块
-            plan_str = response_text.split("```python")[1].split("```")[0].strip()
+            if "```python" in response_text:
+                plan_str = response_text.split("```python")[1].split("```")[0].strip()
+            else:
+                plan_str = response_text[response_text.index("["):response_text.rindex("]") + 1]
             plan = ast.literal_eval(plan_str)
-            return plan if isinstance(plan, list) else []
+            return normalize_plan(plan) if isinstance(plan, list) else []
         
         except Exception as e:
             print(f"❌ 解析计划时发生未知错误: {e}")
             return []
 
+
+class StreamingPlanParser:
+    """
+    增量计划解析器
+
+    跟踪代码块中顶层列表的括号深度与字符串状态，列表元素一闭合就解析并返回，
+    无法解析的元素被跳过，不影响后续步骤。
+    """
+    OPEN_BRACKETS = "[{("
+    CLOSE_BRACKETS = "]})"
+
+    def __init__(self):
+        self.text = ""
+        self.steps: list[dict[str, Any]] = []
+        self.finished = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._quote: str | None = None
+        self._escape = False
+        self._element_start = 0
+        self._element_done = False
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        """追加一段输出，返回新闭合的步骤"""
+        self.text += chunk
+        completed: list[dict[str, Any]] = []
+        if self.finished:
+            return completed
+        if not self._started and not self._find_start():
+            return completed
+
+        while self._pos < len(self.text) and not self.finished:
+            i = self._pos
+            char = self.text[i]
+            self._pos += 1
+
+            if self._quote is not None:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == self._quote:
+                    self._quote = None
+                    if self._depth == 1:
+                        self._complete(i + 1, completed)
+            elif char in "\"'":
+                self._quote = char
+            elif char in self.OPEN_BRACKETS:
+                self._depth += 1
+            elif char in self.CLOSE_BRACKETS:
+                self._depth -= 1
+                if self._depth == 1:
+                    self._complete(i + 1, completed)
+                elif self._depth == 0:
+                    self._complete(i, completed)
+                    self.finished = True
+            elif char == "," and self._depth == 1:
+                self._complete(i, completed)
+                self._element_start = i + 1
+                self._element_done = False
+        return completed
+
+    def _find_start(self) -> bool:
+        """定位代码块中列表的起始位置"""
+        fence = self.text.find("```")
+        if fence == -1:
+            return False
+        start = self.text.find("[", fence)
+        if start == -1:
+            return False
+        self._started = True
+        self._depth = 1
+        self._pos = start + 1
+        self._element_start = start + 1
+        return True
+
+    def _complete(self, end: int, completed: list[dict[str, Any]]):
+        """解析 [_element_start, end) 范围内的元素，每个元素只解析一次"""
+        if self._element_done:
+            return
+        element_text = self.text[self._element_start:end].strip()
+        if not element_text:
+            return
+        self._element_done = True
+        try:
+            item = ast.literal_eval(element_text)
+        except Exception as e:
+            print(f"⚠️ 跳过无法解析的计划步骤: {element_text} ({e})")
+            return
+        step = normalize_step(item, self.steps)
+        if step is not None:
+            self.steps.append(step)
+            completed.append(step)
+
+
+def normalize_plan(raw_plan: list[Any]) -> list[dict[str, Any]]:
+    """
+    将规划结果整理为 {"id", "step", "deps"} 形式的步骤列表
+
+    - 字符串元素（旧格式）依赖其前面的全部步骤，保持顺序执行的语义
+    - 依赖只保留排在当前步骤之前的 id，因此计划一定是无环的
+    """
+    steps: list[dict[str, Any]] = []
+    for item in raw_plan:
+        step = normalize_step(item, steps)
+        if step is not None:
+            steps.append(step)
+    return steps
+
+
+def normalize_step(item: Any, previous: list[dict[str, Any]]) -> dict[str, Any] | None:
+    """整理单个步骤，previous 为之前已整理的步骤"""
+    seen = [step["id"] for step in previous]
+    if isinstance(item, str):
+        return {"id": max(seen, default=0) + 1, "step": item, "deps": seen}
+    if not isinstance(item, dict):
+        return None
+
+    description = item.get("step") or item.get("task") or item.get("description")
+    if not description:
+        return None
+    step_id = item.get("id")
+    if not isinstance(step_id, int) or step_id in seen:
+        step_id = max(seen, default=0) + 1
+    deps = item.get("deps") or item.get("dependencies") or []
+    if not isinstance(deps, (list, tuple)):
+        deps = [deps]
+    return {"id": step_id, "step": str(description), "deps": [dep for dep in dict.fromkeys(deps) if dep in seen]}
+
+
 class Executor:
-    """执行器 - 负责按照步骤执行"""
-    def __init__(self, llm_client: SmartAgentLLM, prompt_template: str | None = None):
+    """执行器 - 按照依赖关系调度步骤，互不依赖的步骤并行执行"""
+    def __init__(self, llm_client: SmartAgentLLM, prompt_template: str | None = None, max_workers: int = 4):
         self.llm_client = llm_client
         self.prompt_template = prompt_template if prompt_template else DEFAULT_EXECUTOR_PROMPT
+        self.max_workers = max_workers
 
-    def execute(self, question: str, plan: list[str], **kwargs) -> str:
-        history = ""
-        final_answer = ""
-
+    def execute(self, question: str, plan: list[dict[str, Any]], **kwargs) -> str:
         print("\n--- 正在执行计划 ---")
-        for i, step in enumerate(plan, 1):
-            print(f"\n 正在执行步骤 {i}/{len(plan)}: {step}")
-            prompt = self.prompt_template.format(
-                question = question,
-                plan = plan,
-                history = history,
-                current_step = step
-            )
-            messages = [{"role": "user", "content": prompt}]
-
-            response_text = self.llm_client.invoke(messages, **kwargs) or ""
-
-            history += f"步骤 {i}: {step}\n结果: {response_text}\n\n"
-            final_answer = response_text
-            print(f"✅ 步骤 {i} 已完成，结果: {final_answer}")
+        results = self._schedule(question, plan, plan, **kwargs)
+        # 最后一个步骤负责汇总，其结果即为最终答案
+        return results.get(plan[-1]["id"], "") if plan else ""
 
-        return final_answer
+    def execute_stream(self, question: str, steps: Iterable[dict[str, Any]], **kwargs) -> str:
+        """边接收计划步骤边执行，依赖已满足的步骤立即开始"""
+        print("\n--- 正在执行计划（流水线） ---")
+        plan: list[dict[str, Any]] = []
+        results = self._schedule(question, steps, plan, **kwargs)
+        return results.get(plan[-1]["id"], "") if plan else ""
+
+    def _schedule(
+        self,
+        question: str,
+        steps: Iterable[dict[str, Any]],
+        plan: list[dict[str, Any]],
+        **kwargs,
+    ) -> dict[int, str]:
+        """
+        按依赖关系调度执行
+
+        Args:
+            question: 原始问题
+            steps: 步骤来源，可以是逐个产出步骤的迭代器（边规划边执行）
+            plan: 已知的完整计划（提示词中展示），随 steps 产出而增长
+        """
+        results: dict[int, str] = {}
+        waiting: dict[int, dict[str, Any]] = {}
+        running: dict[concurrent.futures.Future, dict[str, Any]] = {}
+
+        # 新步骤与完成的步骤都投递到同一个事件队列，任一事件到达都会触发调度：
+        # 依赖步骤一完成就提交后续步骤，不必等待规划器产出下一个步骤
+        events: queue.Queue[tuple[str, Any]] = queue.Queue()
+
+        def produce():
+            try:
+                for step in steps:
+                    events.put(("step", step))
+            except Exception as e:
+                events.put(("error", e))
+            else:
+                events.put(("end", None))
+
+        producer = threading.Thread(target=produce, name="plan-producer", daemon=True)
+        producer.start()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            planning = True
+            while planning or waiting or running:
+                kind, payload = events.get()
+                if kind == "step":
+                    if payload not in plan:
+                        plan.append(payload)
+                    waiting[payload["id"]] = payload
+                elif kind == "done":
+                    step = running.pop(payload)
+                    results[step["id"]] = payload.result()
+                elif kind == "end":
+                    planning = False
+                else:
+                    raise payload
+
+                for step_id, step in list(waiting.items()):
+                    if all(dep in results for dep in step["deps"]):
+                        del waiting[step_id]
+                        future = pool.submit(self._execute_step, question, plan, step, results, **kwargs)
+                        running[future] = step
+                        future.add_done_callback(lambda done: events.put(("done", done)))
+
+        return results
+
+    def _execute_step(
+        self,
+        question: str,
+        plan: list[dict[str, Any]],
+        step: dict[str, Any],
+        results: dict[int, str],
+        **kwargs,
+    ) -> str:
+        """执行单个步骤，提示词中只包含其依赖步骤的结果"""
+        print(f"\n 正在执行步骤 {step['id']}: {step['step']}")
+        descriptions = {item["id"]: item["step"] for item in plan}
+        history = "".join(
+            f"步骤 {dep}: {descriptions.get(dep, '')}\n结果: {results[dep]}\n\n" for dep in step["deps"]
+        )
+        prompt = self.prompt_template.format(
+            question = question,
+            plan = [item["step"] for item in plan],
+            history = history,
+            current_step = step["step"]
+        )
+        messages = [{"role": "user", "content": prompt}]
+
+        response_text = self.llm_client.invoke(messages, **kwargs) or ""
+        print(f"✅ 步骤 {step['id']} 已完成，结果: {response_text}")
+        return response_text
 
 class PlanAndSolveAgent(Agent):
     """
@@ -113,7 +557,10 @@ class PlanAndSolveAgent(Agent):
         llm: SmartAgentLLM,
         system_prompt: str | None = None,
         config: Config | None = None,
-        custom_prompts: dict[str, str] | None = None
+        custom_prompts: dict[str, str] | None = None,
+        max_parallel_steps: int = 4,
+        pipeline: bool = False,
+        plan_cache: PlanCache | None = None
     ):
         """
         初始化PlanAndSolveAgent
@@ -124,6 +571,9 @@ class PlanAndSolveAgent(Agent):
             system_prompt: 系统提示词
             config: 配置对象
             custom_prompts: 自定义提示词模板 {"planner": "", "executor": ""}
+            max_parallel_steps: 并行执行的最大步骤数
+            pipeline: 是否流式生成计划，并在计划生成过程中开始执行已就绪的步骤
+            plan_cache: 计划缓存，结构相同的问题直接复用计划
         """
         super().__init__(name, llm, system_prompt, config)
 
@@ -135,8 +585,9 @@ class PlanAndSolveAgent(Agent):
             planner_prompt = None
             executor_prompt = None
 
-        self.planner = Planner(self.llm, planner_prompt)
-        self.executor = Executor(self.llm, executor_prompt)
+        self.planner = Planner(self.llm, planner_prompt, plan_cache)
+        self.executor = Executor(self.llm, executor_prompt, max_parallel_steps)
+        self.pipeline = pipeline
     
     def run(self, input_text: str, **kwargs) -> str:
         """
@@ -150,4 +601,27 @@ class PlanAndSolveAgent(Agent):
             最终答案
         """
         print(f"\n🤖 {self.name} 开始处理问题: {input_text}")
-        
+
+        if self.pipeline:
+            final_answer = self.executor.execute_stream(input_text, self.planner.plan_stream(input_text, **kwargs), **kwargs)
+            if not final_answer:
+                final_answer = "无法生成有效的行动计划，任务终止。"
+            print(f"\n--- 任务完成 ---\n最终答案: {final_answer}")
+
+            self.add_message(Message(input_text, "user"))
+            self.add_message(Message(final_answer, "assistant"))
+            return final_answer
+
+        plan = self.planner.plan(input_text, **kwargs)
+        if not plan:
+            final_answer = "无法生成有效的行动计划，任务终止。"
+            print(f"\n--- 任务终止 ---\n{final_answer}")
+        else:
+            final_answer = self.executor.execute(input_text, plan, **kwargs)
+            print(f"\n--- 任务完成 ---\n最终答案: {final_answer}")
+
+        # 保存到历史记录
+        self.add_message(Message(input_text, "user"))
+        self.add_message(Message(final_answer, "assistant"))
+
+        return final_answer
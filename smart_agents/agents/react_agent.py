@@ -4,8 +4,13 @@ from ..core.agent import Agent
 from ..core.agent import SmartAgentLLM
 from ..core.config import Config
 from ..core.message import Message
+from ..core.tokenizer import Tokenizer, get_tokenizer
 from ..tools.registry import ToolRegistry
+from ..tools.async_executor import AsyncToolExecutor
 import re
+import math
+import asyncio
+import concurrent.futures
 
 
 DEFAULT_REACT_PROMPT = """你是一个具备推理和行动能力的AI助手。你可以通过思考分析问题，然后调用合适的工具来获取信息，最终给出准确的答案。
@@ -20,6 +25,7 @@ Thought: 分析问题，确定需要什么信息，制定研究策略。
 Action: 选择合适的工具获取信息，格式为：
 - `{{tool_name}}[{{tool_input}}]`: 调用工具获取信息。
 - `Finish[研究结论]`: 当你有足够信息得出结论时。
+- 如果需要多条互不依赖的信息，可以在同一步中输出多行 Action（每行一个工具调用），它们会被并行执行。
 
 ## 重要提醒
 1. 每次回应必须包含Thought和Action两个部分
@@ -35,6 +41,151 @@ Action: 选择合适的工具获取信息，格式为：
 
 现在开始你的推理和行动："""
 
+# 模型写完 Action 后应当停止，由框架填入真实的 Observation
+REACT_STOP_SEQUENCES = ["\nObservation:", "\nObservation："]
+
+SCRATCHPAD_SUMMARY_PROMPT = """请将以下推理轨迹压缩为简洁的要点，保留已经查明的事实、得到的中间结论以及尝试过但无效的行动，
+不超过{max_tokens}字，只输出要点本身。
+
+问题: {question}
+
+已有要点:
+{summary}
+
+新增轨迹:
+{trace}
+"""
+
+
+def _terms(text: str) -> set[str]:
+    """提取用于相关性打分的词项：英文单词 + 中文字符二元组"""
+    text = text.lower()
+    terms = set(re.findall(r"[a-z0-9_]{2,}", text))
+    for segment in re.findall(r"[\u4e00-\u9fff]+", text):
+        if len(segment) == 1:
+            terms.add(segment)
+        terms.update(segment[i:i + 2] for i in range(len(segment) - 1))
+    return terms
+
+
+class Scratchpad:
+    """
+    ReAct 执行轨迹（Thought / Action / Observation）及其压缩
+
+    - 每条观察结果不超过 max_observation_tokens，超出时只保留与问题最相关的段落
+    - 最近 keep_recent 步之前的观察结果进一步压缩到 old_observation_tokens
+    - 开启 summarize 后，超出 summarize_after 的旧步骤由 LLM 折叠为要点摘要
+    每步的压缩结果只计算一次，后续步骤直接复用。
+    """
+    def __init__(
+        self,
+        question: str = "",
+        tokenizer: Tokenizer | None = None,
+        max_observation_tokens: int | None = 1000,
+        keep_recent: int = 2,
+        old_observation_tokens: int = 200,
+        summarize: bool = False,
+        summarize_after: int = 4,
+        summary_max_tokens: int = 300,
+        llm: SmartAgentLLM | None = None,
+    ):
+        self.question = question
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.max_observation_tokens = max_observation_tokens
+        self.keep_recent = keep_recent
+        self.old_observation_tokens = old_observation_tokens
+        self.summarize = summarize and llm is not None
+        self.summarize_after = summarize_after
+        self.summary_max_tokens = summary_max_tokens
+        self.llm = llm
+
+        self.steps: list[dict[str, str | None]] = []
+        self.summary = ""
+        self._folded = 0
+
+    def add_step(self, action: str | None, observation: str, thought: str | None = None):
+        """记录一步执行，action 为 None 时只记录观察（如格式错误提示）"""
+        step = {"thought": thought, "action": action, "observation": observation, "compact": None}
+        if self.max_observation_tokens is not None:
+            step["observation"] = self._relevant_passages(step, self.max_observation_tokens)
+        self.steps.append(step)
+
+    def _relevant_passages(self, step: dict[str, str | None], budget: int) -> str:
+        """观察结果超出预算时，保留与问题和行动最相关的段落，按原文顺序拼接"""
+        observation = step["observation"] or ""
+        if self.tokenizer.count(observation) <= budget:
+            return observation
+
+        passages = [p.strip() for p in re.split(r"\n\s*\n|\n", observation) if p.strip()]
+        query = _terms(f"{self.question} {step['action'] or ''}")
+        scored = []
+        for i, passage in enumerate(passages):
+            overlap = len(query & _terms(passage))
+            scored.append((overlap / math.sqrt(len(passage) + 1), i))
+
+        # 存在相关段落时，不再用无关段落填充预算
+        if any(score > 0 for score, _ in scored):
+            scored = [(score, i) for score, i in scored if score > 0]
+
+        kept: list[int] = []
+        remaining = budget
+        # 评分相同（包括全部为 0）时按原文顺序优先，保留靠前的段落
+        for score, i in sorted(scored, key=lambda item: (-item[0], item[1])):
+            cost = self.tokenizer.count(passages[i])
+            if cost > remaining:
+                continue
+            kept.append(i)
+            remaining -= cost
+        if not kept:
+            return self.tokenizer.truncate(observation, budget)
+        return " ... ".join(passages[i] for i in sorted(kept))
+
+    def _fold(self, steps: list[dict[str, str | None]]):
+        """将旧步骤折叠进摘要"""
+        trace = "\n".join(self._format_step(step, compact=True) for step in steps)
+        prompt = SCRATCHPAD_SUMMARY_PROMPT.format(
+            max_tokens=self.summary_max_tokens,
+            question=self.question,
+            summary=self.summary or "无",
+            trace=trace,
+        )
+        try:
+            summary = self.llm.invoke([{"role": "user", "content": prompt}], temperature=0)
+        except Exception as e:
+            print(f"⚠️ 轨迹摘要失败，保留原始轨迹: {e}")
+            return False
+        self.summary = self.tokenizer.truncate((summary or "").strip(), self.summary_max_tokens)
+        return True
+
+    def _format_step(self, step: dict[str, str | None], compact: bool) -> str:
+        observation = step["compact"] if compact and step["compact"] is not None else step["observation"]
+        if step["action"] is None:
+            return f"Observation: {observation}"
+        return f"Action: {step['action']}\nObservation: {observation}"
+
+    def render(self) -> str:
+        """渲染为提示词中的执行历史"""
+        return "\n".join(self.render_lines())
+
+    def render_lines(self) -> list[str]:
+        """按时间顺序渲染执行历史，每个元素为摘要或一步的 Action / Observation"""
+        old_count = max(0, len(self.steps) - self.keep_recent)
+        for step in self.steps[:old_count]:
+            if step["compact"] is None:
+                step["compact"] = self._relevant_passages(step, self.old_observation_tokens)
+
+        if self.summarize and old_count - self._folded >= self.summarize_after:
+            if self._fold(self.steps[self._folded:old_count]):
+                self._folded = old_count
+
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of earlier steps: {self.summary}")
+        for i, step in enumerate(self.steps[self._folded:], start=self._folded):
+            lines.append(self._format_step(step, compact=i < old_count))
+        return lines
+
+
 class ReActAgent(Agent):
     def __init__(
         self,
@@ -44,7 +195,14 @@ class ReActAgent(Agent):
         system_prompt: str | None = None,
         config: Config | None = None,
         max_steps: int = 5,
-        custom_prompt: str | None = None
+        custom_prompt: str | None = None,
+        max_observation_tokens: int | None = 1000,
+        keep_recent_steps: int = 2,
+        old_observation_tokens: int = 200,
+        summarize_steps: bool = False,
+        stream: bool = False,
+        stop_sequences: list[str] | None = None,
+        max_parallel_actions: int = 4,
     ):
         super().__init__(name, llm, system_prompt, config)
 
@@ -55,8 +213,25 @@ class ReActAgent(Agent):
             self.tool_registry = tool_registry
 
         self.max_steps = max_steps
+
+        # 执行轨迹压缩：单条观察截断、旧观察只保留相关段落、可选的旧步骤摘要
+        self.max_observation_tokens = max_observation_tokens
+        self.keep_recent_steps = keep_recent_steps
+        self.old_observation_tokens = old_observation_tokens
+        self.summarize_steps = summarize_steps
+        self.scratchpad = self._new_scratchpad("")
+        # 完整（未压缩）的执行历史，提示词中使用 scratchpad 的压缩结果
         self.current_history: list[str] = []
 
+        # 流式模式下增量解析输出，Action 行完整后立即中断生成并执行工具；
+        # 未指定 stop_sequences 时只在流式模式下发送默认停止序列，非流式请求保持原样（部分服务端不接受 stop 参数）
+        self.stream = stream
+        self.stop_sequences = stop_sequences
+
+        # 同一步中的多个 Action 并行执行
+        self.max_parallel_actions = max_parallel_actions
+        self._tool_executor: AsyncToolExecutor | None = None
+
         self.prompt_template = custom_prompt if custom_prompt else DEFAULT_REACT_PROMPT
 
     def add_tool(self, tool):
@@ -68,6 +243,16 @@ class ReActAgent(Agent):
         """
         self.tool_registry.register_tool(tool)
 
+    def _new_scratchpad(self, question: str) -> Scratchpad:
+        return Scratchpad(
+            question=question,
+            tokenizer=get_tokenizer(getattr(self.llm, "model", None)),
+            max_observation_tokens=self.max_observation_tokens,
+            keep_recent=self.keep_recent_steps,
+            old_observation_tokens=self.old_observation_tokens,
+            summarize=self.summarize_steps,
+            llm=self.llm,
+        )
 
     def run(self, input_text: str, **kwargs) -> str:
         """运行ReAct Agent
@@ -78,7 +263,21 @@ class ReActAgent(Agent):
         Returns:
             str: 最终答案
         """
+        try:
+            return self._run(input_text, **kwargs)
+        finally:
+            # 并行执行器的线程池只在本次运行内复用，结束后释放
+            self.close()
+
+    def close(self):
+        """关闭并行工具执行器（下次并行调用时会重新创建）"""
+        if self._tool_executor is not None:
+            self._tool_executor.close()
+            self._tool_executor = None
+
+    def _run(self, input_text: str, **kwargs) -> str:
         # 需要清空？，对象实例化后是否为其self变量单独分配空间
+        self.scratchpad = self._new_scratchpad(input_text)
         self.current_history = []
         current_step = 0
 
@@ -89,17 +288,20 @@ class ReActAgent(Agent):
             print(f"\n--- 第 {current_step} 步 ---")
 
             # 构建提示词
-            tool_desc = self.tool_registry.get_tools_description()
-            history_str = "\n".join(self.current_history)
-            prompt = self.prompt_template.format(
-                tools = tool_desc,
-                question = input_text,
-                history = history_str
-            )
+            prompt = self._build_prompt(input_text)
 
             # 调用LLM
             messages = [{"role": "user", "content": prompt}]
-            response_text = self.llm.invoke(messages, **kwargs)
+            call_kwargs = dict(kwargs)
+            stop_sequences = self.stop_sequences
+            if stop_sequences is None and self.stream:
+                stop_sequences = REACT_STOP_SEQUENCES
+            if stop_sequences:
+                call_kwargs.setdefault("stop", stop_sequences)
+            if self.stream:
+                response_text = self._stream_output(messages, **call_kwargs)
+            else:
+                response_text = self.llm.invoke(messages, **call_kwargs)
             
             if not response_text:
                 print("❌ 错误：LLM调用失败。")
@@ -126,22 +328,28 @@ class ReActAgent(Agent):
 
                 return final_answer
             
-            # 执行工具调用
-            tool_name, tool_input = self._parse_action(action)
-            if not tool_name or tool_input is None:
+            # 执行工具调用（同一步中的多个 Action 并行执行）
+            actions = self._parse_actions(response_text)[:self.max_parallel_actions]
+            calls = [(action, *self._parse_action(action)) for action in actions if not action.startswith("Finish")]
+            valid_calls = [(action, tool_name, tool_input) for action, tool_name, tool_input in calls if tool_name and tool_input is not None]
+            if not valid_calls:
+                self.scratchpad.add_step(None, "无效的Action格式，请检查。", thought)
                 self.current_history.append("Observation: 无效的Action格式，请检查。")
                 continue
 
-            print(f"🎬 行动: {tool_name}[{tool_input}]")
-            
+            for _, tool_name, tool_input in valid_calls:
+                print(f"🎬 行动: {tool_name}[{tool_input}]")
+
             # 调用工具
-            observation = self.tool_registry.execute_tool(tool_name, tool_input)
-            print(f"👀 观察: {observation}")
-            
+            observations = self._execute_actions([(tool_name, tool_input) for _, tool_name, tool_input in valid_calls])
+
             # 更新历史
-            self.current_history.append(f"Action: {action}")
-            self.current_history.append(f"Observation: {observation}")
-        
+            for (action, _, _), observation in zip(valid_calls, observations):
+                print(f"👀 观察: {observation}")
+                self.scratchpad.add_step(action, observation, thought)
+                self.current_history.append(f"Action: {action}")
+                self.current_history.append(f"Observation: {observation}")
+
         print("⏰ 已达到最大步数，流程终止。")
         final_answer = "抱歉，我无法在限定步数内完成这个任务。"
         
@@ -151,6 +359,100 @@ class ReActAgent(Agent):
         
         return final_answer
 
+    def _build_prompt(self, input_text: str) -> str:
+        """
+        按上下文预算渲染提示词
+
+        模板与问题必须保留，工具描述其次，执行历史从最近的步骤开始装填，
+        放不下的最早步骤本轮省略
+        """
+        history = self.scratchpad.render_lines()
+        fitted = self.context_budget().fit(
+            system_prompt=self.prompt_template.format(tools="", question="", history=""),
+            question=input_text,
+            tools=self.tool_registry.get_tools_description(),
+            observations=history,
+        )
+        dropped = len(history) - len(fitted["observations"])
+        if dropped and self.config.debug:
+            print(f"🗂️ {self.name} 上下文预算不足，本轮省略最早的 {dropped} 条执行记录")
+        return self.prompt_template.format(
+            tools=fitted["tools"],
+            question=input_text,
+            history="\n".join(fitted["observations"]),
+        )
+
+    def _execute_actions(self, calls: list[tuple[str, str]]) -> list[str]:
+        """执行一步中的工具调用，多个调用通过 AsyncToolExecutor 并行执行，结果与调用顺序一致"""
+        if len(calls) == 1:
+            tool_name, tool_input = calls[0]
+            return [self.tool_registry.execute_tool(tool_name, tool_input)]
+
+        if self._tool_executor is None:
+            self._tool_executor = AsyncToolExecutor(self.tool_registry, max_workers=self.max_parallel_actions)
+        tasks = [{"tool_name": tool_name, "input_data": tool_input} for tool_name, tool_input in calls]
+        coro = self._tool_executor.execute_tools_parallel(tasks)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            results = asyncio.run(coro)
+        else:
+            # 已处于事件循环中（如在异步应用内同步调用 run）时，在独立线程中运行
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as runner:
+                results = runner.submit(asyncio.run, coro).result()
+        return [result["result"] for result in results]
+
+    def _stream_output(self, messages: list[dict[str, str]], **kwargs) -> str:
+        """
+        流式获取LLM输出，Action 行完整后立即停止接收
+
+        Action 行以换行结束，或以配对的方括号结束时视为完整；
+        服务端忽略 stop 参数时，遇到模型自行编造的 Observation 也会停止。
+        """
+        text = ""
+        stream = self.llm.stream_invoke(messages, **kwargs)
+        try:
+            for chunk in stream:
+                text += chunk
+                observation_at = text.find("\nObservation")
+                if observation_at != -1:
+                    return text[:observation_at]
+                action_line = self._complete_action_line(text)
+                if action_line is not None:
+                    return action_line
+        finally:
+            # 关闭生成器会中断底层 HTTP 流，服务端不再继续生成
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return text
+
+    def _complete_action_line(self, text: str) -> str | None:
+        """
+        若文本中的 Action 行已全部输出，返回截至最后一个 Action 行末尾的文本
+
+        Finish 行以配对的方括号结束即视为完整；工具调用行需等到下一行开头出现，
+        确认其后没有更多的并行 Action 后才返回。
+        """
+        matches = list(re.finditer(r"Action: (.*)", text))
+        if not matches:
+            return None
+        last = matches[-1]
+        stripped = last.group(1).strip()
+        balanced = bool(re.match(r"\w+\[", stripped)) and stripped.endswith("]") and stripped.count("[") == stripped.count("]")
+        if stripped.startswith("Finish") and balanced:
+            return text[:last.end()]
+
+        rest = text[last.end():]
+        if not rest.startswith("\n"):
+            return None
+        next_line = rest.lstrip("\n")
+        if len(next_line) < len("Action:") and "Action:".startswith(next_line):
+            return None
+        if next_line.startswith("Action:"):
+            return None
+        return text[:last.end()]
+
     def _parse_output(self, text: str) -> tuple[str | None, str | None]:
         """解析LLM输出，提取Thought和Action"""
         thought_match = re.search(r"Thought: (.*)", text)
@@ -161,6 +463,17 @@ class ReActAgent(Agent):
 
         return thought, action
 
+    def _parse_actions(self, text: str) -> list[str]:
+        """解析LLM输出中的全部Action行，Finish 之后的内容被忽略"""
+        actions = []
+        for match in re.finditer(r"Action: (.*)", text):
+            action = match.group(1).strip()
+            if action:
+                actions.append(action)
+            if action.startswith("Finish"):
+                break
+        return actions
+
     def _parse_action(self, action_text: str) -> tuple[str | None, str | None]:
         """解析行动文本，提取工具名称以及输入"""
         match = re.match(r"(\w+)\[(.*)\]", action_text)
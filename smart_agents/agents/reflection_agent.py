@@ -1,5 +1,9 @@
 """Reflection 实现 - 自我反思与迭代优化的智能体"""
 
+import re
+import difflib
+import concurrent.futures
+from typing import Any, Callable
 from ..core.agent import Agent
 from ..core.llm import SmartAgentLLM
 from ..core.config import Config
@@ -42,6 +46,193 @@ DEFAULT_PROMPTS = {
 """
 }
 
+# 多评审模式下的评审员提示词模板，每个评审员从不同角度给候选回答打分
+DEFAULT_CRITIC_PROMPTS = {
+    "accuracy": """
+你是一位严格的事实与逻辑评审员。请检查以下回答是否准确、推理是否正确：
+
+# 原始任务:
+{task}
+
+# 候选回答:
+{content}
+
+请先输出一行"评分: X/10"，再列出具体的问题与改进建议。若回答已经很好，请回答"无需改进"。
+""",
+    "completeness": """
+你是一位关注完整性的评审员。请检查以下回答是否完整覆盖了任务的全部要求：
+
+# 原始任务:
+{task}
+
+# 候选回答:
+{content}
+
+请先输出一行"评分: X/10"，再列出遗漏的内容与改进建议。若回答已经很好，请回答"无需改进"。
+""",
+    "clarity": """
+你是一位关注表达的评审员。请检查以下回答的结构是否清晰、表达是否简洁易懂：
+
+# 原始任务:
+{task}
+
+# 候选回答:
+{content}
+
+请先输出一行"评分: X/10"，再列出表达上的问题与改进建议。若回答已经很好，请回答"无需改进"。
+""",
+}
+
+# 补丁式优化提示词：只输出需要修改的片段，避免重新生成整篇回答
+PATCH_REFINE_PROMPT = """
+请根据反馈意见改进你的回答，但不要重写整个回答，只输出需要修改的部分。
+
+# 原始任务:
+{task}
+
+# 上一轮回答:
+{last_attempt}
+
+# 反馈意见:
+{feedback}
+
+请使用一个或多个以下格式的修改块，SEARCH 部分必须与上一轮回答中的原文逐字一致（包括空格和换行），
+并且足够长以唯一定位；不需要修改的内容不要输出：
+
+<<<<<<< SEARCH
+原文片段
+=======
+修改后的片段
+>>>>>>> REPLACE
+"""
+
+PATCH_BLOCK_PATTERN = re.compile(
+    r"<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE",
+    re.DOTALL,
+)
+
+
+def parse_patch_blocks(text: str) -> list[tuple[str, str]]:
+    """解析 SEARCH/REPLACE 修改块"""
+    return [(search, replace) for search, replace in PATCH_BLOCK_PATTERN.findall(text)]
+
+
+def apply_patch_blocks(original: str, blocks: list[tuple[str, str]]) -> str:
+    """
+    将修改块依次应用到原文
+
+    SEARCH 片段必须在当前文本中恰好出现一次；逐字匹配失败时忽略首尾空白再试一次。
+    任何一个修改块无法定位都会抛出 ValueError，由调用方回退为完整重写。
+    """
+    if not blocks:
+        raise ValueError("未找到修改块")
+    result = original
+    for search, replace in blocks:
+        if not search.strip():
+            raise ValueError("修改块的 SEARCH 部分为空")
+        count = result.count(search)
+        if count == 0 and search.strip() != search:
+            search, replace = search.strip(), replace.strip()
+            count = result.count(search)
+        if count != 1:
+            raise ValueError(f"SEARCH 片段匹配到 {count} 处: {search[:50]}")
+        result = result.replace(search, replace, 1)
+    if not result.strip():
+        raise ValueError("应用修改块后回答为空")
+    return result
+
+
+SCORE_PATTERN = re.compile(r"评分[:：]\s*(\d+(?:\.\d+)?)\s*/\s*10|score[:：]?\s*(\d+(?:\.\d+)?)\s*/\s*10", re.IGNORECASE)
+
+
+def parse_score(feedback: str) -> float | None:
+    """从评审意见中解析 0-10 的评分"""
+    match = SCORE_PATTERN.search(feedback)
+    if not match:
+        return 10.0 if "无需改进" in feedback else None
+    return min(10.0, float(match.group(1) or match.group(2)))
+
+
+# 开启评分平台期检测时追加到反思提示词末尾，要求评审给出评分
+SCORE_INSTRUCTION = """
+请在反馈的第一行输出"评分: X/10"。
+"""
+
+# 变更量统计的 token：连续的英文字母数字为一个 token，其余（中文、标点）每个字符为一个 token
+CHANGE_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+
+
+def changed_tokens(previous: str, current: str) -> int:
+    """两版回答之间被修改的 token 数（基于 difflib 的编辑操作）"""
+    if previous == current:
+        return 0
+    matcher = difflib.SequenceMatcher(
+        None, CHANGE_TOKEN_PATTERN.findall(previous), CHANGE_TOKEN_PATTERN.findall(current), autojunk=False
+    )
+    return sum(
+        max(i2 - i1, j2 - j1)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    )
+
+
+class ConvergenceDetector:
+    """
+    收敛检测 - 改进幅度低于阈值时提前结束迭代
+
+    - 变更量收敛：一轮优化修改的 token 数少于 min_changed_tokens，说明优化已不再改变回答；
+      按修改的绝对数量判断，长文档中局部但有效的修改（如修复一个函数）不会被视为收敛
+    - 评分平台期：评分（反思意见中的"评分: X/10"，或自定义 scorer）连续 patience 轮
+      提升不足 min_score_delta
+    - scorer: 可选的本地打分器 (task, answer) -> 0~10 分，例如轻量分类器，优先于反思意见中的评分
+    """
+    def __init__(
+        self,
+        min_changed_tokens: int | None = 3,
+        min_score_delta: float | None = 0.5,
+        patience: int = 1,
+        scorer: Callable[[str, str], float] | None = None,
+    ):
+        self.min_changed_tokens = min_changed_tokens
+        self.min_score_delta = min_score_delta
+        self.patience = patience
+        self.scorer = scorer
+        self.reset()
+
+    def reset(self):
+        """开始新的一次运行"""
+        self._best_score: float | None = None
+        self._stalled = 0
+
+    @property
+    def needs_feedback_score(self) -> bool:
+        """是否需要在反思意见中给出评分"""
+        return self.min_score_delta is not None and self.scorer is None
+
+    def converged(self, previous: str, current: str) -> bool:
+        """一轮优化修改的 token 数是否低于阈值"""
+        if self.min_changed_tokens is None:
+            return False
+        return changed_tokens(previous, current) < self.min_changed_tokens
+
+    def score(self, task: str, answer: str, feedback: str) -> float | None:
+        """当前回答的评分，优先使用本地打分器"""
+        if self.scorer is not None:
+            return self.scorer(task, answer)
+        return parse_score(feedback)
+
+    def plateaued(self, score: float | None) -> bool:
+        """记录一轮评分，评分连续 patience 轮提升不足时返回 True"""
+        if score is None or self.min_score_delta is None:
+            return False
+        if self._best_score is not None and score - self._best_score < self.min_score_delta:
+            self._stalled += 1
+        else:
+            self._stalled = 0
+        self._best_score = score if self._best_score is None else max(self._best_score, score)
+        return self._stalled >= self.patience
+
+
 class Memory:
     """
     简单的短期记忆模块，用于存储智能体的行动与反思轨迹。
@@ -92,7 +283,12 @@ class ReflectionAgent(Agent):
         system_prompt: str | None = None,
         config: Config | None = None,
         max_iterations: int = 3,
-        custom_prompts: dict[str, str] | None = None
+        custom_prompts: dict[str, str] | None = None,
+        num_candidates: int = 1,
+        critic_prompts: dict[str, str] | None = None,
+        max_workers: int = 8,
+        refine_mode: str = "full",
+        convergence: bool | ConvergenceDetector = False
     ):
         """
         初始化ReflectionAgent
@@ -104,6 +300,13 @@ class ReflectionAgent(Agent):
             config: 配置对象
             max_iterations: 最大迭代次数
             custom_prompts: 自定义提示词模板 {"initial": "", "reflect": "", "refine": ""}
+            num_candidates: 初始候选数，大于1时并行生成多个候选，由多个评审员并行打分后只优化最佳候选
+            critic_prompts: 评审员提示词模板 {名称: 模板}，模板可使用 {task} 与 {content}
+            max_workers: 并行调用LLM的最大线程数
+            refine_mode: 优化方式，full 为完整重写，patch 为输出 SEARCH/REPLACE 修改块并在本地应用，
+                修改块无法应用时回退为完整重写
+            convergence: 收敛检测，True 使用默认的 ConvergenceDetector，默认关闭（只按"无需改进"停止）；
+                开启评分平台期检测且未提供 scorer 时，反思提示词末尾会追加评分要求
         """
         super().__init__(name, llm, system_prompt, config)
         self.max_iterations = max_iterations
@@ -112,6 +315,20 @@ class ReflectionAgent(Agent):
         # 设置提示词模版
         self.prompts = custom_prompts if custom_prompts else DEFAULT_PROMPTS
 
+        # 多候选 + 多评审模式
+        self.num_candidates = num_candidates
+        self.critic_prompts = critic_prompts if critic_prompts else DEFAULT_CRITIC_PROMPTS
+        self.max_workers = max_workers
+        self.refine_mode = refine_mode
+
+        # 收敛检测与运行统计
+        if convergence is True:
+            self.convergence = ConvergenceDetector()
+        else:
+            self.convergence = convergence or None
+        self.last_run_stats: dict[str, Any] = {}
+        self._total_stats = {"runs": 0, "iterations": 0, "iterations_saved": 0, "stop_reasons": {}}
+
     def run(self, input_text: str, **kwargs) -> str:
         print(f"\n 🤖 {self.name} 开始处理任务: {input_text}")
 
@@ -119,48 +336,175 @@ class ReflectionAgent(Agent):
         self.memory = Memory()
 
         # 1. 初始执行
-        print("\n --- 正在进行初始尝试 ---")
-        initial_prompt = self.prompts["initial"].format(task = input_text)
-        initial_result = self._get_llm_response(initial_prompt, **kwargs)
+        critic_feedback = None
+        if self.num_candidates > 1:
+            print(f"\n --- 正在并行生成 {self.num_candidates} 个候选 ---")
+            initial_result, critic_feedback = self._best_of_n(input_text, **kwargs)
+        else:
+            print("\n --- 正在进行初始尝试 ---")
+            initial_prompt = self.prompts["initial"].format(task = input_text)
+            initial_result = self._get_llm_response(initial_prompt, **kwargs)
         self.memory.add_record("execution", initial_result)
 
+        if self.convergence is not None:
+            self.convergence.reset()
+        # 每个版本的评分，用于在评分平台期时返回评分最高的版本
+        scored_results: list[tuple[float, str]] = []
+        stop_reason = "max_iterations"
+        iterations = 0
+
         for i in range(self.max_iterations):
             print(f"\n --- 第 {i+1}/{self.max_iterations} 轮迭代 ---")
+            iterations += 1
 
-            # a. 反思
-            print("\n-> 正在进行反思...")
+            # a. 反思（多评审模式下，首轮直接使用评审员对最佳候选的意见）
             last_result = self.memory.get_last_execution()
-            reflect_prompt = self.prompts["reflect"].format(
-                task=input_text,
-                content=last_result
-            )
-            feedback = self._get_llm_response(reflect_prompt, **kwargs)
+            if i == 0 and critic_feedback is not None:
+                feedback = critic_feedback
+            else:
+                print("\n-> 正在进行反思...")
+                reflect_prompt = self.prompts["reflect"].format(
+                    task=input_text,
+                    content=last_result
+                )
+                if self.convergence is not None and self.convergence.needs_feedback_score:
+                    reflect_prompt += SCORE_INSTRUCTION
+                feedback = self._get_llm_response(reflect_prompt, **kwargs)
             self.memory.add_record("reflection", feedback)
 
             # b. 检查是否需要停止
             if "无需改进" in feedback or "no need for improvement" in feedback.lower():
                 print("\n✅ 反思认为结果已无需改进，任务完成。")
+                stop_reason = "no_improvement_needed"
                 break
 
+            if self.convergence is not None:
+                score = self.convergence.score(input_text, last_result, feedback)
+                if score is not None:
+                    scored_results.append((score, last_result))
+                if self.convergence.plateaued(score):
+                    print(f"\n✅ 评分已进入平台期（{score}），提前结束迭代。")
+                    stop_reason = "score_plateau"
+                    break
+
             # c. 优化
             print("\n-> 正在进行优化...")
-            refine_prompt = self.prompts["refine"].format(
-                task=input_text,
-                last_attempt=last_result,
-                feedback=feedback
-            )
-            refined_result = self._get_llm_response(refine_prompt, **kwargs)
+            refined_result = self._refine(input_text, last_result, feedback, **kwargs)
             self.memory.add_record("execution", refined_result)
 
+            # d. 本轮优化几乎没有修改回答时，继续迭代的收益很低
+            if self.convergence is not None and self.convergence.converged(last_result, refined_result):
+                print("\n✅ 本轮优化几乎没有修改回答，提前结束迭代。")
+                stop_reason = "converged"
+                break
+
         final_result = self.memory.get_last_execution()
+        if stop_reason == "score_plateau" and scored_results:
+            final_result = max(scored_results, key=lambda item: item[0])[1]
         print(f"\n--- 任务完成 ---\n最终结果:\n{final_result}")
 
+        self._record_run_stats(iterations, stop_reason)
+
          # 保存到历史记录
         self.add_message(Message(input_text, "user"))
         self.add_message(Message(final_result, "assistant"))
 
         return final_result
     
+    def _record_run_stats(self, iterations: int, stop_reason: str):
+        """记录本次运行的迭代统计"""
+        saved = self.max_iterations - iterations
+        self.last_run_stats = {
+            "iterations": iterations,
+            "max_iterations": self.max_iterations,
+            "iterations_saved": saved,
+            "stop_reason": stop_reason,
+        }
+        self._total_stats["runs"] += 1
+        self._total_stats["iterations"] += iterations
+        self._total_stats["iterations_saved"] += saved
+        reasons = self._total_stats["stop_reasons"]
+        reasons[stop_reason] = reasons.get(stop_reason, 0) + 1
+        print(f"📊 迭代 {iterations}/{self.max_iterations} 轮，节省 {saved} 轮，停止原因: {stop_reason}")
+
+    def stats(self) -> dict[str, Any]:
+        """返回累计的迭代统计与最近一次运行的统计"""
+        return {**self._total_stats, "stop_reasons": dict(self._total_stats["stop_reasons"]), "last_run": dict(self.last_run_stats)}
+
+    def _refine(self, task: str, last_result: str, feedback: str, **kwargs) -> str:
+        """根据反馈优化回答，patch 模式下优先以修改块方式更新"""
+        if self.refine_mode == "patch":
+            patch_prompt = self.prompts.get("refine_patch", PATCH_REFINE_PROMPT).format(
+                task=task,
+                last_attempt=last_result,
+                feedback=feedback
+            )
+            patch = self._get_llm_response(patch_prompt, **kwargs)
+            try:
+                blocks = parse_patch_blocks(patch)
+                refined = apply_patch_blocks(last_result, blocks)
+                print(f"🩹 已应用 {len(blocks)} 个修改块")
+                return refined
+            except ValueError as e:
+                print(f"⚠️ 修改块应用失败，回退为完整重写: {e}")
+
+        refine_prompt = self.prompts["refine"].format(
+            task=task,
+            last_attempt=last_result,
+            feedback=feedback
+        )
+        return self._get_llm_response(refine_prompt, **kwargs)
+
+    def _best_of_n(self, task: str, **kwargs) -> tuple[str, str]:
+        """
+        并行生成多个候选，由多个评审员并行打分，返回 (最佳候选, 评审意见汇总)
+
+        全部评审员都认为无需改进时，评审意见为"无需改进"，后续不再优化。
+        全部候选均为空时抛出 RuntimeError。
+        """
+        initial_prompt = self.prompts["initial"].format(task = task)
+        # 候选需要独立采样，不能与相同的并发请求合并
+        sample_kwargs = {**kwargs, "coalesce": False} if isinstance(self.llm, SmartAgentLLM) else kwargs
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            candidates = list(pool.map(
+                lambda _: self._get_llm_response(initial_prompt, **sample_kwargs),
+                range(self.num_candidates),
+            ))
+            candidates = [candidate for candidate in dict.fromkeys(candidates) if candidate]
+            if not candidates:
+                # 没有可评审的候选时不能当作"无需改进"返回空结果
+                raise RuntimeError(f"{self.num_candidates} 个候选均为空，LLM 未返回有效回答")
+
+            print(f"\n-> {len(self.critic_prompts)} 位评审员正在并行评审 {len(candidates)} 个候选...")
+            reviews = {
+                (index, name): pool.submit(
+                    self._get_llm_response,
+                    template.format(task=task, content=candidate),
+                    **kwargs,
+                )
+                for index, candidate in enumerate(candidates)
+                for name, template in self.critic_prompts.items()
+            }
+            reviews = {key: future.result() for key, future in reviews.items()}
+
+        def average_score(index: int) -> float:
+            scores = [parse_score(reviews[(index, name)]) for name in self.critic_prompts]
+            scores = [score for score in scores if score is not None]
+            return sum(scores) / len(scores) if scores else 0.0
+
+        scores = [average_score(index) for index in range(len(candidates))]
+        best = max(range(len(candidates)), key=lambda index: scores[index])
+        print(f"🏆 候选评分: {[round(score, 2) for score in scores]}，选择候选 {best + 1}")
+
+        best_reviews = [reviews[(best, name)] for name in self.critic_prompts]
+        if all("无需改进" in review for review in best_reviews):
+            return candidates[best], "无需改进"
+        feedback = "\n\n".join(
+            f"【{name}】\n{review}" for name, review in zip(self.critic_prompts, best_reviews) if "无需改进" not in review
+        )
+        return candidates[best], feedback
+
     def _get_llm_response(self, prompt: str, **kwargs) -> str:
         """调用LLM并获取完整响应"""
         messages = [{"role": "user", "content": prompt}]
@@ -1,14 +1,35 @@
 """简单Agent实现"""
 import re
+import time
+import threading
+import concurrent.futures
+from dataclasses import dataclass, field
 from typing import Optional, TYPE_CHECKING, Iterator
 from ..core.message import Message
 from ..core.agent import Agent
 from ..core.llm import SmartAgentLLM
 from ..core.config import Config
+from ..core.history import HistoryPolicy
 
 if TYPE_CHECKING:
     from ..tools.registry import ToolRegistry
 
+DEFAULT_SYSTEM_PROMPT = "你是一个有用的助手"
+
+
+@dataclass
+class _ToolCallStart:
+    """工具调用开始执行的信号与时间（超时从此刻算起，排队时间不计入）"""
+    event: threading.Event = field(default_factory=threading.Event)
+    started_at: Optional[float] = None
+
+    def mark(self):
+        self.started_at = time.monotonic()
+        self.event.set()
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        return self.event.wait(timeout=timeout)
+
 class SimpleAgent(Agent):
     """新增工具调用与消息模版"""
 
@@ -19,29 +40,32 @@ class SimpleAgent(Agent):
         system_prompt: Optional[str] = None,
         config: Optional[Config] = None,
         tool_registry: Optional['ToolRegistry'] = None,
-        enable_tool_calling: bool = True
+        enable_tool_calling: bool = True,
+        history_policy: Optional[HistoryPolicy] = None,
+        max_tool_workers: int = 4,
+        tool_timeout: Optional[float] = None
     ):
         super().__init__(name, llm, system_prompt, config)
         self.tool_registry = tool_registry
         self.enable_tool_calling = enable_tool_calling and self.tool_registry is not None
+        # 历史窗口策略，默认按配置的 max_history_length / max_history_tokens 裁剪
+        self.history_policy = history_policy or HistoryPolicy.from_config(self.config)
+        # 同一轮中的多个工具调用并行执行，tool_timeout 为单次调用的超时（秒），从调用开始执行时计时；
+        # 超时的调用无法被中断，会在后台运行至结束并占用工作线程，全部线程被占满时换用新的线程池
+        self.max_tool_workers = max_tool_workers
+        self.tool_timeout = tool_timeout
+        self._tool_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._runaway_tools: set[concurrent.futures.Future] = set()
 
     def run(self, input_text: str, max_tool_iterations: int = 3, **kwargs) -> str:
-        messages = []
-        # 获取系统prompt
-        enhanced_system_prompt = self._get_enhanced_system_prompt()
-        messages.append({"role": "system","content": enhanced_system_prompt})
-
-        # 获取历史对话信息
-        for msg in self._history:
-            messages.append({"role": msg.role, "content": msg.content})
-
-        # 添加当前对话信息
-        messages.append({"role": "user", "content": input_text})
+        # 系统prompt + 工具描述 + 历史对话（摘要 + 滑动窗口） + 当前对话，按上下文预算装填
+        messages = self._build_messages(input_text, self.system_prompt or DEFAULT_SYSTEM_PROMPT, self._get_tools_section())
         
         if not self.enable_tool_calling:
             response = self.llm.invoke(messages, **kwargs)
             self.add_message(Message(input_text, "user"))
             self.add_message(Message(response, "assistant"))
+            self._compact_history()
             print(f"{self.name}调用完成")
             return response
         
@@ -55,20 +79,16 @@ class SimpleAgent(Agent):
             tools_calls = self._parse_tool_call(response)
 
             if tools_calls:
-                tool_results = []
+                tool_results = self._execute_tool_calls(tools_calls)
                 clean_response = response
-
                 for call in tools_calls:
-                    result = self._execute_tool_call(call['tool_name'], call['parameters'])
-                    tool_results.append(result)
                     clean_response = clean_response.replace(call['original'], "")
 
                 # 构建包含工具结果的消息
                 messages.append({"role": "assistant", "content": clean_response})
 
                 # 添加工具结果
-                tool_results_text = "\n\n".join(tool_results)
-                messages.append({"role": "user", "content": f"工具执行结果: \n{tool_results_text}\n\n请基于这些结果给出完整回答。"})
+                messages.append(self._tool_results_message(messages, tool_results))
 
                 current_iteration += 1
                 continue
@@ -83,20 +103,19 @@ class SimpleAgent(Agent):
         # 添加历史信息
         self.add_message(Message(input_text, "user"))
         self.add_message(Message(final_response, "assistant"))
+        self._compact_history()
 
         return final_response
         
-    def _get_enhanced_system_prompt(self) -> str:
-        """带有工具调用的系统prompt"""
-        base_prompt = self.system_prompt or "你是一个有用的助手"
-
+    def _get_tools_section(self) -> str:
+        """系统prompt中的工具描述与调用格式，未启用工具时为空"""
         if not self.enable_tool_calling or not self.tool_registry:
-            return base_prompt
+            return ""
         
         # 获取工具描述
         tools_description = self.tool_registry.get_tools_description()
         if not tools_description or tools_description == "暂无可用工具":
-            return base_prompt
+            return ""
         
         tools_section = "\n\n## 可用工具\n"
         tools_section += "你可以使用以下工具来帮助回答问题:\n"
@@ -108,7 +127,40 @@ class SimpleAgent(Agent):
         tools_section += "例如:`[TOOL_CALL:search:Python编程]` 或 `[TOOL_CALL:memory:recall=用户信息]`\n\n"
         tools_section += "工具调用结果会自动插入到对话中, 然后你可以基于结果继续回答。\n"
 
-        return base_prompt + tools_section
+        return tools_section
+
+    def _build_messages(self, input_text: str, system_prompt: str, tools_section: str = "") -> list[dict[str, str]]:
+        """
+        按上下文预算组装首轮消息
+
+        系统提示词与当前问题必须保留，工具描述其次，历史消息（摘要 + 窗口）从新到旧装填，
+        放不下的旧消息本轮不发送（仍保留在历史中，由 history_policy 决定何时移出）
+        """
+        fitted = self.context_budget().fit(
+            system_prompt=system_prompt,
+            question=input_text,
+            history=self.history_policy.build_messages(self._history),
+            tools=tools_section,
+        )
+        if fitted["dropped_history"] and self.config.debug:
+            print(f"🗂️ {self.name} 上下文预算不足，本轮省略 {fitted['dropped_history']} 条历史消息")
+
+        messages = []
+        system_content = system_prompt + fitted["tools"]
+        if system_content:
+            messages.append({"role": "system", "content": system_content})
+        messages.extend(fitted["history"])
+        messages.append({"role": "user", "content": input_text})
+        return messages
+
+    def _tool_results_message(self, messages: list[dict[str, str]], tool_results: list[str]) -> dict[str, str]:
+        """构造工具结果消息，结果按剩余的上下文预算平均分配并截断"""
+        budget = self.context_budget()
+        template = "工具执行结果: \n{results}\n\n请基于这些结果给出完整回答。"
+        remaining = budget.available - budget.tokenizer.count_messages(messages + [{"role": "user", "content": template}])
+        limit = max(0, remaining) // max(1, len(tool_results))
+        fitted = [budget.tokenizer.truncate(result, limit) for result in tool_results]
+        return {"role": "user", "content": template.format(results="\n\n".join(fitted))}
     
     def _parse_tool_call(self, text: str) -> list:
         """解析文本中的工具调用"""
@@ -125,6 +177,64 @@ class SimpleAgent(Agent):
         
         return tool_calls
 
+    def _execute_tool_calls(self, tool_calls: list) -> list[str]:
+        """执行同一轮中的全部工具调用，多个调用并行执行，结果顺序与调用顺序一致"""
+        if len(tool_calls) == 1 and self.tool_timeout is None:
+            call = tool_calls[0]
+            return [self._execute_tool_call(call['tool_name'], call['parameters'])]
+
+        submitted = [(call, self._submit_tool_call(call)) for call in tool_calls]
+        return self._collect_tool_results(submitted)
+
+    def _submit_tool_call(self, call: dict) -> tuple[concurrent.futures.Future, _ToolCallStart]:
+        """提交工具调用到线程池，返回 (future, 开始执行事件)"""
+        if len(self._runaway_tools) >= self.max_tool_workers:
+            self._replace_tool_executor()
+        if self._tool_executor is None:
+            self._tool_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_tool_workers, thread_name_prefix=f"{self.name}-tool"
+            )
+        started = _ToolCallStart()
+        future = self._tool_executor.submit(self._run_tool_call, started, call['tool_name'], call['parameters'])
+        return future, started
+
+    def _run_tool_call(self, started: _ToolCallStart, tool_name: str, parameters: str) -> str:
+        started.mark()
+        return self._execute_tool_call(tool_name, parameters)
+
+    def _collect_tool_results(self, submitted: list) -> list[str]:
+        """按提交顺序收集工具结果，超时的调用返回错误信息，不影响其他调用的结果"""
+        return [self._await_tool_call(call, future, started) for call, (future, started) in submitted]
+
+    def _await_tool_call(self, call: dict, future: concurrent.futures.Future, started: _ToolCallStart) -> str:
+        """等待单个工具调用，超时从调用开始执行时计时，排队时间不计入"""
+        if self.tool_timeout is None:
+            return future.result()
+
+        while True:
+            # 线程池已被超时调用占满时换用新的线程池，其中仍在排队的调用被取消，需要重新提交
+            if future.cancelled():
+                future, started = self._submit_tool_call(call)
+            if started.wait(timeout=self.tool_timeout):
+                break
+            if len(self._runaway_tools) >= self.max_tool_workers:
+                self._replace_tool_executor()
+
+        try:
+            return future.result(timeout=max(0.0, started.started_at + self.tool_timeout - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            if not future.done():
+                self._runaway_tools.add(future)
+                future.add_done_callback(self._runaway_tools.discard)
+            return f"❌ 工具 '{call['tool_name']}' 执行超时（{self.tool_timeout}秒）"
+
+    def _replace_tool_executor(self):
+        """丢弃被超时调用占满的线程池（取消其中排队的调用），其中的线程在调用结束后自行退出"""
+        if self._tool_executor is not None:
+            self._tool_executor.shutdown(wait=False, cancel_futures=True)
+            self._tool_executor = None
+        self._runaway_tools = set()
+
     def _execute_tool_call(self, tool_name: str, parameters: str) -> str:
         """执行工具调用"""
         if not self.tool_registry:
@@ -200,33 +310,100 @@ class SimpleAgent(Agent):
         """检查是否有可用工具"""
         return self.enable_tool_calling and self.tool_registry is not None
     
-    def stream_run(self, input_text: str, **kwargs) -> Iterator[str]:
+    def stream_run(self, input_text: str, max_tool_iterations: int = 3, **kwargs) -> Iterator[str]:
         """
         流式运行Agent
 
+        启用工具调用时，在接收过程中增量识别 [TOOL_CALL:...] 标签：标签之前的文本立即返回，
+        标签闭合后立即在后台执行工具，本轮输出结束后带着工具结果继续流式生成后续回答。
+
         Args:
             input_text (str): 用户输入
+            max_tool_iterations (int): 最多进行多少轮工具调用
 
         Yields:
-            Iterator[str]: Agent响应片段
+            Iterator[str]: Agent响应片段（不含工具调用标签）
         """
-        messages = []
-
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
-
-        for msg in self._history:
-            messages.append({"role": msg.role, "content": msg.content})
-
-        messages.append({"role": "user", "content": input_text})
+        if self.enable_tool_calling:
+            messages = self._build_messages(input_text, self.system_prompt or DEFAULT_SYSTEM_PROMPT, self._get_tools_section())
+        else:
+            messages = self._build_messages(input_text, self.system_prompt or "")
 
         # 流式调用
         full_response = ""
-        for chunk in self.llm.stream_invoke(messages, **kwargs):
-            full_response += chunk
-            yield chunk
-        
+        current_iteration = 0
+        while True:
+            submitted = []
+            segment = ""
+            allow_tools = self.enable_tool_calling and current_iteration < max_tool_iterations
+            for text in self._stream_segment(messages, submitted if allow_tools else None, **kwargs):
+                segment += text
+                yield text
+            full_response += segment
+
+            if not submitted:
+                break
+
+            # 等待本轮工具结果，带着结果继续生成
+            tool_results = self._collect_tool_results(submitted)
+            messages.append({"role": "assistant", "content": segment})
+            messages.append(self._tool_results_message(messages, tool_results))
+            current_iteration += 1
+
         # 保存对话历史
         self.add_message(Message(input_text, "user"))
         self.add_message(Message(full_response, "assistant"))
+        self._compact_history()
+
+    def _stream_segment(self, messages: list[dict[str, str]], submitted: Optional[list], **kwargs) -> Iterator[str]:
+        """
+        流式返回一次LLM输出
+
+        submitted 不为 None 时识别工具调用标签：闭合的标签立即提交执行并记录到 submitted，
+        可能是标签开头的尾部文本暂存到下一个分片到达后再判断。
+        """
+        prefix = "[TOOL_CALL:"
+        buffer = ""
+        for chunk in self.llm.stream_invoke(messages, **kwargs):
+            if submitted is None:
+                yield chunk
+                continue
+
+            buffer += chunk
+            while buffer:
+                start = buffer.find(prefix)
+                if start == -1:
+                    # 保留可能是标签开头的尾部
+                    keep = next((n for n in range(min(len(prefix), len(buffer)), 0, -1) if prefix.startswith(buffer[-n:])), 0)
+                    if len(buffer) > keep:
+                        yield buffer[:len(buffer) - keep]
+                    buffer = buffer[len(buffer) - keep:]
+                    break
+                if start > 0:
+                    yield buffer[:start]
+                    buffer = buffer[start:]
+                end = buffer.find("]")
+                if end == -1:
+                    break
+
+                tag, buffer = buffer[:end + 1], buffer[end + 1:]
+                calls = self._parse_tool_call(tag)
+                if not calls:
+                    yield tag
+                    continue
+                print(f"\n🔧 检测到工具调用: {calls[0]['tool_name']}")
+                submitted.append((calls[0], self._submit_tool_call(calls[0])))
+
+        if buffer:
+            yield buffer
+
+    def _compact_history(self):
+        """将超出窗口的旧消息移出历史，开启摘要时在后台合并进滚动摘要"""
+        evicted = self.history_policy.compact(self._history, self.llm)
+        if evicted and self.config.debug:
+            print(f"🗂️ {self.name} 移出 {len(evicted)} 条历史消息")
+
+    def clear_message(self):
+        super().clear_message()
+        self.history_policy.clear()
 
@@ -0,0 +1,280 @@
+"""Tree of Thoughts Agent实现 - 并行扩展与束搜索的推理智能体"""
+
+import threading
+import concurrent.futures
+from typing import Any
+
+from ..core.agent import Agent
+from ..core.llm import SmartAgentLLM
+from ..core.config import Config
+from ..core.message import Message
+from ..core.tokenizer import get_tokenizer
+from ..core.rate_limit import DEFAULT_COMPLETION_TOKENS
+from .reflection_agent import parse_score
+
+FINAL_ANSWER_PREFIX = "最终答案:"
+
+# 默认提示词模版
+DEFAULT_TOT_PROMPTS = {
+    "propose": """
+你正在逐步解决一个需要推理的问题。请在已有推理步骤的基础上，只给出下一步推理（一到三句话）。
+如果已有步骤足以得出结论，请以"最终答案:"开头直接给出最终答案。
+
+# 问题:
+{task}
+
+# 已有推理步骤:
+{steps}
+
+下一步推理：
+""",
+    "evaluate": """
+请评估以下推理路径对解决问题的价值：步骤是否正确、是否朝着答案推进、是否有希望得出正确结论。
+
+# 问题:
+{task}
+
+# 推理路径:
+{steps}
+
+请只输出一行"评分: X/10"。
+""",
+    "answer": """
+请根据以下推理步骤，给出问题的最终答案。
+
+# 问题:
+{task}
+
+# 推理步骤:
+{steps}
+
+最终答案：
+""",
+}
+
+
+class ThoughtNode:
+    """搜索树中的一个节点：从根到该节点的推理步骤及其评分"""
+    def __init__(self, thoughts: list[str], score: float = 0.0):
+        self.thoughts = thoughts
+        self.score = score
+
+    @property
+    def is_final(self) -> bool:
+        return bool(self.thoughts) and self.thoughts[-1].startswith(FINAL_ANSWER_PREFIX)
+
+    def render(self) -> str:
+        if not self.thoughts:
+            return "（暂无）"
+        return "\n".join(f"{i}. {thought}" for i, thought in enumerate(self.thoughts, 1))
+
+
+class TreeOfThoughtsAgent(Agent):
+    """
+    Tree of Thoughts Agent - 束搜索推理智能体
+
+    这个Agent能够：
+    1. 对束中的每个节点并行扩展 K 个候选推理步骤
+    2. 并行为候选打分，低于阈值的分支直接剪枝
+    3. 只保留评分最高的 beam_width 个节点继续搜索
+    4. 在最大深度、token 预算或得到高分最终答案时停止
+
+    用并行调用替代串行调用，适合数学、逻辑等需要探索多种思路的推理任务。
+    """
+    def __init__(
+        self,
+        name: str,
+        llm: SmartAgentLLM,
+        system_prompt: str | None = None,
+        config: Config | None = None,
+        breadth: int = 3,
+        beam_width: int = 2,
+        max_depth: int = 4,
+        max_concurrency: int = 8,
+        token_budget: int | None = 20000,
+        prune_threshold: float = 3.0,
+        accept_threshold: float = 8.0,
+        custom_prompts: dict[str, str] | None = None
+    ):
+        """
+        初始化TreeOfThoughtsAgent
+
+        Args:
+            name: Agent名称
+            llm: LLM实例
+            system_prompt: 系统提示词
+            config: 配置对象
+            breadth: 每个节点扩展的候选推理步骤数（K）
+            beam_width: 每层保留的节点数
+            max_depth: 最大搜索深度
+            max_concurrency: 同时进行的LLM调用数上限
+            token_budget: 本次运行的 token 预算（输入 + 输出），None 表示不限制；
+                每次调用前按 输入 token + max_tokens 预留，预留后会超出预算的调用不再发起
+            prune_threshold: 评分低于该值的分支被剪枝
+            accept_threshold: 最终答案评分达到该值时提前结束搜索
+            custom_prompts: 自定义提示词模板 {"propose": "", "evaluate": "", "answer": ""}
+        """
+        super().__init__(name, llm, system_prompt, config)
+        self.breadth = breadth
+        self.beam_width = beam_width
+        self.max_depth = max_depth
+        self.max_concurrency = max_concurrency
+        self.token_budget = token_budget
+        self.prune_threshold = prune_threshold
+        self.accept_threshold = accept_threshold
+        self.prompts = {**DEFAULT_TOT_PROMPTS, **(custom_prompts or {})}
+
+        self.tokenizer = get_tokenizer(getattr(llm, "model", None))
+        self.last_run_stats: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._tokens_used = 0
+        self._llm_calls = 0
+        self._skipped_calls = 0
+
+    def run(self, input_text: str, **kwargs) -> str:
+        print(f"\n🤖 {self.name} 开始处理问题: {input_text}")
+        self._tokens_used = 0
+        self._llm_calls = 0
+        self._skipped_calls = 0
+        stats = {"depth": 0, "expanded": 0, "pruned": 0, "stop_reason": "max_depth"}
+
+        beam = [ThoughtNode([])]
+        best: ThoughtNode | None = None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            for depth in range(1, self.max_depth + 1):
+                if self._over_budget():
+                    stats["stop_reason"] = "token_budget"
+                    break
+                print(f"\n--- 第 {depth} 层：扩展 {len(beam)} 个节点 × {self.breadth} ---")
+                stats["depth"] = depth
+
+                # a. 并行扩展
+                candidates = self._expand(pool, input_text, beam, **kwargs)
+                stats["expanded"] += len(candidates)
+                if not candidates:
+                    stats["stop_reason"] = "token_budget" if self._skipped_calls else "no_candidates"
+                    break
+
+                # b. 并行评分
+                self._evaluate(pool, input_text, candidates, **kwargs)
+
+                # c. 剪枝并保留束
+                survivors = [node for node in candidates if node.score >= self.prune_threshold]
+                stats["pruned"] += len(candidates) - len(survivors)
+                survivors = survivors or [max(candidates, key=lambda node: node.score)]
+                survivors.sort(key=lambda node: node.score, reverse=True)
+                print(f"🌳 候选评分: {[node.score for node in candidates]}，保留 {min(len(survivors), self.beam_width)} 个")
+
+                finals = [node for node in survivors if node.is_final]
+                if finals and (best is None or finals[0].score > best.score):
+                    best = finals[0]
+                if best is not None and best.score >= self.accept_threshold:
+                    stats["stop_reason"] = "accepted"
+                    break
+
+                beam = [node for node in survivors if not node.is_final][:self.beam_width]
+                if not beam:
+                    stats["stop_reason"] = "all_final"
+                    break
+                # 本层已有调用因预算不足被跳过，继续扩展也无法完成
+                if self._skipped_calls:
+                    stats["stop_reason"] = "token_budget"
+                    break
+
+        # 没有得到最终答案时，基于评分最高的推理路径作答
+        if best is not None:
+            final_answer = best.thoughts[-1][len(FINAL_ANSWER_PREFIX):].strip()
+        else:
+            path = max(beam, key=lambda node: node.score)
+            prompt = self.prompts["answer"].format(task=input_text, steps=path.render())
+            # 最终作答不受预算限制，保证总能给出回答
+            final_answer = self._call(prompt, enforce_budget=False, **kwargs)
+
+        stats.update({"llm_calls": self._llm_calls, "skipped_calls": self._skipped_calls, "tokens_used": self._tokens_used})
+        self.last_run_stats = stats
+        print(f"🎉 最终答案: {final_answer}")
+        print(f"📊 搜索统计: {stats}")
+
+        # 保存到历史记录
+        self.add_message(Message(input_text, "user"))
+        self.add_message(Message(final_answer, "assistant"))
+
+        return final_answer
+
+    def _expand(
+        self,
+        pool: concurrent.futures.ThreadPoolExecutor,
+        task: str,
+        beam: list[ThoughtNode],
+        **kwargs,
+    ) -> list[ThoughtNode]:
+        """为束中每个节点并行生成 breadth 个候选推理步骤，重复的候选只保留一个"""
+        # 同一节点的多次采样需要相互独立，不能与相同的并发请求合并
+        sample_kwargs = {**kwargs, "coalesce": False} if isinstance(self.llm, SmartAgentLLM) else kwargs
+        futures = [
+            (node, pool.submit(self._call, self.prompts["propose"].format(task=task, steps=node.render()), **sample_kwargs))
+            for node in beam
+            for _ in range(self.breadth)
+        ]
+
+        candidates: list[ThoughtNode] = []
+        seen: set[tuple[str, ...]] = set()
+        for node, future in futures:
+            thought = (future.result() or "").strip()
+            if not thought:
+                continue
+            thoughts = node.thoughts + [thought.replace("最终答案：", FINAL_ANSWER_PREFIX, 1)]
+            key = tuple(thoughts)
+            if key not in seen:
+                seen.add(key)
+                candidates.append(ThoughtNode(thoughts))
+        return candidates
+
+    def _evaluate(
+        self,
+        pool: concurrent.futures.ThreadPoolExecutor,
+        task: str,
+        candidates: list[ThoughtNode],
+        **kwargs,
+    ):
+        """并行为候选节点打分"""
+        futures = [
+            (node, pool.submit(self._call, self.prompts["evaluate"].format(task=task, steps=node.render()), **kwargs))
+            for node in candidates
+        ]
+        for node, future in futures:
+            score = parse_score(future.result() or "")
+            node.score = score if score is not None else 0.0
+
+    def _call(self, prompt: str, enforce_budget: bool = True, **kwargs) -> str:
+        """
+        调用LLM并计入 token 消耗
+
+        调用前预留 输入 token + max_tokens，预留后会超出预算的调用直接跳过（返回空字符串），
+        并发调用因此不会合计超支；调用结束后按实际输出的 token 数结算
+        """
+        messages = [{"role": "user", "content": prompt}]
+        prompt_tokens = self.tokenizer.count_messages(messages)
+        reserved = prompt_tokens + (kwargs.get("max_tokens") or getattr(self.llm, "max_tokens", None) or DEFAULT_COMPLETION_TOKENS)
+        with self._lock:
+            if enforce_budget and self.token_budget is not None and self._tokens_used + reserved > self.token_budget:
+                self._skipped_calls += 1
+                return ""
+            self._tokens_used += reserved
+
+        try:
+            response = self.llm.invoke(messages, **kwargs) or ""
+        except Exception:
+            with self._lock:
+                self._tokens_used -= reserved
+            raise
+
+        with self._lock:
+            self._tokens_used += prompt_tokens + self.tokenizer.count(response) - reserved
+            self._llm_calls += 1
+        return response
+
+    def _over_budget(self) -> bool:
+        with self._lock:
+            return self.token_budget is not None and self._tokens_used >= self.token_budget
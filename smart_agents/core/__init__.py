@@ -1,13 +1,44 @@
 """核心框架模块"""
 
 from .agent import Agent
-from .llm import SmartAgentLLM
+from .llm import SmartAgentLLM, AsyncSmartAgentLLM
 from .message import Message
 from .config import Config
+from .client_pool import ClientPool, global_client_pool
+from .cache import LLMCache
+from .semantic_cache import SemanticCache
+from .singleflight import SingleFlight
+from .batching import MicroBatcher
+from .llm_pool import PooledLLM
+from .resilience import RetryPolicy, HedgePolicy
+from .rate_limit import RateLimiter, get_rate_limiter
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker, get_circuit_states
+from .tokenizer import Tokenizer, ContextBudget, get_tokenizer
+from .history import HistoryPolicy
 
 __all__ = [
     "Agent",
     "SmartAgentLLM", 
+    "AsyncSmartAgentLLM",
     "Message",
     "Config",
+    "ClientPool",
+    "global_client_pool",
+    "LLMCache",
+    "SemanticCache",
+    "SingleFlight",
+    "MicroBatcher",
+    "PooledLLM",
+    "RetryPolicy",
+    "HedgePolicy",
+    "RateLimiter",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "get_circuit_breaker",
+    "get_circuit_states",
+    "Tokenizer",
+    "ContextBudget",
+    "get_tokenizer",
+    "HistoryPolicy",
+    "get_rate_limiter",
 ]
\ No newline at end of file
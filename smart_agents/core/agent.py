@@ -3,6 +3,7 @@ from typing import Optional
 from .config import Config
 from .message import Message
 from .llm import SmartAgentLLM
+from .tokenizer import ContextBudget
 
 # Agent基类
 class Agent(ABC):
@@ -25,6 +26,12 @@ class Agent(ABC):
         """运行Agent"""
         pass
 
+    def context_budget(self) -> ContextBudget:
+        """本次请求的上下文预算，Config.context_window 可覆盖按模型查表得到的窗口大小"""
+        if hasattr(self.llm, "context_budget"):
+            return self.llm.context_budget(context_window=self.config.context_window)
+        return ContextBudget(model=getattr(self.llm, "model", None), context_window=self.config.context_window)
+
     def add_message(self, message: Message):
         self._history.append(message)
 
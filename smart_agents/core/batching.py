@@ -0,0 +1,290 @@
+"""
+客户端微批处理 - 面向自部署的 vLLM 等支持多 prompt /v1/completions 的推理服务
+
+在一个很短的时间窗口内收集并发请求，按模型的对话模板渲染为 prompt，
+合并成一次多 prompt 的 /v1/completions 请求，结果按原顺序分发回各个调用方。
+
+/v1/completions 不会套用模型的对话模板，因此必须提供与 chat 接口一致的
+prompt_formatter（如 chat_template_formatter 加载的 HuggingFace 模板），
+否则批量回答的质量会与普通 chat 请求不同。
+对于 Ollama 等只做连续批处理的服务，直接并发调用即可，无需客户端凑批。
+"""
+import json
+import time
+import queue
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Optional, Any, Callable, TYPE_CHECKING
+
+import openai
+
+try:  # 可选依赖，缺失时降级能力
+    from transformers import AutoTokenizer
+except Exception:
+    AutoTokenizer = None
+
+if TYPE_CHECKING:
+    from .llm import SmartAgentLLM
+
+logger = logging.getLogger(__name__)
+
+# 支持多 prompt completions 请求的 provider
+BATCHING_PROVIDERS = {"vllm", "local"}
+
+# 角色停止序列，防止模型在回答之后继续编造下一轮对话
+ROLE_STOP_SEQUENCES = ["\nuser:", "\nUser:", "\nsystem:", "\nassistant:"]
+
+# completions 接口默认只生成 16 个 token，请求未指定 max_tokens 时使用该值
+DEFAULT_COMPLETION_MAX_TOKENS = 1024
+
+# 服务端明确不支持多 prompt completions 请求时返回的状态码（接口不存在或参数不被接受）
+BATCH_REJECTION_STATUS_CODES = {400, 404, 422}
+
+PromptFormatter = Callable[[list[dict[str, str]]], str]
+
+# 可以原样映射到 /v1/completions 的请求参数
+COMPLETION_COMPATIBLE_KEYS = {
+    "model", "messages", "temperature", "max_tokens",
+    "stop", "top_p", "seed", "presence_penalty", "frequency_penalty", "logit_bias", "user",
+}
+
+
+def chat_template_formatter(model: str) -> Optional[PromptFormatter]:
+    """
+    加载模型的 HuggingFace 对话模板，返回将 chat 消息渲染为 prompt 的函数
+
+    未安装 transformers 或模板加载失败时返回 None
+    """
+    if AutoTokenizer is None or not model:
+        logger.warning("未安装 transformers 或未指定模型，无法加载对话模板，不启用微批处理")
+        return None
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model)
+        if not getattr(tokenizer, "chat_template", None):
+            raise ValueError("模型未提供对话模板")
+    except Exception as e:
+        logger.warning("模型 %s 的对话模板加载失败，不启用微批处理: %s", model, e)
+        return None
+
+    def formatter(messages: list[dict[str, str]]) -> str:
+        return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    return formatter
+
+
+class BatchResponseMismatch(ValueError):
+    """批量响应的条数或序号与请求不一致，说明服务端没有按多 prompt 处理"""
+
+
+def is_batch_rejection(error: BaseException) -> bool:
+    """判断错误是否说明服务端不支持多 prompt 请求（超时、5xx 等临时错误不算）"""
+    if isinstance(error, BatchResponseMismatch):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in BATCH_REJECTION_STATUS_CODES
+
+
+class _PendingRequest:
+    """等待批量发送的请求"""
+    def __init__(self, request: dict[str, Any]):
+        self.request = request
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+
+
+class MicroBatcher:
+    """
+    微批处理调度器
+
+    后台线程从队列中取请求，最多等待 max_wait_ms 毫秒或凑满 max_batch_size 条后统一提交。
+    批量请求与普通请求一样经过熔断、限流与重试；批量请求失败时本批逐条改发 chat 请求，
+    只有服务端明确不支持多 prompt 请求（400 / 404 / 422 或响应条数不符）时才停用，之后的请求直接发送。
+    """
+    def __init__(
+        self,
+        llm: "SmartAgentLLM",
+        prompt_formatter: PromptFormatter,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10,
+        max_workers: int = 16,
+        stop: Optional[list[str]] = None,
+    ):
+        """
+        Args:
+            llm: 发送请求使用的 LLM 实例
+            prompt_formatter: 将 chat 消息渲染为 prompt 的函数，必须与服务端 chat 接口使用的对话模板一致
+            max_batch_size: 单批最大请求数
+            max_wait_ms: 凑批的最长等待时间（毫秒）
+            max_workers: 发送批次的工作线程数
+            stop: 批量请求附加的停止序列，默认使用角色停止序列
+        """
+        if prompt_formatter is None:
+            raise ValueError("微批处理需要提供对话模板 prompt_formatter，见 chat_template_formatter")
+        self.llm = llm
+        self.prompt_formatter = prompt_formatter
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stop = ROLE_STOP_SEQUENCES if stop is None else stop
+        self.enabled = True
+
+        self._queue: queue.Queue[Optional[_PendingRequest]] = queue.Queue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        self.fallbacks = 0
+
+    def accepts(self, request: dict[str, Any]) -> bool:
+        """判断请求能否参与批处理（工具调用、结构化输出等请求直接发送）"""
+        if not self.enabled or request.get("stream") or request.get("n", 1) != 1:
+            return False
+        if not set(request) <= COMPLETION_COMPATIBLE_KEYS:
+            return False
+        return all(isinstance(message.get("content"), str) for message in request["messages"])
+
+    def submit(self, request: dict[str, Any]) -> str:
+        """同步提交请求，阻塞等待所在批次返回"""
+        return self._enqueue(request).result()
+
+    async def asubmit(self, request: dict[str, Any]) -> str:
+        """异步提交请求，等待期间不占用线程"""
+        return await asyncio.wrap_future(self._enqueue(request))
+
+    def _enqueue(self, request: dict[str, Any]) -> concurrent.futures.Future:
+        self._ensure_started()
+        pending = _PendingRequest(request)
+        self._queue.put(pending)
+        return pending.future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="smart-agents-batcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self._queue.put(None)
+                    break
+                batch.append(pending)
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                self._fail(batch, e)
+
+    def _dispatch(self, batch: list[_PendingRequest]):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+        if not self.enabled:
+            self._submit_singles(batch)
+            return
+
+        # 只有采样参数完全一致的请求才能合并进同一个 completions 请求
+        groups: dict[str, list[_PendingRequest]] = {}
+        for pending in batch:
+            params = {k: v for k, v in pending.request.items() if k != "messages"}
+            key = json.dumps(params, sort_keys=True, default=str)
+            groups.setdefault(key, []).append(pending)
+
+        for group in groups.values():
+            if len(group) == 1:
+                self._submit_singles(group)
+            else:
+                self._submit(group, self._run_completions, group)
+
+    def _submit(self, group: list[_PendingRequest], fn: Callable, *args):
+        """提交到工作线程池，线程池已关闭时让等待中的调用方立即收到异常"""
+        try:
+            self._executor.submit(fn, *args)
+        except Exception as e:
+            self._fail(group, e)
+
+    def _submit_singles(self, group: list[_PendingRequest]):
+        for pending in group:
+            self._submit([pending], self._run_single, pending)
+
+    @staticmethod
+    def _fail(group: list[_PendingRequest], error: BaseException):
+        for pending in group:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    def _run_single(self, pending: _PendingRequest):
+        try:
+            pending.future.set_result(self.llm._complete(pending.request))
+        except Exception as e:
+            pending.future.set_exception(e)
+
+    def _completion_params(self, request: dict[str, Any]) -> dict[str, Any]:
+        """将 chat 请求参数转换为 completions 请求参数"""
+        params = {k: v for k, v in request.items() if k != "messages" and v is not None}
+        params.setdefault("max_tokens", DEFAULT_COMPLETION_MAX_TOKENS)
+        stop = params.get("stop") or []
+        stop = [stop] if isinstance(stop, str) else list(stop)
+        params["stop"] = stop + [s for s in self.stop if s not in stop]
+        return params
+
+    def _run_completions(self, group: list[_PendingRequest]):
+        try:
+            prompts = [self.prompt_formatter(pending.request["messages"]) for pending in group]
+            request = {**self._completion_params(group[0].request), "prompt": prompts}
+            response = self.llm._complete_prompts(request)
+            texts = {choice.index: choice.text for choice in response.choices}
+            if sorted(texts) != list(range(len(group))):
+                raise BatchResponseMismatch(f"批量响应数量不匹配: {len(texts)}/{len(group)}")
+        except Exception as e:
+            # 本批逐条发送（经过普通请求的重试与备用LLM）；只有服务端明确不支持多 prompt 时才停用微批处理
+            rejected = is_batch_rejection(e)
+            if rejected:
+                logger.warning("服务端不支持多 prompt completions 请求，停用微批处理: %s", e)
+            else:
+                logger.warning("批量 completions 请求失败，本批逐条发送: %s", e)
+            with self._lock:
+                self.fallbacks += 1
+                if rejected:
+                    self.enabled = False
+            self._submit_singles(group)
+            return
+
+        for i, pending in enumerate(group):
+            pending.future.set_result(texts[i].strip())
+
+    def stats(self) -> dict[str, Any]:
+        """返回批处理统计"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "batches": self.batches,
+                "batched_requests": self.batched_requests,
+                "avg_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "fallbacks": self.fallbacks,
+            }
+
+    def close(self):
+        """停止调度线程并关闭工作线程池"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,172 @@
+"""
+LLM响应缓存 - 内存 LRU + 可选 SQLite 磁盘两级缓存
+
+缓存键为请求参数 (model, messages, temperature, max_tokens, 其他参数) 的规范化哈希，
+完全相同的请求直接返回历史响应，跳过一次 LLM 往返。
+"""
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Any
+
+
+def make_cache_key(request: dict[str, Any]) -> str:
+    """根据请求参数生成规范化的缓存键"""
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    两级 LLM 响应缓存
+
+    - 内存层：LRU，按条目数和总字节数双重限制，条目带 TTL
+    - 磁盘层：可选 SQLite 文件，进程重启后仍然有效，命中后回填内存层
+    """
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+        ttl: Optional[float] = 3600,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 100_000,
+    ):
+        """
+        Args:
+            max_entries: 内存层最大条目数
+            max_bytes: 内存层最大字节数，None 表示不限制
+            ttl: 条目有效期（秒），None 表示永不过期
+            disk_path: SQLite 文件路径，None 表示不启用磁盘层
+            disk_max_entries: 磁盘层最大条目数
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: OrderedDict[str, tuple[Optional[float], str]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                self._remove(key)
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at is None or expires_at > now:
+                        self._put_memory(key, value, expires_at)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """写入缓存（同时写入内存层与磁盘层）"""
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now),
+                )
+                self._prune_disk(now)
+                self._conn.commit()
+
+    def _put_memory(self, key: str, value: str, expires_at: Optional[float]):
+        if key in self._memory:
+            self._remove(key)
+        self._memory[key] = (expires_at, value)
+        self._memory_bytes += len(value.encode("utf-8"))
+
+        # LRU淘汰：超过条目数或字节数上限时，从最久未使用的条目开始淘汰
+        while self._memory and (
+            len(self._memory) > self.max_entries
+            or (self.max_bytes is not None and self._memory_bytes > self.max_bytes)
+        ):
+            oldest_key = next(iter(self._memory))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, value = self._memory.pop(key)
+        self._memory_bytes -= len(value.encode("utf-8"))
+
+    def _prune_disk(self, now: float):
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,),
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+    def clear(self):
+        """清空所有缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def close(self):
+        """关闭磁盘连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,209 @@
+"""
+熔断器 - 按 (provider, base_url) 跟踪服务健康状态
+
+上游故障时，连续的调用会各自等待完整超时后才失败，拖垮整个 Agent 执行。
+熔断器基于滑动窗口内的失败率与慢调用率在 closed / open / half_open 三种状态间切换：
+打开期间直接快速失败，冷却结束后放行少量探测请求，探测成功即恢复。
+before_call 在半开状态放行探测请求时返回探测凭证，调用方需在 record_success / record_failure / release 时传回；
+没有当前凭证的调用（如关闭状态下发出、半开后才返回的请求）不占用也不归还探测名额，也不改变半开状态。
+"""
+import time
+import threading
+from collections import deque
+from typing import Optional, Any, Hashable
+
+import httpx
+import openai
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """判断错误是否反映服务端故障（参数错误、鉴权失败等客户端错误不计入）"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """三态熔断器"""
+    def __init__(
+        self,
+        name: str = "default",
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: Optional[float] = None,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        """
+        Args:
+            name: 熔断器名称，一般为 provider 与 base_url
+            failure_rate_threshold: 触发熔断的失败率
+            slow_call_threshold: 慢调用阈值（秒），None 表示不统计慢调用
+            slow_call_rate_threshold: 触发熔断的慢调用比例
+            window_size: 滑动窗口大小（最近调用次数）
+            min_calls: 窗口内至少多少次调用后才开始计算比例
+            open_duration: 打开状态持续时间（秒），之后进入半开状态
+            half_open_max_calls: 半开状态允许同时进行的探测请求数
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+
+        self._window: deque[tuple[bool, bool]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._probe_generation = 0
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.opened_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            self._probe_generation += 1
+
+    def _take_probe(self, probe: Optional[int]) -> bool:
+        """归还探测名额：只有本轮半开状态发出的探测凭证有效"""
+        if self._state != HALF_OPEN or probe is None or probe != self._probe_generation:
+            return False
+        self._half_open_calls -= 1
+        return True
+
+    def before_call(self) -> Optional[int]:
+        """
+        调用前检查，熔断打开或半开探测名额已满时抛出 CircuitOpenError
+
+        Returns:
+            半开状态下的探测凭证，关闭状态下为 None
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == OPEN:
+                self.rejected += 1
+                remaining = self.open_duration - (time.monotonic() - self._opened_at)
+                raise CircuitOpenError(f"熔断器 '{self.name}' 已打开，{remaining:.1f}秒后重试")
+            if self._state == HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"熔断器 '{self.name}' 半开探测中")
+                self._half_open_calls += 1
+                return self._probe_generation
+            return None
+
+    def record_success(self, latency: float, probe: Optional[int] = None):
+        """记录一次成功调用，probe 为 before_call 返回的探测凭证"""
+        slow = self.slow_call_threshold is not None and latency >= self.slow_call_threshold
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if not self._take_probe(probe):
+                    return
+                if slow:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._window.clear()
+                return
+            self._window.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self, latency: float, probe: Optional[int] = None):
+        """记录一次失败调用，probe 为 before_call 返回的探测凭证"""
+        slow = self.slow_call_threshold is not None and latency >= self.slow_call_threshold
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if self._take_probe(probe):
+                    self._open()
+                return
+            self._window.append((True, slow))
+            self._evaluate()
+
+    def release(self, probe: Optional[int] = None):
+        """调用以非服务端原因结束（如参数错误）时，归还半开探测名额"""
+        with self._lock:
+            self._take_probe(probe)
+
+    def _evaluate(self):
+        if self._state != CLOSED or len(self._window) < self.min_calls:
+            return
+        failure_rate = sum(failed for failed, _ in self._window) / len(self._window)
+        slow_rate = sum(slow for _, slow in self._window) / len(self._window)
+        if failure_rate >= self.failure_rate_threshold or (
+            self.slow_call_threshold is not None and slow_rate >= self.slow_call_rate_threshold
+        ):
+            self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.opened_count += 1
+
+    def reset(self):
+        """手动恢复为关闭状态"""
+        with self._lock:
+            self._state = CLOSED
+            self._window.clear()
+            self._half_open_calls = 0
+            self._probe_generation += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """返回熔断器当前状态"""
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._window)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "calls_in_window": calls,
+                "failure_rate": sum(failed for failed, _ in self._window) / calls if calls else 0.0,
+                "slow_call_rate": sum(slow for _, slow in self._window) / calls if calls else 0.0,
+                "rejected": self.rejected,
+                "opened_count": self.opened_count,
+                "open_remaining": max(0.0, self.open_duration - (time.monotonic() - self._opened_at)) if self._state == OPEN else 0.0,
+            }
+
+
+_breakers: dict[Hashable, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str, base_url: str, **config) -> CircuitBreaker:
+    """获取按 (provider, base_url) 共享的熔断器，首次创建时使用 config 作为参数"""
+    key = (provider, base_url)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(name=f"{provider}@{base_url}", **config)
+            _breakers[key] = breaker
+        return breaker
+
+
+def get_circuit_states() -> dict[str, dict[str, Any]]:
+    """内省接口：返回所有共享熔断器的状态"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
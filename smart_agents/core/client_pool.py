@@ -0,0 +1,119 @@
+"""
+LLM客户端连接池 - 在多个 SmartAgentLLM 实例之间复用 HTTP 连接
+
+按 (base_url, api_key, timeout) 缓存 OpenAI / AsyncOpenAI 客户端，
+同一服务商的多个 LLM 实例共享底层 httpx 连接池，避免每次对话重新握手。
+"""
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Optional, Any
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+try:  # 可选依赖，HTTP/2 需要安装 h2
+    import h2  # noqa: F401
+except Exception:
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+ClientKey = tuple[Optional[str], Optional[str], Optional[float]]
+
+
+class ClientPool:
+    """
+    进程级客户端池
+
+    同步客户端全进程共享；异步客户端按事件循环隔离，
+    避免连接跨 loop 复用导致的 "Event loop is closed" 问题。
+    """
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None,
+    ):
+        self.max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+        self.max_keepalive_connections = max_keepalive_connections or int(os.getenv("LLM_MAX_KEEPALIVE", 20))
+        self.keepalive_expiry = keepalive_expiry or float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+        if http2 is None:
+            http2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+        self.http2 = http2
+
+        self._clients: dict[ClientKey, OpenAI] = {}
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[ClientKey, AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _use_http2(self) -> bool:
+        if self.http2 and h2 is None:
+            logger.warning("未安装 h2，HTTP/2 已降级为 HTTP/1.1（pip install httpx[http2]）")
+            return False
+        return self.http2
+
+    def get_client(self, api_key: Optional[str], base_url: Optional[str], timeout: Optional[float]) -> OpenAI:
+        """获取（或创建）共享的同步客户端"""
+        key = (base_url, api_key, timeout)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=timeout,
+                    http_client=DefaultHttpxClient(limits=self._limits(), http2=self._use_http2()),
+                )
+                self._clients[key] = client
+            return client
+
+    def get_async_client(self, api_key: Optional[str], base_url: Optional[str], timeout: Optional[float]) -> AsyncOpenAI:
+        """获取（或创建）当前事件循环内共享的异步客户端，必须在事件循环中调用"""
+        loop = asyncio.get_running_loop()
+        key = (base_url, api_key, timeout)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=timeout,
+                    http_client=DefaultAsyncHttpxClient(limits=self._limits(), http2=self._use_http2()),
+                )
+                clients[key] = client
+            return client
+
+    def stats(self) -> dict[str, Any]:
+        """返回连接池状态"""
+        with self._lock:
+            return {
+                "sync_clients": len(self._clients),
+                "async_clients": sum(len(clients) for clients in self._async_clients.values()),
+                "max_connections": self.max_connections,
+                "max_keepalive_connections": self.max_keepalive_connections,
+                "keepalive_expiry": self.keepalive_expiry,
+                "http2": self.http2 and h2 is not None,
+            }
+
+    def close(self):
+        """关闭所有同步客户端；异步客户端随事件循环回收"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._async_clients.clear()
+
+
+# 全局客户端池
+global_client_pool = ClientPool()
@@ -17,6 +17,10 @@ class Config(BaseModel):
 
     # 其他配置
     max_history_length: int = 100
+    max_history_tokens: Optional[int] = None
+    history_summary: bool = False
+    # 模型上下文窗口（token），None 时按模型名称查表，未知模型按 8192 计
+    context_window: Optional[int] = None
 
     @classmethod
     def from_env(cls) -> "Config":
@@ -26,6 +30,9 @@ class Config(BaseModel):
             log_level=os.getenv("LOG_LEVEL", "INFO"),
             temperature=float(os.getenv("TEMPERATURE", "0.7")),
             max_tokens=int(os.getenv("MAX_TOKENS")) if os.getenv("MAX_TOKENS") else None,
+            max_history_tokens=int(os.getenv("MAX_HISTORY_TOKENS")) if os.getenv("MAX_HISTORY_TOKENS") else None,
+            history_summary=os.getenv("HISTORY_SUMMARY", "false").lower() == "true",
+            context_window=int(os.getenv("CONTEXT_WINDOW")) if os.getenv("CONTEXT_WINDOW") else None,
         )
     
     def to_dict(self) -> dict[str,Any]:
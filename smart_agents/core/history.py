@@ -0,0 +1,197 @@
+"""
+对话历史策略 - 按消息条数与 token 预算维护滑动窗口
+
+长会话如果每轮都重放完整历史，token 与延迟会随轮数持续增长直到超出上下文。
+HistoryPolicy 在每轮结束后将最旧的消息移出窗口；开启摘要时，移出的消息
+由后台线程合并进滚动摘要，不阻塞当前对话。
+"""
+import threading
+import concurrent.futures
+from typing import Optional, Any, TYPE_CHECKING
+
+from .message import Message
+from .tokenizer import Tokenizer, get_tokenizer
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .llm import SmartAgentLLM
+
+SUMMARY_PROMPT = """请将以下对话内容合并进已有摘要，保留用户的关键信息、偏好、已确认的结论和未完成的事项，
+输出不超过{max_chars}字的中文摘要，只输出摘要本身。
+
+已有摘要:
+{summary}
+
+新增对话:
+{conversation}
+"""
+
+
+class HistoryPolicy:
+    """滑动窗口历史策略，可选滚动摘要"""
+    def __init__(
+        self,
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        summarize: bool = False,
+        summary_llm: Optional["SmartAgentLLM"] = None,
+        summary_max_tokens: int = 512,
+    ):
+        """
+        Args:
+            max_messages: 窗口内最多保留的消息条数，None 表示不限制
+            max_tokens: 窗口内历史消息的 token 上限（含摘要），None 表示不限制
+            summarize: 是否将移出窗口的消息合并进滚动摘要
+            summary_llm: 生成摘要使用的 LLM，默认使用 Agent 自身的 LLM
+            summary_max_tokens: 摘要的 token 上限
+        """
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary_llm = summary_llm
+        self.summary_max_tokens = summary_max_tokens
+
+        self.summary = ""
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pending: Optional[concurrent.futures.Future] = None
+
+        self.evicted = 0
+        self.summaries = 0
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "HistoryPolicy":
+        """根据 Agent 配置创建策略"""
+        return cls(
+            max_messages=config.max_history_length,
+            max_tokens=config.max_history_tokens,
+            summarize=config.history_summary,
+        )
+
+    def summary_message(self) -> Optional[dict[str, str]]:
+        """当前摘要对应的系统消息，尚无摘要时返回 None"""
+        with self._lock:
+            summary = self.summary
+        if not summary:
+            return None
+        return {"role": "system", "content": f"以下是之前对话的摘要:\n{summary}"}
+
+    def build_messages(self, history: list[Message]) -> list[dict[str, str]]:
+        """构造发送给 LLM 的历史消息（摘要 + 窗口内消息）"""
+        messages = []
+        summary = self.summary_message()
+        if summary is not None:
+            messages.append(summary)
+        messages.extend({"role": msg.role, "content": msg.content} for msg in history)
+        return messages
+
+    def _window_start(self, history: list[Message], tokenizer: Tokenizer) -> int:
+        """计算窗口起始位置：从最新消息向前装填，直到超出条数或 token 限制"""
+        start = len(history)
+        if self.max_messages is not None:
+            floor = max(0, len(history) - self.max_messages)
+        else:
+            floor = 0
+
+        remaining = self.max_tokens
+        if remaining is not None:
+            summary = self.summary_message()
+            if summary is not None:
+                remaining -= tokenizer.count_message(summary)
+
+        while start > floor:
+            if remaining is not None:
+                cost = tokenizer.count_message(history[start - 1])
+                if cost > remaining:
+                    break
+                remaining -= cost
+            start -= 1
+
+        # 窗口不以 assistant 消息开头，避免留下缺少提问的孤立回答
+        while start < len(history) and history[start].role == "assistant":
+            start += 1
+        return start
+
+    def compact(self, history: list[Message], llm: Optional["SmartAgentLLM"] = None) -> list[Message]:
+        """
+        将超出窗口的旧消息从 history 中原地移除
+
+        Args:
+            history: Agent 的历史消息列表（会被原地修改）
+            llm: 生成摘要的默认 LLM
+
+        Returns:
+            被移出窗口的消息
+        """
+        if self.max_messages is None and self.max_tokens is None:
+            return []
+
+        tokenizer = get_tokenizer(llm.model) if llm is not None else get_tokenizer()
+        start = self._window_start(history, tokenizer)
+        if start == 0:
+            return []
+
+        evicted = history[:start]
+        del history[:start]
+        self.evicted += len(evicted)
+
+        summary_llm = self.summary_llm or llm
+        if self.summarize and summary_llm is not None:
+            self._schedule_summary(evicted, summary_llm, tokenizer)
+        return evicted
+
+    def _schedule_summary(self, evicted: list[Message], llm: "SmartAgentLLM", tokenizer: Tokenizer):
+        """在后台线程中将移出的消息合并进摘要，多次提交按顺序执行"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="smart-agents-history"
+                )
+            self._pending = self._executor.submit(self._summarize, evicted, llm, tokenizer)
+
+    def _summarize(self, evicted: list[Message], llm: "SmartAgentLLM", tokenizer: Tokenizer):
+        conversation = "\n".join(f"{msg.role}: {msg.content}" for msg in evicted)
+        with self._lock:
+            summary = self.summary
+        prompt = SUMMARY_PROMPT.format(
+            max_chars=self.summary_max_tokens,
+            summary=summary or "无",
+            conversation=conversation,
+        )
+        try:
+            result = llm.invoke([{"role": "user", "content": prompt}], temperature=0)
+        except Exception as e:
+            print(f"⚠️ 历史摘要生成失败: {e}")
+            return
+
+        result = tokenizer.truncate((result or "").strip(), self.summary_max_tokens)
+        with self._lock:
+            self.summary = result
+            self.summaries += 1
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待正在进行的摘要任务完成"""
+        with self._lock:
+            pending = self._pending
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+    def clear(self):
+        """清空摘要与统计"""
+        self.wait()
+        with self._lock:
+            self.summary = ""
+            self.evicted = 0
+            self.summaries = 0
+
+    def stats(self) -> dict[str, Any]:
+        """返回历史策略统计"""
+        with self._lock:
+            return {
+                "max_messages": self.max_messages,
+                "max_tokens": self.max_tokens,
+                "evicted": self.evicted,
+                "summaries": self.summaries,
+                "summary_pending": self._pending is not None and not self._pending.done(),
+                "has_summary": bool(self.summary),
+            }
@@ -1,7 +1,18 @@
 import os
-from typing import Optional, Iterator, Literal
-from openai import OpenAI
+import time
+import asyncio
+from typing import Optional, Iterator, AsyncIterator, Literal, Any
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from .client_pool import ClientPool, global_client_pool
+from .cache import LLMCache, make_cache_key
+from .semantic_cache import SemanticCache
+from .singleflight import SingleFlight
+from .batching import MicroBatcher, PromptFormatter, BATCHING_PROVIDERS, chat_template_formatter
+from .resilience import RetryPolicy, HedgePolicy
+from .rate_limit import RateLimiter, get_rate_limiter
+from .circuit_breaker import CircuitBreaker, get_circuit_breaker, is_provider_failure
+from .tokenizer import Tokenizer, ContextBudget, get_tokenizer
 
 load_dotenv()
 
@@ -19,6 +30,9 @@ SUPPORTED_PROVIDERS = Literal[
     "custom",
 ]
 
+# 框架内部使用的调用选项，不会透传给服务端
+CALL_OPTIONS = ("force_cache", "cache_namespace", "skip_semantic_cache", "coalesce")
+
 class SmartAgentLLM:
     """LLM backend"""
     def __init__(
@@ -30,6 +44,16 @@ class SmartAgentLLM:
             temperature: float = 0.7,
             max_tokens: Optional[int] = None, 
             timeout: Optional[int] = None,
+            client_pool: Optional[ClientPool] = None,
+            cache: Optional[LLMCache] = None,
+            semantic_cache: Optional[SemanticCache] = None,
+            single_flight: Optional[SingleFlight] = None,
+            batching: bool | MicroBatcher | PromptFormatter = False,
+            retry_policy: Optional[RetryPolicy] = None,
+            hedge_policy: Optional[HedgePolicy] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            circuit_breaker: bool | CircuitBreaker = False,
+            fallback_llm: Optional["SmartAgentLLM"] = None,
             **kwargs
         ):
 
@@ -38,6 +62,13 @@ class SmartAgentLLM:
         self.max_tokens = max_tokens
         self.kwargs = kwargs
         self.timeout = timeout or int(os.getenv("LLM_TIMEOUT", 60))
+        self.client_pool = client_pool or global_client_pool
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.single_flight = single_flight
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        self.fallback_llm = fallback_llm
 
         # 自动检测LLM Provider
         requested_provider = (provider or "").lower() if provider else None
@@ -52,14 +83,40 @@ class SmartAgentLLM:
 
         # 验证必要参数（需要吗）
         if not self.model:
-            self._get_default_model()
+            self.model = self._get_default_model()
         if not all([self.api_key, self.base_url]):
             raise ValueError("需在.env文档中定义API密钥和服务地址")
+
+        # 同一 provider / API Key 的实例共享限流配额（{PROVIDER}_RPM / {PROVIDER}_TPM）
+        self.rate_limiter = rate_limiter or get_rate_limiter(
+            (self.provider, self.base_url, self.api_key), provider=self.provider
+        )
+
+        # 同一 (provider, base_url) 的实例共享熔断器
+        if isinstance(circuit_breaker, CircuitBreaker):
+            self.circuit_breaker = circuit_breaker
+        elif circuit_breaker:
+            self.circuit_breaker = get_circuit_breaker(self.provider, self.base_url)
+        else:
+            self.circuit_breaker = None
         
         self._client = self._create_client()
 
+        # 自部署服务启用微批处理：batching 可以是对话模板函数；为 True 时加载模型的 HuggingFace 对话模板，
+        # 没有可用模板时不启用，避免以错误的格式渲染 prompt
+        self.batcher = None
+        if isinstance(batching, MicroBatcher):
+            self.batcher = batching
+        elif batching and self.provider in BATCHING_PROVIDERS:
+            formatter = batching if callable(batching) else chat_template_formatter(self.model)
+            if formatter is not None:
+                self.batcher = MicroBatcher(self, formatter)
+
     def _create_client(self) -> OpenAI:
-        return OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+        """从客户端池获取共享客户端，相同服务地址的实例复用热连接"""
+        client = self.client_pool.get_client(self.api_key, self.base_url, self.timeout)
+        # 由 RetryPolicy 接管重试时关闭 SDK 内置重试，避免重试次数叠加
+        return client.with_options(max_retries=0) if self.retry_policy else client
 
     def _auto_detect_provider(self, api_key: Optional[str], base_url: Optional[str]) -> str:
         """
@@ -245,6 +302,24 @@ class SmartAgentLLM:
             else:
                 return "gpt-3.5-turbo"
 
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """当前模型的 tokenizer"""
+        return get_tokenizer(self.model)
+
+    def count_tokens(self, messages: list[dict[str, str]]) -> int:
+        """计算消息列表的 token 数"""
+        return self.tokenizer.count_messages(messages)
+
+    def context_budget(self, reserve_output: Optional[int] = None, context_window: Optional[int] = None) -> ContextBudget:
+        """创建当前模型的上下文预算，默认为输出预留 max_tokens（未设置时 1024）"""
+        return ContextBudget(
+            model=self.model,
+            context_window=context_window,
+            reserve_output=reserve_output or self.max_tokens or 1024,
+            tokenizer=self.tokenizer,
+        )
+
     def think(self, messages: list[dict[str, str]], temperature: Optional[float] = None) -> Iterator[str]:
         """
         调用大模型进行思考, 并返回流式响应
@@ -268,24 +343,384 @@ class SmartAgentLLM:
         except Exception as e:
             print(f"调用LLM发生错误{e}")
 
+    def _build_request(self, messages: list[dict[str, str]], **kwargs) -> dict[str, Any]:
+        """组装 chat.completions.create 的请求参数，同步与异步调用共用"""
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": kwargs.get('temperature', self.temperature),
+            "max_tokens": kwargs.get('max_tokens', self.max_tokens),
+            **{k: v for k, v in kwargs.items() if k not in ['temperature', 'max_tokens']}
+        }
+
+    def _pop_call_options(self, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """从调用参数中取出框架内部选项"""
+        return {key: kwargs.pop(key) for key in CALL_OPTIONS if key in kwargs}
+
+    def _lookup_cache(self, request: dict[str, Any], options: dict[str, Any]) -> tuple[Optional[str], tuple]:
+        """
+        依次查询精确缓存与语义缓存
+
+        temperature > 0 时输出具有随机性, 除非调用方传入 force_cache=True, 否则自动绕过缓存
+
+        Returns:
+            (缓存回答, 写回缓存所需的键)，未命中时缓存回答为 None
+        """
+        if (request.get("temperature") or 0) > 0 and not options.get("force_cache"):
+            return None, (None, None)
+
+        exact_key = make_cache_key(request) if self.cache is not None else None
+        if exact_key:
+            cached = self.cache.get(exact_key)
+            if cached is not None:
+                return cached, (exact_key, None)
+
+        semantic_target = self._semantic_target(request, options)
+        if semantic_target:
+            hit = self.semantic_cache.lookup(*semantic_target)
+            if hit is not None:
+                return hit[0], (exact_key, None)
+
+        return None, (exact_key, semantic_target)
+
+    def _store_cache(self, cache_keys: tuple, content: Optional[str]):
+        """将新响应写回缓存"""
+        if content is None:
+            return
+        exact_key, semantic_target = cache_keys
+        if exact_key:
+            self.cache.set(exact_key, content)
+        if semantic_target:
+            self.semantic_cache.add(*semantic_target, content)
+
+    def _semantic_target(self, request: dict[str, Any], options: dict[str, Any]) -> Optional[tuple[str, str]]:
+        """
+        计算语义缓存的 (命名空间, 文本)
+
+        只对最后一轮用户输入做相似度匹配；命名空间由调用方的 cache_namespace
+        与之前的上下文（系统提示词、历史对话）共同决定，不同 Agent 互不串扰
+        """
+        if self.semantic_cache is None or options.get("skip_semantic_cache"):
+            return None
+        messages = request.get("messages") or []
+        if not messages or messages[-1].get("role") != "user" or not isinstance(messages[-1].get("content"), str):
+            return None
+
+        context = {k: v for k, v in request.items() if k != "messages"}
+        context["messages"] = messages[:-1]
+        namespace = f"{options.get('cache_namespace') or 'default'}:{make_cache_key(context)[:16]}"
+        return namespace, messages[-1]["content"]
+
+    def _flight_key(self, request: dict[str, Any], options: dict[str, Any]) -> Optional[str]:
+        """计算请求合并指纹, 返回 None 表示本次调用不参与合并"""
+        if self.single_flight is None or options.get("coalesce") is False:
+            return None
+        return make_cache_key({"base_url": self.base_url, **request})
+
     def invoke(self, messages: list[dict[str, str]], **kwargs) -> str:
         """
         非流式调用LLM, 返回完整响应
         适用于不需要流式输出的场景
+
+        可选调用参数:
+            force_cache: temperature > 0 时仍然使用缓存
+            cache_namespace: 语义缓存命名空间
+            skip_semantic_cache: 本次调用跳过语义缓存
+            coalesce: 传入 False 时不与其他并发的相同请求合并（如需要多个独立采样）
         """
+        options = self._pop_call_options(kwargs)
+        request = self._build_request(messages, **kwargs)
+        cached, cache_keys = self._lookup_cache(request, options)
+        if cached is not None:
+            return cached
+
+        flight_key = self._flight_key(request, options)
+        if flight_key:
+            content = self.single_flight.do(flight_key, lambda: self._dispatch(request))
+        else:
+            content = self._dispatch(request)
+        self._store_cache(cache_keys, content)
+        return content
+
+    def _dispatch(self, request: dict[str, Any]) -> str:
+        """可批处理的请求交给微批调度器, 其余请求直接发送"""
+        if self.batcher is not None and self.batcher.accepts(request):
+            return self.batcher.submit(request)
+        return self._complete(request)
+
+    def _complete(self, request: dict[str, Any]) -> str:
+        """发送非流式请求, 按配置进行对冲与重试"""
+        def send() -> str:
+            if self.hedge_policy is not None:
+                return self.hedge_policy.call(lambda: self._request(request))
+            return self._request(request)
+
         try:
-            response = self._client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=kwargs.get('temperature', self.temperature),
-                max_tokens=kwargs.get('max_tokens', self.max_tokens),
-                **{k: v for k, v in kwargs.items() if k not in ['temperature', 'max_tokens']}
-            )
-            return response.choices[0].message.content
+            if self.retry_policy is not None:
+                return self.retry_policy.call(send)
+            return send()
+        except Exception as e:
+            if self.fallback_llm is not None:
+                print(f"⚠️ LLM调用失败，切换到备用LLM: {e}")
+                return self.fallback_llm.invoke(request["messages"], **self._fallback_params(request))
+            raise ValueError(f"LLM调用失败{e}") from e
+
+    @staticmethod
+    def _fallback_params(request: dict[str, Any]) -> dict[str, Any]:
+        """备用LLM使用自己的模型, 其余请求参数保持不变"""
+        return {k: v for k, v in request.items() if k not in ("model", "messages")}
+
+    def _request(self, request: dict[str, Any]) -> str:
+        """向服务端发送一次非流式请求, 返回文本内容"""
+        return self._send(request).choices[0].message.content
+
+    def _complete_prompts(self, request: dict[str, Any]) -> Any:
+        """
+        发送一次多 prompt 的 /v1/completions 请求（供微批处理使用）
+
+        与普通请求共用熔断、限流与重试；失败时直接抛出原始异常，由调用方逐条改发 chat 请求（含备用LLM）
+        """
+        send = lambda: self._send(request, completions=True)
+        if self.retry_policy is not None:
+            return self.retry_policy.call(send)
+        return send()
+
+    def _send(self, request: dict[str, Any], completions: bool = False) -> Any:
+        """向服务端发送一次非流式请求（先经过熔断检查与限流）, 返回原始响应; completions=True 时发送 completions 请求"""
+        probe = self.circuit_breaker.before_call() if self.circuit_breaker is not None else None
+        reserved = self.rate_limiter.acquire(request) if self.rate_limiter else None
+        started = time.monotonic()
+        try:
+            if completions:
+                response = self._client.completions.create(**request)
+            else:
+                response = self._client.chat.completions.create(**request)
         except Exception as e:
-            raise ValueError(f"LLM调用失败{e}")
+            self._record_outcome(started, probe, e)
+            self._refund(reserved)
+            raise
+        self._record_outcome(started, probe)
+        if reserved is not None:
+            self.rate_limiter.reconcile(reserved, self._usage_tokens(response))
+        return response
+
+    def invoke_with_tools(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        tool_choice: str | dict[str, Any] = "auto",
+        **kwargs,
+    ) -> Any:
+        """
+        原生 function calling 调用
+
+        Args:
+            messages: 消息列表（可包含 assistant 的 tool_calls 消息与 tool 结果消息）
+            tools: 工具 schema 列表，见 ToolRegistry.get_openai_tools
+            tool_choice: auto / none / required 或指定工具
+
+        Returns:
+            assistant 消息对象，包含 content 与 tool_calls
+        """
+        self._pop_call_options(kwargs)
+        request = self._build_request(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+
+        def send() -> Any:
+            if self.hedge_policy is not None:
+                return self.hedge_policy.call(lambda: self._send(request).choices[0].message)
+            return self._send(request).choices[0].message
+
+        try:
+            if self.retry_policy is not None:
+                return self.retry_policy.call(send)
+            return send()
+        except Exception as e:
+            if self.fallback_llm is not None and hasattr(self.fallback_llm, "invoke_with_tools"):
+                print(f"⚠️ LLM调用失败，切换到备用LLM: {e}")
+                return self.fallback_llm.invoke_with_tools(messages, tools, tool_choice, **kwargs)
+            raise ValueError(f"LLM调用失败{e}") from e
+
+    def _record_outcome(self, started: float, probe: Optional[int], error: Optional[Exception] = None):
+        """向熔断器汇报一次调用结果，probe 为 before_call 返回的探测凭证"""
+        if self.circuit_breaker is None:
+            return
+        latency = time.monotonic() - started
+        if error is None:
+            self.circuit_breaker.record_success(latency, probe)
+        elif is_provider_failure(error):
+            self.circuit_breaker.record_failure(latency, probe)
+        else:
+            self.circuit_breaker.release(probe)
+
+    def _refund(self, reserved: Optional[int]):
+        """请求失败时归还预留的 token 配额"""
+        if reserved is not None:
+            self.rate_limiter.reconcile(reserved, 0)
+
+    @staticmethod
+    def _usage_tokens(response: Any) -> Optional[int]:
+        """读取响应中的实际 token 用量"""
+        usage = getattr(response, "usage", None)
+        return getattr(usage, "total_tokens", None) if usage else None
         
     def stream_invoke(self, messages: list[dict[str, str]], **kwargs) -> Iterator[str]:
-        temperature = kwargs.get("temperature")
-        yield from self.think(messages, temperature)
-        
\ No newline at end of file
+        """流式调用LLM, 逐块返回响应内容"""
+        self._pop_call_options(kwargs)
+        request = self._build_request(messages, **kwargs)
+        try:
+            probe = self.circuit_breaker.before_call() if self.circuit_breaker is not None else None
+            reserved = self.rate_limiter.acquire(request) if self.rate_limiter else None
+            started = time.monotonic()
+            try:
+                response = self._client.chat.completions.create(stream=True, **request)
+            except Exception as e:
+                self._record_outcome(started, probe, e)
+                self._refund(reserved)
+                raise
+            self._record_outcome(started, probe)
+            try:
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content or ""
+                    if content:
+                        yield content
+            finally:
+                # 调用方提前停止迭代时关闭连接，服务端随之停止生成
+                response.close()
+        except Exception as e:
+            raise ValueError(f"LLM流式调用失败{e}")
+
+
+class AsyncSmartAgentLLM(SmartAgentLLM):
+    """
+    异步 LLM backend
+
+    基于 AsyncOpenAI，provider 解析逻辑与 SmartAgentLLM 完全一致。
+    ainvoke / astream 不占用线程，单个事件循环即可驱动大量并发请求；
+    同步的 invoke / stream_invoke 仍然可用，便于直接传给现有 Agent。
+    """
+    def _get_async_client(self) -> AsyncOpenAI:
+        """从客户端池获取当前事件循环的共享异步客户端"""
+        client = self.client_pool.get_async_client(self.api_key, self.base_url, self.timeout)
+        return client.with_options(max_retries=0) if self.retry_policy else client
+
+    async def ainvoke(self, messages: list[dict[str, str]], **kwargs) -> str:
+        """异步非流式调用LLM, 返回完整响应，可选调用参数与 invoke 相同"""
+        options = self._pop_call_options(kwargs)
+        request = self._build_request(messages, **kwargs)
+        cached, cache_keys = self._lookup_cache(request, options)
+        if cached is not None:
+            return cached
+
+        flight_key = self._flight_key(request, options)
+        if flight_key:
+            content = await self.single_flight.do_async(flight_key, lambda: self._adispatch(request))
+        else:
+            content = await self._adispatch(request)
+        self._store_cache(cache_keys, content)
+        return content
+
+    async def _adispatch(self, request: dict[str, Any]) -> str:
+        """可批处理的请求交给微批调度器, 其余请求直接发送"""
+        if self.batcher is not None and self.batcher.accepts(request):
+            return await self.batcher.asubmit(request)
+        return await self._acomplete(request)
+
+    async def _acomplete(self, request: dict[str, Any]) -> str:
+        """发送异步非流式请求, 按配置进行对冲与重试"""
+        async def send() -> str:
+            if self.hedge_policy is not None:
+                return await self.hedge_policy.acall(lambda: self._arequest(request))
+            return await self._arequest(request)
+
+        try:
+            if self.retry_policy is not None:
+                return await self.retry_policy.acall(send)
+            return await send()
+        except Exception as e:
+            if self.fallback_llm is not None:
+                print(f"⚠️ LLM调用失败，切换到备用LLM: {e}")
+                params = self._fallback_params(request)
+                if isinstance(self.fallback_llm, AsyncSmartAgentLLM):
+                    return await self.fallback_llm.ainvoke(request["messages"], **params)
+                return await asyncio.to_thread(self.fallback_llm.invoke, request["messages"], **params)
+            raise ValueError(f"LLM调用失败{e}") from e
+
+    async def _arequest(self, request: dict[str, Any]) -> str:
+        """向服务端发送一次异步非流式请求, 返回文本内容"""
+        return (await self._asend(request)).choices[0].message.content
+
+    async def _asend(self, request: dict[str, Any]) -> Any:
+        """向服务端发送一次异步非流式请求（先经过熔断检查与限流）, 返回原始响应"""
+        probe = self.circuit_breaker.before_call() if self.circuit_breaker is not None else None
+        reserved = await self.rate_limiter.aacquire(request) if self.rate_limiter else None
+        started = time.monotonic()
+        try:
+            response = await self._get_async_client().chat.completions.create(**request)
+        except Exception as e:
+            self._record_outcome(started, probe, e)
+            self._refund(reserved)
+            raise
+        self._record_outcome(started, probe)
+        if reserved is not None:
+            self.rate_limiter.reconcile(reserved, self._usage_tokens(response))
+        return response
+
+    async def ainvoke_with_tools(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        tool_choice: str | dict[str, Any] = "auto",
+        **kwargs,
+    ) -> Any:
+        """异步原生 function calling 调用，参数与返回值同 invoke_with_tools"""
+        self._pop_call_options(kwargs)
+        request = self._build_request(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+
+        async def send() -> Any:
+            if self.hedge_policy is not None:
+                return await self.hedge_policy.acall(lambda: self._amessage(request))
+            return await self._amessage(request)
+
+        try:
+            if self.retry_policy is not None:
+                return await self.retry_policy.acall(send)
+            return await send()
+        except Exception as e:
+            if self.fallback_llm is not None and hasattr(self.fallback_llm, "invoke_with_tools"):
+                print(f"⚠️ LLM调用失败，切换到备用LLM: {e}")
+                if isinstance(self.fallback_llm, AsyncSmartAgentLLM):
+                    return await self.fallback_llm.ainvoke_with_tools(messages, tools, tool_choice, **kwargs)
+                return await asyncio.to_thread(self.fallback_llm.invoke_with_tools, messages, tools, tool_choice, **kwargs)
+            raise ValueError(f"LLM调用失败{e}") from e
+
+    async def _amessage(self, request: dict[str, Any]) -> Any:
+        return (await self._asend(request)).choices[0].message
+
+    async def astream(self, messages: list[dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """异步流式调用LLM, 以异步迭代器逐块返回响应内容"""
+        self._pop_call_options(kwargs)
+        request = self._build_request(messages, **kwargs)
+        try:
+            probe = self.circuit_breaker.before_call() if self.circuit_breaker is not None else None
+            reserved = await self.rate_limiter.aacquire(request) if self.rate_limiter else None
+            started = time.monotonic()
+            try:
+                response = await self._get_async_client().chat.completions.create(stream=True, **request)
+            except Exception as e:
+                self._record_outcome(started, probe, e)
+                self._refund(reserved)
+                raise
+            self._record_outcome(started, probe)
+            try:
+                async for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content or ""
+                    if content:
+                        yield content
+            finally:
+                await response.close()
+        except Exception as e:
+            raise ValueError(f"LLM流式调用失败{e}")
@@ -0,0 +1,323 @@
+"""
+多端点 LLM 池 - 将多个服务端点组合成一个逻辑 LLM
+
+典型场景：多个 vLLM 副本 + 一个云服务商兜底。每次调用按负载均衡策略选择端点，
+连续失败的端点会被摘除一段时间，失败的请求自动转移到其他端点。
+只有端点故障（5xx、超时、连接错误、熔断打开）才计入失败并转移；
+参数错误、鉴权失败、超出上下文长度等客户端错误直接抛给调用方，换端点也不会成功。
+"""
+import time
+import threading
+from typing import Optional, Any, Iterator, AsyncIterator, Literal
+
+from .llm import SmartAgentLLM, AsyncSmartAgentLLM
+from .resilience import HedgePolicy
+from .circuit_breaker import CircuitOpenError, is_provider_failure
+
+BALANCE_STRATEGIES = Literal["least_outstanding", "ewma"]
+
+
+class EndpointUnavailableError(RuntimeError):
+    """端点无法处理本次调用（如同步端点收到异步调用）"""
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """
+    判断错误是否由端点故障引起
+
+    SmartAgentLLM 会把原始错误包装为 ValueError，因此沿异常链查找 5xx、超时、连接错误与熔断打开
+    """
+    seen: set[int] = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, (CircuitOpenError, EndpointUnavailableError)) or is_provider_failure(error):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class _Endpoint:
+    """单个端点及其运行统计"""
+    def __init__(self, llm: SmartAgentLLM, name: str, priority: int = 0):
+        self.llm = llm
+        self.name = name
+        self.priority = priority
+
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return self.unhealthy_until <= now
+
+    def snapshot(self, now: float) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "provider": self.llm.provider,
+            "base_url": self.llm.base_url,
+            "model": self.llm.model,
+            "priority": self.priority,
+            "healthy": self.is_healthy(now),
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+class PooledLLM:
+    """
+    多端点 LLM 池
+
+    与 SmartAgentLLM 提供相同的 invoke / ainvoke / stream_invoke / astream /
+    invoke_with_tools / ainvoke_with_tools 接口，可以直接传给任意 Agent 使用。
+    """
+    def __init__(
+        self,
+        endpoints: list[dict[str, Any] | SmartAgentLLM],
+        strategy: BALANCE_STRATEGIES = "least_outstanding",
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        ewma_alpha: float = 0.3,
+        hedge_policy: Optional[HedgePolicy] = None,
+    ):
+        """
+        Args:
+            endpoints: 端点列表，元素为 SmartAgentLLM 实例或其构造参数字典；
+                字典中可额外指定 name（端点名称）和 priority（数值越小越优先，用于兜底端点）
+            strategy: 负载均衡策略，least_outstanding（最少在途请求）或 ewma（延迟加权）
+            failure_threshold: 连续失败多少次后摘除端点
+            cooldown: 端点被摘除后的冷却时间（秒）
+            ewma_alpha: 延迟指数滑动平均的平滑系数
+            hedge_policy: 对冲策略，主请求超过 p95 延迟时向另一个端点发出重复请求
+        """
+        if not endpoints:
+            raise ValueError("LLM池至少需要一个端点")
+
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        self.hedge_policy = hedge_policy
+        self._lock = threading.Lock()
+
+        self.endpoints: list[_Endpoint] = []
+        for i, endpoint in enumerate(endpoints):
+            if isinstance(endpoint, SmartAgentLLM):
+                self.endpoints.append(_Endpoint(endpoint, f"{endpoint.provider}-{i}"))
+            else:
+                config = dict(endpoint)
+                name = config.pop("name", None)
+                priority = config.pop("priority", 0)
+                llm = AsyncSmartAgentLLM(**config)
+                self.endpoints.append(_Endpoint(llm, name or f"{llm.provider}-{i}", priority))
+
+        self.provider = "pool"
+        self.model = self.endpoints[0].llm.model
+        self.base_url = self.endpoints[0].llm.base_url
+
+    def _select(self, exclude: set[int]) -> Optional[_Endpoint]:
+        """按策略选择端点并登记在途请求"""
+        now = time.time()
+        with self._lock:
+            candidates = [ep for i, ep in enumerate(self.endpoints) if i not in exclude]
+            if not candidates:
+                return None
+
+            healthy = [ep for ep in candidates if ep.is_healthy(now)]
+            if healthy:
+                top_priority = min(ep.priority for ep in healthy)
+                pool = [ep for ep in healthy if ep.priority == top_priority]
+            else:
+                # 全部不健康时，选冷却最早结束的端点进行探测
+                pool = [min(candidates, key=lambda ep: ep.unhealthy_until)]
+
+            if self.strategy == "ewma":
+                # 尚无延迟样本的端点优先，以便尽快获得统计
+                chosen = min(pool, key=lambda ep: (ep.ewma_latency or 0.0) * (ep.outstanding + 1))
+            else:
+                chosen = min(pool, key=lambda ep: (ep.outstanding, ep.ewma_latency or 0.0))
+
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def _release(self, endpoint: _Endpoint, started: float, error: Optional[Exception] = None):
+        """请求结束：更新延迟与健康状态，客户端错误只归还在途计数"""
+        latency = time.time() - started
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is not None and not is_endpoint_failure(error):
+                return
+            if error is None:
+                endpoint.successes += 1
+                endpoint.consecutive_failures = 0
+                endpoint.unhealthy_until = 0.0
+                if endpoint.ewma_latency is None:
+                    endpoint.ewma_latency = latency
+                else:
+                    endpoint.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma_latency
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.unhealthy_until = time.time() + self.cooldown
+
+    def _order(self, tried: Optional[set[int]] = None) -> Iterator[_Endpoint]:
+        """依次产出本次调用可尝试的端点（失败时转移到下一个）, 已选端点记录在 tried 中"""
+        tried = set() if tried is None else tried
+        while True:
+            endpoint = self._select(tried)
+            if endpoint is None:
+                return
+            tried.add(self.endpoints.index(endpoint))
+            yield endpoint
+
+    def _hedge_exclusions(self, primary_tried: set[int]) -> set[int]:
+        """对冲请求优先发往主请求未使用的端点, 只有一个端点时发往同一端点"""
+        return set(primary_tried) if len(primary_tried) < len(self.endpoints) else set()
+
+    def invoke(self, messages: list[dict[str, str]], **kwargs) -> str:
+        """非流式调用, 端点故障时自动转移到其他端点"""
+        return self._hedged("invoke", (messages,), kwargs)
+
+    def invoke_with_tools(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        tool_choice: str | dict[str, Any] = "auto",
+        **kwargs,
+    ) -> Any:
+        """原生 function calling 调用, 失败时自动转移到其他端点"""
+        return self._hedged("invoke_with_tools", (messages, tools, tool_choice), kwargs)
+
+    def _hedged(self, method: str, args: tuple, kwargs: dict[str, Any]) -> Any:
+        if self.hedge_policy is None:
+            return self._invoke(method, args, kwargs)
+        primary_tried: set[int] = set()
+        return self.hedge_policy.call(
+            lambda: self._invoke(method, args, kwargs, primary_tried),
+            lambda: self._invoke(method, args, kwargs, self._hedge_exclusions(primary_tried)),
+        )
+
+    def _invoke(self, method: str, args: tuple, kwargs: dict[str, Any], tried: Optional[set[int]] = None) -> Any:
+        last_error: Optional[Exception] = None
+        for endpoint in self._order(tried):
+            started = time.time()
+            try:
+                result = getattr(endpoint.llm, method)(*args, **dict(kwargs))
+            except Exception as e:
+                self._release(endpoint, started, e)
+                if not is_endpoint_failure(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint, started)
+            return result
+        raise ValueError(f"LLM池所有端点调用失败{last_error}")
+
+    async def ainvoke(self, messages: list[dict[str, str]], **kwargs) -> str:
+        """异步非流式调用, 失败时自动转移到其他端点"""
+        return await self._ahedged("ainvoke", (messages,), kwargs)
+
+    async def ainvoke_with_tools(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        tool_choice: str | dict[str, Any] = "auto",
+        **kwargs,
+    ) -> Any:
+        """异步原生 function calling 调用, 失败时自动转移到其他端点"""
+        return await self._ahedged("ainvoke_with_tools", (messages, tools, tool_choice), kwargs)
+
+    async def _ahedged(self, method: str, args: tuple, kwargs: dict[str, Any]) -> Any:
+        if self.hedge_policy is None:
+            return await self._ainvoke(method, args, kwargs)
+        primary_tried: set[int] = set()
+        return await self.hedge_policy.acall(
+            lambda: self._ainvoke(method, args, kwargs, primary_tried),
+            lambda: self._ainvoke(method, args, kwargs, self._hedge_exclusions(primary_tried)),
+        )
+
+    async def _ainvoke(self, method: str, args: tuple, kwargs: dict[str, Any], tried: Optional[set[int]] = None) -> Any:
+        last_error: Optional[Exception] = None
+        for endpoint in self._order(tried):
+            started = time.time()
+            try:
+                if isinstance(endpoint.llm, AsyncSmartAgentLLM):
+                    result = await getattr(endpoint.llm, method)(*args, **dict(kwargs))
+                else:
+                    raise EndpointUnavailableError(f"端点 '{endpoint.name}' 不支持异步调用")
+            except Exception as e:
+                self._release(endpoint, started, e)
+                if not is_endpoint_failure(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint, started)
+            return result
+        raise ValueError(f"LLM池所有端点调用失败{last_error}")
+
+    def stream_invoke(self, messages: list[dict[str, str]], **kwargs) -> Iterator[str]:
+        """
+        流式调用, 首个分片返回前发生端点故障时转移到其他端点
+
+        调用方提前关闭生成器（如遇到停止标记）时，端点同样会在 finally 中释放
+        """
+        last_error: Optional[Exception] = None
+        for endpoint in self._order():
+            started = time.time()
+            produced = False
+            error: Optional[Exception] = None
+            try:
+                for chunk in endpoint.llm.stream_invoke(messages, **dict(kwargs)):
+                    produced = True
+                    yield chunk
+            except Exception as e:
+                error = e
+                if produced or not is_endpoint_failure(e):
+                    raise
+            finally:
+                self._release(endpoint, started, error)
+            if error is None:
+                return
+            last_error = error
+        raise ValueError(f"LLM池所有端点调用失败{last_error}")
+
+    async def astream(self, messages: list[dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """异步流式调用, 首个分片返回前发生端点故障时转移到其他端点；提前关闭时同样释放端点"""
+        last_error: Optional[Exception] = None
+        for endpoint in self._order():
+            started = time.time()
+            produced = False
+            error: Optional[Exception] = None
+            try:
+                if not isinstance(endpoint.llm, AsyncSmartAgentLLM):
+                    raise EndpointUnavailableError(f"端点 '{endpoint.name}' 不支持异步调用")
+                async for chunk in endpoint.llm.astream(messages, **dict(kwargs)):
+                    produced = True
+                    yield chunk
+            except Exception as e:
+                error = e
+                if produced or not is_endpoint_failure(e):
+                    raise
+            finally:
+                self._release(endpoint, started, error)
+            if error is None:
+                return
+            last_error = error
+        raise ValueError(f"LLM池所有端点调用失败{last_error}")
+
+    def stats(self) -> list[dict[str, Any]]:
+        """返回各端点的运行统计"""
+        now = time.time()
+        with self._lock:
+            return [endpoint.snapshot(now) for endpoint in self.endpoints]
+
+    def __str__(self) -> str:
+        return f"PooledLLM(endpoints={[endpoint.name for endpoint in self.endpoints]}, strategy={self.strategy})"
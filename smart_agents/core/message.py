@@ -1,9 +1,12 @@
 """
 定义框架内统一的消息格式，确保Agent与模型之间消息传递的标准化
 """
-from typing import Literal, Optional, Any
+from typing import Literal, Optional, Any, TYPE_CHECKING
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+if TYPE_CHECKING:
+    from .tokenizer import Tokenizer
 
 MessageRole = Literal["system", "user", "assistant", "tool"]
 
@@ -14,6 +17,9 @@ class Message(BaseModel):
     timestamp: datetime = None
     metadata: Optional[dict[str, Any]] = None
 
+    # token 计数缓存：{tokenizer名称: (内容哈希, token数)}
+    _token_counts: dict[str, tuple[int, int]] = PrivateAttr(default_factory=dict)
+
     def __init__(self, content: str, role: MessageRole, **kwargs):
         super().__init__(
             content=content,
@@ -29,5 +35,19 @@ class Message(BaseModel):
             "content": self.content
         }
     
+    def token_count(self, tokenizer: Optional["Tokenizer"] = None) -> int:
+        """计算消息的 token 数（含格式开销），结果按 tokenizer 缓存，内容变化后自动重新计算"""
+        from .tokenizer import get_tokenizer, TOKENS_PER_MESSAGE
+
+        tokenizer = tokenizer or get_tokenizer()
+        content_hash = hash(self.content)
+        cached = self._token_counts.get(tokenizer.name)
+        if cached is not None and cached[0] == content_hash:
+            return cached[1]
+
+        count = TOKENS_PER_MESSAGE + tokenizer.count(self.content)
+        self._token_counts[tokenizer.name] = (content_hash, count)
+        return count
+    
     def __str__(self) -> str:
         return f"[{self.role}] {self.content}"
\ No newline at end of file
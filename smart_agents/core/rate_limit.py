@@ -0,0 +1,173 @@
+"""
+LLM限流器 - 按 provider 共享的 RPM / TPM 令牌桶
+
+多个 Agent 共用同一个 API Key 时，在客户端按请求数与 token 数两个维度排队，
+既能用满服务商配额，又不会触发 429 后集体退避。同时支持线程与 asyncio 调用方。
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Optional, Any, Hashable
+
+from .tokenizer import get_tokenizer
+
+# 未指定 max_tokens 时，为输出预留的 token 数
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    采用预约式扣减：调用方先扣减令牌（余额可以为负），再按返回的等待时间休眠，
+    排队顺序即扣减顺序，线程与协程可以共用同一个桶。
+    """
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数
+            capacity: 桶容量（允许的突发量），默认等于一分钟的配额
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """扣减令牌，返回需要等待的秒数"""
+        # 单次请求超过桶容量时按容量计，避免永远无法满足
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self, amount: float):
+        """归还令牌（amount 为负时追加扣减），用于按实际用量修正预估"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class RateLimiter:
+    """请求数（RPM）与 token 数（TPM）双维度限流器"""
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        """
+        Args:
+            rpm: 每分钟请求数上限，None 表示不限制
+            tpm: 每分钟 token 数上限（输入 + 输出），None 表示不限制
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    def estimate_tokens(self, request: dict[str, Any]) -> int:
+        """预估一次请求消耗的 token 数（输入 + 预留输出），多 prompt 的 completions 请求按 prompt 数累计"""
+        tokenizer = get_tokenizer(request.get("model"))
+        completion_tokens = request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        if "prompt" in request:
+            prompts = request["prompt"] if isinstance(request["prompt"], list) else [request["prompt"]]
+            return sum(tokenizer.count(prompt) for prompt in prompts) + completion_tokens * len(prompts)
+        return tokenizer.count_messages(request.get("messages", [])) + completion_tokens
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        with self._lock:
+            self.acquired += 1
+            if wait > 0:
+                self.throttled += 1
+                self.total_wait += wait
+        return wait
+
+    def acquire(self, request: dict[str, Any]) -> int:
+        """同步获取配额，必要时阻塞等待；返回预留的 token 数"""
+        tokens = self.estimate_tokens(request)
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return tokens
+
+    async def aacquire(self, request: dict[str, Any]) -> int:
+        """异步获取配额，等待期间不阻塞事件循环；返回预留的 token 数"""
+        tokens = self.estimate_tokens(request)
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return tokens
+
+    def reconcile(self, reserved: int, actual: Optional[int]):
+        """根据响应中的实际用量修正 token 桶，请求失败时传入 0 归还全部预留"""
+        if self._tokens is not None and actual is not None:
+            self._tokens.refund(reserved - actual)
+
+    def stats(self) -> dict[str, Any]:
+        """返回限流统计"""
+        with self._lock:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "total_wait": self.total_wait,
+                "available_requests": self._requests.available if self._requests else None,
+                "available_tokens": self._tokens.available if self._tokens else None,
+            }
+
+
+_limiters: dict[Hashable, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_rate(provider: Optional[str], metric: str) -> Optional[float]:
+    """读取 provider 的限流配置，如 DEEPSEEK_RPM / OPENAI_TPM"""
+    if not provider:
+        return None
+    value = os.getenv(f"{provider.upper()}_{metric}")
+    return float(value) if value else None
+
+
+def get_rate_limiter(
+    key: Hashable,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    provider: Optional[str] = None,
+) -> Optional[RateLimiter]:
+    """
+    获取按 key 共享的限流器（同一 provider / API Key 的所有 LLM 实例共用）
+
+    rpm / tpm 未指定时读取该 provider 的环境变量 {PROVIDER}_RPM / {PROVIDER}_TPM
+    （如 DEEPSEEK_RPM、QWEN_TPM），没有全局配置，未配置的 provider（如本地 vLLM / Ollama）不限流
+    """
+    rpm = rpm or _env_rate(provider, "RPM")
+    tpm = tpm or _env_rate(provider, "TPM")
+    if not rpm and not tpm:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(rpm, tpm)
+            _limiters[key] = limiter
+        return limiter
@@ -0,0 +1,303 @@
+"""
+LLM调用弹性层 - 可重试错误分类、抖动退避重试、Retry-After 支持与对冲请求
+
+- RetryPolicy: 对 429 / 5xx / 超时 / 连接错误进行指数退避重试，优先遵循服务端的 Retry-After
+- HedgePolicy: 调用耗时超过历史 p95 时再发出一个重复请求（并发数有上限），取先返回的结果，削减长尾延迟
+"""
+import time
+import random
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional, Any, Callable, Awaitable, TypeVar
+
+import httpx
+import openai
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """重试策略：指数退避 + 抖动，支持 Retry-After"""
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        jitter: bool = True,
+        respect_retry_after: bool = True,
+        max_retry_after: float = 60.0,
+    ):
+        """
+        Args:
+            max_retries: 最大重试次数（不含首次调用）
+            base_delay: 首次重试的基础等待时间（秒）
+            max_delay: 单次退避等待的上限（秒）
+            jitter: 是否使用 full jitter，避免多个调用方同时重试
+            respect_retry_after: 是否遵循服务端返回的 Retry-After
+            max_retry_after: Retry-After 的最大接受值（秒），超过则不再重试
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """判断错误是否值得重试"""
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, TimeoutError, ConnectionError))
+
+    def retry_after(self, error: BaseException) -> Optional[float]:
+        """解析服务端返回的 Retry-After（秒），不存在时返回 None"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def next_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        计算第 attempt 次重试前的等待时间
+
+        Returns:
+            等待秒数，None 表示不应再重试
+        """
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            return None
+
+        if self.respect_retry_after:
+            retry_after = self.retry_after(error)
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_retry_after else None
+
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """按策略同步执行 fn，重试耗尽后抛出最后一次的异常"""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                delay = self.next_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """按策略异步执行 fn，重试耗尽后抛出最后一次的异常"""
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self.next_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+class HedgePolicy:
+    """
+    对冲策略
+
+    记录最近的调用延迟，样本足够后以指定分位数作为对冲阈值：
+    主请求超过阈值仍未返回时，发出一个重复请求，取先成功的结果。
+
+    主请求在独立线程中立即开始执行，对冲计时从主请求开始时算起，不包含排队时间；
+    同时进行中的对冲请求数受 max_in_flight 限制，系统过载时不会再放大上游负载。
+    """
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        min_delay: float = 0.05,
+        max_in_flight: int = 4,
+    ):
+        """
+        Args:
+            quantile: 对冲阈值使用的延迟分位数
+            min_samples: 启用对冲所需的最少延迟样本数
+            window: 保留的最近延迟样本数
+            min_delay: 对冲阈值下限（秒）
+            max_in_flight: 同时进行中的对冲请求上限，达到上限时不再对冲
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_in_flight = max_in_flight
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+
+    def record(self, latency: float):
+        """记录一次成功调用的延迟"""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """当前对冲阈值（秒），样本不足时返回 None"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _try_start_hedge(self) -> bool:
+        """占用一个对冲名额，已达上限时返回 False"""
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                self.hedges_skipped += 1
+                return False
+            self._in_flight += 1
+            self.hedged += 1
+            return True
+
+    def _finish_hedge(self, _=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _timed(self, fn: Callable[[], T]) -> T:
+        started = time.monotonic()
+        result = fn()
+        self.record(time.monotonic() - started)
+        return result
+
+    def _spawn(self, fn: Callable[[], T]) -> "concurrent.futures.Future[T]":
+        """在独立线程中立即执行 fn，不经过共享线程池排队"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._timed(fn))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="smart-agents-hedge", daemon=True).start()
+        return future
+
+    def call(self, primary: Callable[[], T], hedge: Optional[Callable[[], T]] = None) -> T:
+        """
+        同步执行带对冲的调用
+
+        Args:
+            primary: 主请求
+            hedge: 对冲请求，默认重复执行 primary（可指向其他端点）
+        """
+        hedge = hedge or primary
+        delay = self.delay()
+        if delay is None:
+            return self._timed(primary)
+
+        first = self._spawn(primary)
+        try:
+            return first.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        if not self._try_start_hedge():
+            return first.result()
+        second = self._spawn(hedge)
+        second.add_done_callback(self._finish_hedge)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, primary: Callable[[], Awaitable[T]], hedge: Optional[Callable[[], Awaitable[T]]] = None) -> T:
+        """异步执行带对冲的调用，先返回的结果胜出，另一个请求会被取消"""
+        hedge = hedge or primary
+
+        async def timed(fn: Callable[[], Awaitable[T]]) -> T:
+            started = time.monotonic()
+            result = await fn()
+            self.record(time.monotonic() - started)
+            return result
+
+        delay = self.delay()
+        if delay is None:
+            return await timed(primary)
+
+        first = asyncio.ensure_future(timed(primary))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        if not self._try_start_hedge():
+            return await first
+        second = asyncio.ensure_future(timed(hedge))
+        second.add_done_callback(self._finish_hedge)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        """返回对冲统计"""
+        return {
+            "samples": len(self._latencies),
+            "hedge_delay": self.delay(),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+            "in_flight": self._in_flight,
+        }
@@ -0,0 +1,234 @@
+"""
+语义缓存 - 基于本地向量相似度的近似提示词缓存
+
+对最后一轮用户输入做离线向量化（字符 n-gram 哈希），在同一命名空间内
+用余弦相似度查找最相近的历史问题，超过阈值即直接复用其回答。
+
+字符 n-gram 向量只反映字面重合度，无法区分实体与数字：
+"法国的首都在哪里" 与 "德国的首都在哪里" 的相似度（0.83）甚至高于
+"法国的首都在哪里" 与 "法国的首都是哪里"（0.79）。因此命中前还要求两段文本的关键 token
+（数字、英文实词、除虚词外的汉字）完全一致，相似度阈值只负责过滤句式差异过大的问题。
+默认阈值 0.7 按中文改写问句校准（换用虚词、增删 "请问"、"一下"、语序调整），
+关键 token 按字比较：用不同的字表达同一意思（"哪里" / "哪座城市"）不会命中，
+相同的字换了顺序（"北京到上海" / "上海到北京"）仍可能误命中；
+对准确性敏感的场景请传入真正的语义向量化函数（embedder）并提高阈值。
+"""
+import re
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Any, Callable
+
+try:  # 可选依赖，缺失时降级能力
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    from sklearn.feature_extraction.text import HashingVectorizer
+except Exception:
+    HashingVectorizer = None
+
+# 文本向量化函数：输入文本列表，输出 (n, dim) 的向量矩阵
+Embedder = Callable[[list[str]], Any]
+
+# 关键 token：数字、英文词（实体、代码语言、版本号等）与单个汉字
+KEY_TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)*|[a-z][a-z0-9_+#]*|[\u4e00-\u9fff]")
+# 不参与比较的英文虚词
+KEY_TOKEN_STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "at", "to", "for",
+    "from", "by", "with", "and", "or", "what", "whats", "which", "who", "how", "s", "do", "does",
+    "can", "could", "please", "me", "i", "you", "it", "this", "that",
+    # 中文虚词、语气词、礼貌用语与不改变所问内容的疑问词
+    "的", "地", "得", "了", "着", "吗", "呢", "吧", "啊", "呀", "么", "是", "在", "有",
+    "请", "问", "帮", "我", "你", "能", "可", "以", "告", "诉", "一", "下",
+    "哪", "里", "儿", "什", "怎", "样", "如", "何", "多", "少",
+})
+
+
+def key_tokens(text: str) -> frozenset[str]:
+    """提取文本中的关键 token（数字、英文实词与非虚词汉字，英文转为小写）"""
+    return frozenset(
+        token for token in KEY_TOKEN_PATTERN.findall(text.lower().replace("'", ""))
+        if token not in KEY_TOKEN_STOPWORDS
+    )
+
+
+class HashingEmbedder:
+    """
+    本地离线文本向量化
+
+    使用字符 n-gram 特征哈希，对中文这类无空格分词的文本同样有效；
+    优先使用 scikit-learn 的 HashingVectorizer，未安装时使用等价的纯 NumPy 实现。
+    """
+    def __init__(self, n_features: int = 4096, ngram_range: tuple[int, int] = (1, 3)):
+        if np is None:
+            raise ImportError("语义缓存需要安装 numpy")
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self._vectorizer = None
+        if HashingVectorizer is not None:
+            self._vectorizer = HashingVectorizer(
+                analyzer="char_wb",
+                ngram_range=ngram_range,
+                n_features=n_features,
+                alternate_sign=False,
+                norm="l2",
+            )
+
+    def __call__(self, texts: list[str]) -> "np.ndarray":
+        if self._vectorizer is not None:
+            return self._vectorizer.transform(texts).toarray().astype(np.float32)
+
+        vectors = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        low, high = self.ngram_range
+        for row, text in enumerate(texts):
+            text = " ".join(text.lower().split())
+            for n in range(low, high + 1):
+                for i in range(len(text) - n + 1):
+                    index = zlib.crc32(text[i:i + n].encode("utf-8")) % self.n_features
+                    vectors[row, index] += 1.0
+            norm = np.linalg.norm(vectors[row])
+            if norm > 0:
+                vectors[row] /= norm
+        return vectors
+
+
+class _Namespace:
+    """单个命名空间的向量存储，容量固定，写满后按 FIFO 覆盖最旧条目"""
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.texts: list[Optional[str]] = [None] * capacity
+        self.keys: list[Optional[frozenset[str]]] = [None] * capacity
+        self.values: list[Optional[str]] = [None] * capacity
+        self.expires: list[Optional[float]] = [None] * capacity
+        self.size = 0
+        self.cursor = 0
+
+
+class SemanticCache:
+    """
+    语义（近似重复）提示词缓存
+
+    - 命名空间隔离：不同 Agent / 不同上下文的缓存互不干扰
+    - 内存有界：每个命名空间条目数固定，命名空间数量按 LRU 淘汰
+    - 关键 token 校验：默认要求数字、英文实词与非虚词汉字完全一致，
+      避免 "法国" 的回答被 "德国"、"France" 的回答被 "Spain" 命中
+
+    注意：默认的 HashingEmbedder 只衡量字面相似度，不理解语义，关闭关键 token 校验时请提高阈值；
+    传入语义向量化函数（embedder）时应按该模型重新校准阈值。
+    ReAct、Planner 等把问题嵌入长模板的单条 prompt 相似度天然很高，
+    这类场景请使用较高的阈值，或在调用时传入 skip_semantic_cache=True。
+    """
+    def __init__(
+        self,
+        threshold: float = 0.7,
+        max_entries_per_namespace: int = 512,
+        max_namespaces: int = 64,
+        ttl: Optional[float] = 3600,
+        embedder: Optional[Embedder] = None,
+        match_key_tokens: bool = True,
+    ):
+        """
+        Args:
+            threshold: 命中所需的最小余弦相似度（默认值按中文改写问句与 HashingEmbedder 校准）
+            max_entries_per_namespace: 每个命名空间的最大条目数
+            max_namespaces: 最多保留的命名空间数
+            ttl: 条目有效期（秒），None 表示永不过期
+            embedder: 自定义向量化函数，默认使用 HashingEmbedder
+            match_key_tokens: 命中时是否要求关键 token 完全一致
+        """
+        if np is None:
+            raise ImportError("语义缓存需要安装 numpy")
+        self.threshold = threshold
+        self.max_entries_per_namespace = max_entries_per_namespace
+        self.max_namespaces = max_namespaces
+        self.ttl = ttl
+        self.embedder = embedder or HashingEmbedder()
+        self.match_key_tokens = match_key_tokens
+
+        self._namespaces: OrderedDict[str, _Namespace] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, text: str) -> "np.ndarray":
+        vector = np.asarray(self.embedder([text]), dtype=np.float32)[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, namespace: str, text: str) -> Optional[tuple[str, float]]:
+        """
+        查找语义最相近的缓存回答
+
+        Returns:
+            (缓存回答, 相似度)，未命中返回 None
+        """
+        vector = self._embed(text)
+        keys = key_tokens(text) if self.match_key_tokens else None
+        now = time.time()
+        with self._lock:
+            store = self._namespaces.get(namespace)
+            if store is None or store.size == 0:
+                self.misses += 1
+                return None
+            self._namespaces.move_to_end(namespace)
+
+            scores = store.vectors[:store.size] @ vector
+            for index in np.argsort(-scores):
+                score = float(scores[index])
+                if score < self.threshold:
+                    break
+                if keys is not None and store.keys[index] != keys:
+                    continue
+                expires_at = store.expires[index]
+                if expires_at is None or expires_at > now:
+                    self.hits += 1
+                    return store.values[index], score
+
+            self.misses += 1
+            return None
+
+    def add(self, namespace: str, text: str, value: str):
+        """写入一条缓存"""
+        vector = self._embed(text)
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            store = self._namespaces.get(namespace)
+            if store is None:
+                store = _Namespace(self.max_entries_per_namespace, vector.shape[0])
+                self._namespaces[namespace] = store
+                while len(self._namespaces) > self.max_namespaces:
+                    self._namespaces.popitem(last=False)
+            self._namespaces.move_to_end(namespace)
+
+            index = store.cursor
+            store.vectors[index] = vector
+            store.texts[index] = text
+            store.keys[index] = key_tokens(text)
+            store.values[index] = value
+            store.expires[index] = expires_at
+            store.cursor = (index + 1) % self.max_entries_per_namespace
+            store.size = min(store.size + 1, self.max_entries_per_namespace)
+
+    def stats(self) -> dict[str, Any]:
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "namespaces": len(self._namespaces),
+                "entries": sum(store.size for store in self._namespaces.values()),
+            }
+
+    def clear(self, namespace: Optional[str] = None):
+        """清空指定命名空间，未指定时清空全部"""
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
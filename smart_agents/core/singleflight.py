@@ -0,0 +1,103 @@
+"""
+请求合并（single-flight）- 相同请求并发到达时只发送一次上游调用
+
+同一指纹的并发调用共享同一个上游结果：第一个调用方真正发起请求，
+其余调用方等待并复用结果。同时支持线程（同步）与 asyncio（异步）两种路径。
+"""
+import asyncio
+import threading
+import weakref
+import concurrent.futures
+from typing import Any, Callable, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """请求合并器"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, concurrent.futures.Future] = {}
+        self._async_calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]]" = weakref.WeakKeyDictionary()
+
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        同步执行：相同 key 的并发调用只执行一次 fn
+
+        Args:
+            key: 请求指纹
+            fn: 真正发起请求的函数
+
+        Returns:
+            fn 的返回值（跟随者复用领导者的结果或异常）
+        """
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key: str):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        异步执行：相同 key 的并发协程只执行一次 fn
+
+        上游请求运行在独立的 Task 中，单个调用方被取消不会影响其他等待者
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            tasks = self._async_calls.setdefault(loop, {})
+            task = tasks.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(fn())
+                tasks[key] = task
+                self.executions += 1
+                task.add_done_callback(lambda _: self._finish_async(loop, key))
+
+        return await asyncio.shield(task)
+
+    def _finish_async(self, loop: asyncio.AbstractEventLoop, key: str):
+        with self._lock:
+            tasks = self._async_calls.get(loop)
+            if tasks is not None:
+                tasks.pop(key, None)
+
+    def stats(self) -> dict[str, Any]:
+        """返回合并统计"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesce_rate": self.coalesced / self.calls if self.calls else 0.0,
+                "in_flight": len(self._calls) + sum(len(tasks) for tasks in self._async_calls.values()),
+            }
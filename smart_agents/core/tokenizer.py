@@ -0,0 +1,254 @@
+"""
+Token计数与上下文预算
+
+- Tokenizer: 基于 tiktoken 的 token 计数（编码器全局缓存），离线或未安装时退化为字符估算
+- ContextBudget: 将系统提示词、历史对话、工具描述与观察结果装入模型上下文窗口
+"""
+import math
+import logging
+from functools import lru_cache
+from typing import Optional, Any, Iterable, TYPE_CHECKING
+
+try:  # 可选依赖，缺失时降级能力
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+if TYPE_CHECKING:
+    from .message import Message
+
+logger = logging.getLogger(__name__)
+
+# 常见模型的上下文窗口（token）
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "deepseek-chat": 65536,
+    "deepseek-reasoner": 65536,
+    "qwen-plus": 131072,
+    "qwen-turbo": 131072,
+    "qwen-max": 32768,
+    "Qwen/Qwen2.5-72B-Instruct": 32768,
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+    "glm-4": 128000,
+    "llama3.2": 131072,
+    "meta-llama/Llama-2-7b-chat-hf": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 每条消息的格式开销（role、分隔符等）与回复引导开销
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 2
+
+TRUNCATION_SUFFIX = "... [truncated]"
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """获取模型的上下文窗口大小，未知模型按前缀匹配，仍未找到时返回默认值"""
+    if not model:
+        return DEFAULT_CONTEXT_WINDOW
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    for name in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def _encoding_name(model: Optional[str]) -> str:
+    """模型对应的编码名称，非 OpenAI 模型统一使用 cl100k_base 近似"""
+    if model:
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            pass
+    return "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    """加载并缓存 tiktoken 编码器，失败（离线无法下载词表等）时返回 None，且不再重复尝试"""
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("tiktoken 编码器 %s 加载失败，使用字符估算: %s", name, e)
+        return None
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF
+        or 0x3040 <= code <= 0x30FF
+        or 0xAC00 <= code <= 0xD7AF
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """离线估算 token 数：中日韩字符约 1 token / 字，其余约 4 字符 / token"""
+    cjk = sum(1 for char in text if _is_cjk(char))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class Tokenizer:
+    """token 计数器"""
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self._encoding = _load_encoding(_encoding_name(model)) if tiktoken is not None else None
+        self.name = self._encoding.name if self._encoding is not None else "estimate"
+        self.count = lru_cache(maxsize=4096)(self._count)
+
+    @property
+    def exact(self) -> bool:
+        """是否使用真实编码器计数"""
+        return self._encoding is not None
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def count_message(self, message: "Message | dict[str, Any]") -> int:
+        """计算单条消息的 token 数（含格式开销），Message 对象会缓存计数结果"""
+        if hasattr(message, "token_count"):
+            return message.token_count(self)
+        return TOKENS_PER_MESSAGE + self.count(str(message.get("content") or ""))
+
+    def count_messages(self, messages: Iterable["Message | dict[str, Any]"]) -> int:
+        """计算消息列表的总 token 数"""
+        return sum(self.count_message(message) for message in messages) + TOKENS_PER_REPLY
+
+    def truncate(self, text: str, max_tokens: int, suffix: str = TRUNCATION_SUFFIX) -> str:
+        """将文本截断到 max_tokens 以内，发生截断时追加 suffix"""
+        if self.count(text) <= max_tokens:
+            return text
+        budget = max(0, max_tokens - self.count(suffix))
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:budget]) + suffix
+
+        # 字符估算模式下二分查找最长的合规前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if estimate_tokens(text[:mid]) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low] + suffix
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """获取（缓存的）模型 tokenizer"""
+    return Tokenizer(model)
+
+
+class ContextBudget:
+    """
+    上下文预算
+
+    在发送请求前，将各部分内容装入模型上下文窗口：
+    系统提示词与当前问题必须保留；工具描述其次；观察结果按从新到旧分配预算并截断；
+    剩余预算从最新的历史消息开始装填，放不下的旧消息被丢弃。
+    """
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        context_window: Optional[int] = None,
+        reserve_output: int = 1024,
+        tokenizer: Optional[Tokenizer] = None,
+    ):
+        """
+        Args:
+            model: 模型名称，用于选择编码器与默认上下文窗口
+            context_window: 上下文窗口大小，默认按模型查表
+            reserve_output: 为模型输出预留的 token 数
+            tokenizer: 自定义 tokenizer
+        """
+        self.tokenizer = tokenizer or get_tokenizer(model)
+        self.context_window = context_window or get_context_window(model)
+        self.reserve_output = reserve_output
+
+    @property
+    def available(self) -> int:
+        """可用于输入的 token 数"""
+        return max(0, self.context_window - self.reserve_output)
+
+    def fit(
+        self,
+        system_prompt: str = "",
+        question: str = "",
+        history: Optional[list["Message | dict[str, Any]"]] = None,
+        tools: str = "",
+        observations: Optional[list[str]] = None,
+        max_observation_tokens: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """
+        按预算裁剪各部分内容
+
+        Args:
+            system_prompt: 系统提示词（必须保留）
+            question: 当前问题（必须保留）
+            history: 历史消息，按时间顺序
+            tools: 工具描述
+            observations: 观察结果，按时间顺序
+            max_observation_tokens: 单条观察结果的 token 上限
+
+        Returns:
+            裁剪结果字典：system_prompt、question、tools、history、observations、
+            dropped_history（丢弃的历史条数）、total_tokens、fits（是否完全装下）
+        """
+        history = history or []
+        observations = observations or []
+        remaining = self.available - TOKENS_PER_REPLY
+        remaining -= self.tokenizer.count(system_prompt) + self.tokenizer.count(question) + 2 * TOKENS_PER_MESSAGE
+
+        fitted_tools = ""
+        if tools:
+            tools_tokens = self.tokenizer.count(tools)
+            if tools_tokens <= remaining:
+                fitted_tools = tools
+            elif remaining > 0:
+                fitted_tools = self.tokenizer.truncate(tools, remaining)
+            remaining -= self.tokenizer.count(fitted_tools)
+
+        fitted_observations: list[str] = []
+        for observation in reversed(observations):
+            limit = remaining if max_observation_tokens is None else min(remaining, max_observation_tokens)
+            if limit <= 0:
+                break
+            fitted = self.tokenizer.truncate(observation, limit)
+            fitted_observations.append(fitted)
+            remaining -= self.tokenizer.count(fitted)
+        fitted_observations.reverse()
+
+        fitted_history: list = []
+        for message in reversed(history):
+            cost = self.tokenizer.count_message(message)
+            if cost > remaining:
+                break
+            fitted_history.append(message)
+            remaining -= cost
+        fitted_history.reverse()
+
+        return {
+            "system_prompt": system_prompt,
+            "question": question,
+            "tools": fitted_tools,
+            "history": fitted_history,
+            "observations": fitted_observations,
+            "dropped_history": len(history) - len(fitted_history),
+            "total_tokens": self.available - remaining,
+            "fits": remaining >= 0,
+        }
@@ -46,7 +46,7 @@ class AsyncToolExecutor:
 
             if not tool_name:
                 print(f"⚠️ 任务 {i+1} 跳过：缺少 tool_name")
-                task_info.append(i, task, None)
+                task_info.append((i, task, None))
                 continue
 
             print(f"创建任务 {i+1}: {tool_name}")
@@ -131,6 +131,12 @@ class AsyncToolExecutor:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
 
 # 便捷函数
 async def run_parallel_tools(registry: ToolRegistry, tasks: list[dict[str, str]], max_workers: int = 4) -> list[dict[str, Any]]:
@@ -13,6 +13,54 @@ class ToolParameter(BaseModel):
     required: bool = True
     default: Any = None
       
+# 参数类型到 JSON Schema 类型的映射
+JSON_SCHEMA_TYPES = {
+    "str": "string",
+    "string": "string",
+    "int": "integer",
+    "integer": "integer",
+    "float": "number",
+    "number": "number",
+    "bool": "boolean",
+    "boolean": "boolean",
+    "list": "array",
+    "array": "array",
+    "dict": "object",
+    "object": "object",
+}
+
+
+def build_function_schema(name: str, description: str, parameters: list[ToolParameter]) -> dict[str, Any]:
+    """根据参数定义生成 OpenAI function calling schema"""
+    properties = {}
+    required = []
+    for param in parameters:
+        prop: dict[str, Any] = {
+            "type": JSON_SCHEMA_TYPES.get(param.type.lower(), "string"),
+            "description": param.description,
+        }
+        if prop["type"] == "array":
+            prop["items"] = {"type": "string"}
+        if param.default is not None:
+            prop["default"] = param.default
+        properties[param.name] = prop
+        if param.required:
+            required.append(param.name)
+
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": properties,
+                "required": required,
+            },
+        },
+    }
+
+
 class Tool(ABC):
     """工具基类"""
     def __init__(self, name: str, description: str):
@@ -32,6 +80,15 @@ class Tool(ABC):
     def to_openai_schema(self) -> dict[str, Any]:
         """转换为OpenAI function calling scheme 格式
         用于 FunctionCallAgent，使工具能被OpenAI原生 function calling 使用
+        结果按工具实例缓存，参数定义变化后需调用 invalidate_schema
         """
-        pass
+        schema = getattr(self, "_openai_schema", None)
+        if schema is None:
+            schema = build_function_schema(self.name, self.description, self.get_parameters())
+            self._openai_schema = schema
+        return schema
+
+    def invalidate_schema(self):
+        """清除缓存的 function calling schema"""
+        self._openai_schema = None
 
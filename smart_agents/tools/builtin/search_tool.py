@@ -6,6 +6,7 @@ import logging
 from dotenv import load_dotenv
 from typing import Any, Iterable
 from ..base import Tool, ToolParameter
+from ...core.tokenizer import get_tokenizer
 
 load_dotenv()
 
@@ -31,7 +32,6 @@ except Exception:
 
 logger = logging.getLogger(__name__)
 
-CHARS_PER_TOKEN= 4
 DEFAULT_MAX_RESULTS= 5
 SUPPORTED_RETURN_MODES = {"text", "structured", "json", "dict"}
 SUPPORTED_BACKENDS = {
@@ -45,11 +45,7 @@ SUPPORTED_BACKENDS = {
 }
 
 def _limit_text(text: str, token_limit: int) -> str:
-    char_limit=token_limit * CHARS_PER_TOKEN
-    if len(text) <= char_limit:
-        return text
-    else:
-        return text[:char_limit] + "... [truncated]"
+    return get_tokenizer().truncate(text, token_limit)
     
 def _fetch_raw_content(url: str) -> str | None:
     try:
@@ -2,7 +2,7 @@
 工具注册表 - SmartAgents原生工具系统
 """
 
-from .base import Tool
+from .base import Tool, ToolParameter, build_function_schema
 from typing import Any, Callable, Optional
 
 class ToolRegistry:
@@ -81,6 +81,40 @@ class ToolRegistry:
         else:
             return f"错误：未找到名为 '{name}' 的工具。"
 
+    def execute_tool_call(self, name: str, arguments: dict[str, Any]) -> str:
+        """
+        执行 function calling 返回的工具调用
+
+        Args:
+            name (str): 工具名称
+            arguments (dict[str, Any]): 解析后的调用参数
+
+        Returns:
+            str: 工具执行结果
+        """
+        if name in self._tools:
+            try:
+                return self._tools[name].run(arguments)
+            except Exception as e:
+                return f"错误，执行工具调用时发生异常：{str(e)}"
+        elif name in self._functions:
+            return self.execute_tool(name, str(arguments.get("input", "")))
+        else:
+            return f"错误：未找到名为 '{name}' 的工具。"
+
+    def get_openai_tools(self) -> list[dict[str, Any]]:
+        """获取所有工具的 OpenAI function calling schema（用于 tools 参数）"""
+        schemas = [tool.to_openai_schema() for tool in self._tools.values()]
+        for name, info in self._functions.items():
+            if "schema" not in info:
+                info["schema"] = build_function_schema(
+                    name,
+                    info["description"],
+                    [ToolParameter(name="input", type="string", description="工具输入")],
+                )
+            schemas.append(info["schema"])
+        return schemas
+
     def get_tools_description(self) -> str:
         """获取所有工具的格式化描述字符串"""
         descriptions = []
@@ -0,0 +1,13 @@
+"""测试公共夹具"""
+import pytest
+
+from smart_agents.core.llm import SmartAgentLLM, AsyncSmartAgentLLM
+
+
+@pytest.fixture
+def make_llm():
+    """创建不会真正发起网络请求的 SmartAgentLLM（调用方按需替换其方法或客户端）"""
+    def factory(provider: str = "custom", asynchronous: bool = False, **kwargs) -> SmartAgentLLM:
+        cls = AsyncSmartAgentLLM if asynchronous else SmartAgentLLM
+        return cls(model="fake-model", apiKey="test-key", baseUrl="http://127.0.0.1:9/v1", provider=provider, **kwargs)
+    return factory
@@ -0,0 +1,137 @@
+"""AsyncSmartAgentLLM 异步调用测试"""
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from smart_agents.core.llm import AsyncSmartAgentLLM
+
+
+def completion(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeAsyncStream:
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pieces:
+            raise StopAsyncIteration
+        return chunk(self.pieces.pop(0))
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncClient:
+    """记录请求参数的 AsyncOpenAI 替身"""
+    def __init__(self, delay: float = 0.0, pieces=("你", "", None, "好")):
+        self.delay = delay
+        self.pieces = pieces
+        self.requests = []
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **options):
+        return self
+
+    async def create(self, stream: bool = False, **request):
+        self.requests.append(request)
+        await asyncio.sleep(self.delay)
+        if stream:
+            self.streams.append(FakeAsyncStream(self.pieces))
+            return self.streams[-1]
+        return completion(f"echo:{request['messages'][-1]['content']}")
+
+
+class FakePool:
+    def __init__(self, client):
+        self.client = client
+
+    def get_client(self, api_key, base_url, timeout):
+        return SimpleNamespace(with_options=lambda **options: None)
+
+    def get_async_client(self, api_key, base_url, timeout):
+        return self.client
+
+
+def make_async_llm(client: FakeAsyncClient, **kwargs) -> AsyncSmartAgentLLM:
+    return AsyncSmartAgentLLM(
+        model="fake-model", apiKey="test-key", baseUrl="http://127.0.0.1:9/v1",
+        provider="custom", client_pool=FakePool(client), **kwargs,
+    )
+
+
+def test_ainvoke_returns_content_and_forwards_params():
+    client = FakeAsyncClient()
+    llm = make_async_llm(client, temperature=0.2)
+
+    answer = asyncio.run(llm.ainvoke([{"role": "user", "content": "hi"}], max_tokens=32, force_cache=True))
+
+    assert answer == "echo:hi"
+    request = client.requests[0]
+    assert request["temperature"] == 0.2
+    assert request["max_tokens"] == 32
+    assert "force_cache" not in request  # 框架内部选项不透传给服务端
+
+
+def test_concurrent_ainvoke_share_one_event_loop():
+    client = FakeAsyncClient(delay=0.2)
+    llm = make_async_llm(client)
+
+    async def main():
+        return await asyncio.gather(*(llm.ainvoke([{"role": "user", "content": str(i)}]) for i in range(10)))
+
+    started = time.monotonic()
+    answers = asyncio.run(main())
+
+    assert answers == [f"echo:{i}" for i in range(10)]
+    assert time.monotonic() - started < 1.0  # 串行需要 2 秒
+
+
+def test_astream_skips_empty_deltas():
+    client = FakeAsyncClient()
+    llm = make_async_llm(client)
+
+    async def main():
+        return [piece async for piece in llm.astream([{"role": "user", "content": "hi"}])]
+
+    assert asyncio.run(main()) == ["你", "好"]
+    assert client.streams[0].closed
+
+
+def test_astream_closes_response_when_consumer_stops_early():
+    client = FakeAsyncClient(pieces=["a", "b", "c"])
+    llm = make_async_llm(client)
+
+    async def main():
+        stream = llm.astream([{"role": "user", "content": "hi"}])
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(main()) == "a"
+    assert client.streams[0].closed
+
+
+def test_ainvoke_wraps_provider_errors():
+    client = FakeAsyncClient()
+
+    async def broken(stream: bool = False, **request):
+        raise ConnectionError("down")
+
+    client.chat.completions.create = broken
+    llm = make_async_llm(client)
+
+    with pytest.raises(ValueError, match="LLM调用失败"):
+        asyncio.run(llm.ainvoke([{"role": "user", "content": "hi"}]))
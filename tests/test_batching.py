@@ -0,0 +1,123 @@
+"""MicroBatcher 微批处理测试"""
+import concurrent.futures
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from smart_agents.core.batching import MicroBatcher, ROLE_STOP_SEQUENCES, DEFAULT_COMPLETION_MAX_TOKENS
+from smart_agents.core.circuit_breaker import CircuitBreaker
+from smart_agents.core.resilience import RetryPolicy
+
+
+def chatml(messages):
+    return "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages) + "<|im_start|>assistant\n"
+
+
+def status_error(code: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://127.0.0.1:9/v1/completions")
+    return openai.APIStatusError("error", response=httpx.Response(code, request=request), body=None)
+
+
+class FakeCompletions:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.requests = []
+
+    def create(self, prompt, **params):
+        self.requests.append((prompt, params))
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(index=i, text=f" answer {i}") for i in range(len(prompt))])
+
+
+def ask(llm, count: int) -> list[str]:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(llm.invoke, [{"role": "user", "content": f"q{i}"}]) for i in range(count)]
+        return [future.result(timeout=5) for future in futures]
+
+
+def test_batching_requires_a_chat_template(make_llm):
+    llm = make_llm(provider="vllm")
+    with pytest.raises(ValueError):
+        MicroBatcher(llm, None)
+    # batching=True 时无法加载对话模板（离线 / 未安装 transformers）则不启用
+    assert make_llm(provider="vllm", batching=True).batcher is None
+
+
+def test_batched_request_uses_template_stops_and_max_tokens(make_llm):
+    llm = make_llm(provider="vllm", batching=chatml)
+    completions = FakeCompletions()
+    llm._client = SimpleNamespace(completions=completions)
+
+    assert sorted(ask(llm, 4)) == [f"answer {i}" for i in range(4)]
+
+    prompts, params = completions.requests[0]
+    assert all(prompt.startswith("<|im_start|>user") for prompt in prompts)
+    assert params["max_tokens"] == DEFAULT_COMPLETION_MAX_TOKENS
+    assert params["stop"] == ROLE_STOP_SEQUENCES
+    assert None not in params.values()
+
+
+@pytest.mark.parametrize("code", [400, 404, 422])
+def test_batcher_disables_itself_when_server_rejects_multi_prompt(make_llm, code):
+    llm = make_llm(provider="vllm", batching=chatml)
+    llm._client = SimpleNamespace(completions=FakeCompletions([status_error(code)]))
+    llm._complete = lambda request: "single"
+
+    assert ask(llm, 3) == ["single"] * 3
+    stats = llm.batcher.stats()
+    assert not stats["enabled"]
+    assert not llm.batcher.accepts({"messages": [{"role": "user", "content": "q"}]})
+
+
+def test_transient_batch_failure_keeps_batching_enabled(make_llm):
+    llm = make_llm(provider="vllm", batching=chatml)
+    llm._client = SimpleNamespace(completions=FakeCompletions([status_error(503)]))
+    llm._complete = lambda request: "single"
+
+    assert ask(llm, 3) == ["single"] * 3
+    assert llm.batcher.stats()["enabled"]
+    assert llm.batcher.stats()["fallbacks"] == 1
+
+
+def test_formatter_error_resolves_every_caller(make_llm):
+    def broken_template(messages):
+        raise KeyError("chat_template")
+
+    llm = make_llm(provider="vllm", batching=broken_template)
+    llm._client = SimpleNamespace(completions=FakeCompletions())
+    llm._complete = lambda request: "single"
+
+    assert ask(llm, 3) == ["single"] * 3  # 不会永远阻塞
+    assert llm.batcher.stats()["enabled"]
+
+
+def test_closed_batcher_fails_fast_instead_of_hanging(make_llm):
+    llm = make_llm(provider="vllm", batching=chatml)
+    llm.batcher.close()
+    with pytest.raises(RuntimeError):
+        llm.invoke([{"role": "user", "content": "q"}])
+
+
+def test_batched_requests_go_through_retry_and_circuit_breaker(make_llm):
+    breaker = CircuitBreaker(name="test", window_size=4, min_calls=4)
+    llm = make_llm(
+        provider="vllm", batching=chatml, circuit_breaker=breaker,
+        retry_policy=RetryPolicy(max_retries=1, base_delay=0.01),
+    )
+    completions = FakeCompletions([status_error(503)])
+    llm._client = SimpleNamespace(completions=completions)
+
+    assert sorted(ask(llm, 2)) == ["answer 0", "answer 1"]
+    assert len(completions.requests) == 2  # 503 后重试一次
+    assert breaker.snapshot()["calls_in_window"] == 2
+
+
+def test_tool_and_streaming_requests_bypass_batching(make_llm):
+    batcher = make_llm(provider="vllm", batching=chatml).batcher
+    messages = [{"role": "user", "content": "q"}]
+    assert batcher.accepts({"model": "m", "messages": messages})
+    assert not batcher.accepts({"model": "m", "messages": messages, "stream": True})
+    assert not batcher.accepts({"model": "m", "messages": messages, "tools": []})
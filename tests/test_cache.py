@@ -0,0 +1,97 @@
+"""LLMCache 两级缓存测试"""
+import time
+from types import SimpleNamespace
+
+from smart_agents.core.cache import LLMCache, make_cache_key
+from smart_agents.core.llm import SmartAgentLLM
+
+
+def test_cache_key_is_order_insensitive():
+    assert make_cache_key({"a": 1, "b": [1, 2]}) == make_cache_key({"b": [1, 2], "a": 1})
+    assert make_cache_key({"a": 1}) != make_cache_key({"a": 2})
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LLMCache(max_entries=2, disk_path=None)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts():
+    cache = LLMCache(max_entries=10, max_bytes=10)
+    cache.set("a", "x" * 6)
+    cache.set("b", "y" * 6)
+    assert cache.get("a") is None
+    assert cache.stats()["memory_bytes"] == 6
+
+
+def test_expired_entries_miss():
+    cache = LLMCache(ttl=0.05)
+    cache.set("a", "1")
+    time.sleep(0.08)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_restart_and_backfills_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = LLMCache(disk_path=path)
+    cache.set("a", "持久化")
+    cache.close()
+
+    reopened = LLMCache(disk_path=path)
+    assert reopened.get("a") == "持久化"
+    assert reopened.get("a") == "持久化"
+    stats = reopened.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+    reopened.close()
+
+
+def test_disk_tier_prunes_oldest(tmp_path):
+    cache = LLMCache(max_entries=1, disk_path=str(tmp_path / "cache.sqlite"), disk_max_entries=2)
+    for key in "abc":
+        cache.set(key, key)
+        time.sleep(0.01)
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    cache.close()
+
+
+class CountingCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **request):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer {self.calls}"))], usage=None)
+
+
+def cached_llm(temperature: float) -> tuple[SmartAgentLLM, CountingCompletions]:
+    llm = SmartAgentLLM(
+        model="fake-model", apiKey="key", baseUrl="http://127.0.0.1:9/v1", provider="custom",
+        temperature=temperature, cache=LLMCache(),
+    )
+    completions = CountingCompletions()
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return llm, completions
+
+
+def test_llm_reuses_cached_response_for_deterministic_requests():
+    llm, completions = cached_llm(temperature=0)
+    messages = [{"role": "user", "content": "hi"}]
+    assert llm.invoke(messages) == llm.invoke(messages) == "answer 1"
+    assert completions.calls == 1
+
+
+def test_llm_bypasses_cache_when_sampling_unless_forced():
+    llm, completions = cached_llm(temperature=0.7)
+    messages = [{"role": "user", "content": "hi"}]
+    assert llm.invoke(messages) != llm.invoke(messages)
+    assert llm.invoke(messages, force_cache=True) == llm.invoke(messages, force_cache=True)
+    assert completions.calls == 3
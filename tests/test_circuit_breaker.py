@@ -0,0 +1,147 @@
+"""CircuitBreaker 状态转换测试"""
+import time
+
+import httpx
+import openai
+import pytest
+
+from smart_agents.core.circuit_breaker import (
+    CLOSED, OPEN, HALF_OPEN, CircuitBreaker, CircuitOpenError, is_provider_failure,
+)
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    config = {"window_size": 4, "min_calls": 4, "failure_rate_threshold": 0.5, "open_duration": 0.1}
+    config.update(overrides)
+    return CircuitBreaker(name="test", **config)
+
+
+def test_opens_when_failure_rate_reaches_threshold():
+    breaker = make_breaker()
+    breaker.record_success(0.01)
+    breaker.record_failure(0.01)
+    breaker.record_success(0.01)
+    assert breaker.state == CLOSED  # 未达到 min_calls
+
+    breaker.record_failure(0.01)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_after_cooldown_allows_limited_probes():
+    breaker = make_breaker(half_open_max_calls=1)
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_probe_closes_and_clears_window():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+    probe = breaker.before_call()
+    breaker.record_success(0.01, probe)
+
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["calls_in_window"] == 0
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+    probe = breaker.before_call()
+    breaker.record_failure(0.01, probe)
+
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["opened_count"] == 2
+
+
+def test_release_returns_probe_slot():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+    breaker.release(breaker.before_call())
+    breaker.before_call()  # 名额已归还，不应抛出
+
+
+def open_breaker(**overrides) -> CircuitBreaker:
+    breaker = make_breaker(**overrides)
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    return breaker
+
+
+def test_calls_admitted_while_closed_do_not_free_probe_slots():
+    breaker = open_breaker(half_open_max_calls=1)
+    time.sleep(0.12)
+    breaker.before_call()  # 唯一的探测名额
+
+    # 熔断前（关闭状态）发出的请求在半开状态下才返回，没有探测凭证
+    for _ in range(3):
+        breaker.record_success(0.01)
+        breaker.record_failure(0.01)
+        breaker.release()
+
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_from_previous_half_open_round_is_ignored():
+    breaker = open_breaker(half_open_max_calls=1)
+    time.sleep(0.12)
+    stale_probe = breaker.before_call()
+
+    breaker.reset()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+    probe = breaker.before_call()
+
+    breaker.release(stale_probe)  # 上一轮的凭证不能归还本轮名额
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success(0.01, probe)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = make_breaker(slow_call_threshold=0.5, slow_call_rate_threshold=0.75)
+    for _ in range(3):
+        breaker.record_success(1.0)
+    breaker.record_success(0.01)
+    assert breaker.state == OPEN
+
+
+def test_reset_closes():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    breaker.reset()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_only_provider_side_errors_count_as_failures():
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+
+    def status_error(code: int) -> openai.APIStatusError:
+        return openai.APIStatusError("error", response=httpx.Response(code, request=request), body=None)
+
+    assert is_provider_failure(status_error(503))
+    assert is_provider_failure(openai.APITimeoutError(request=request))
+    assert is_provider_failure(httpx.ConnectTimeout("timeout"))
+    assert not is_provider_failure(status_error(400))
+    assert not is_provider_failure(status_error(401))
+    assert not is_provider_failure(ValueError("bad input"))
@@ -0,0 +1,60 @@
+"""ClientPool 客户端复用测试"""
+import asyncio
+
+from smart_agents.core.client_pool import ClientPool
+from smart_agents.core.llm import SmartAgentLLM
+
+BASE_URL = "http://127.0.0.1:9/v1"
+
+
+def test_same_key_returns_same_client():
+    pool = ClientPool()
+    first = pool.get_client("key", BASE_URL, 30)
+    assert pool.get_client("key", BASE_URL, 30) is first
+    assert pool.get_client("other-key", BASE_URL, 30) is not first
+    assert pool.get_client("key", BASE_URL, 60) is not first
+    assert pool.stats()["sync_clients"] == 3
+    pool.close()
+
+
+def test_llm_instances_share_pooled_client():
+    pool = ClientPool()
+    llms = [
+        SmartAgentLLM(model="fake-model", apiKey="key", baseUrl=BASE_URL, provider="custom", timeout=30, client_pool=pool)
+        for _ in range(3)
+    ]
+    assert llms[0]._client is llms[1]._client is llms[2]._client
+    assert pool.stats()["sync_clients"] == 1
+    pool.close()
+
+
+def test_async_clients_are_isolated_per_event_loop():
+    pool = ClientPool()
+
+    async def fetch_twice():
+        first = pool.get_async_client("key", BASE_URL, 30)
+        assert pool.get_async_client("key", BASE_URL, 30) is first
+        return first
+
+    first_loop = asyncio.run(fetch_twice())
+    second_loop = asyncio.run(fetch_twice())
+    assert first_loop is not second_loop
+
+
+def test_limits_follow_configuration():
+    pool = ClientPool(max_connections=7, max_keepalive_connections=3, keepalive_expiry=5)
+    limits = pool._limits()
+    assert (limits.max_connections, limits.max_keepalive_connections, limits.keepalive_expiry) == (7, 3, 5)
+
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    import smart_agents.core.client_pool as client_pool
+    monkeypatch.setattr(client_pool, "h2", None)
+    assert ClientPool(http2=True)._use_http2() is False
+
+
+def test_close_clears_clients():
+    pool = ClientPool()
+    pool.get_client("key", BASE_URL, 30)
+    pool.close()
+    assert pool.stats()["sync_clients"] == 0
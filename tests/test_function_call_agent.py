@@ -0,0 +1,153 @@
+"""FunctionCallAgent 原生 function calling 测试"""
+import json
+import threading
+from types import SimpleNamespace
+
+from smart_agents.agents.function_call_agent import FunctionCallAgent
+from smart_agents.tools.base import Tool, ToolParameter
+from smart_agents.tools.registry import ToolRegistry
+
+
+class WeatherTool(Tool):
+    def __init__(self):
+        super().__init__("weather", "查询城市天气")
+        self.calls = []
+
+    def get_parameters(self):
+        return [
+            ToolParameter(name="city", type="str", description="城市"),
+            ToolParameter(name="days", type="int", description="天数", required=False, default=1),
+        ]
+
+    def run(self, parameters):
+        self.calls.append(parameters)
+        return f"{parameters['city']}晴"
+
+
+def tool_call(call_id, name, arguments):
+    payload = arguments if isinstance(arguments, str) else json.dumps(arguments, ensure_ascii=False)
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=payload))
+
+
+def reply(content=None, tool_calls=None):
+    return SimpleNamespace(content=content, tool_calls=tool_calls)
+
+
+class ToolCallingLLM:
+    """按轮次返回预设的 assistant 消息，并记录每轮的 messages 与 tool_choice"""
+    model = "fake"
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.rounds = []
+
+    def invoke_with_tools(self, messages, tools, tool_choice, **kwargs):
+        self.rounds.append({"messages": list(messages), "tools": tools, "tool_choice": tool_choice})
+        return self.replies.pop(0)
+
+    def invoke(self, messages, **kwargs):
+        return "直接回答"
+
+
+def make_agent(llm, **kwargs):
+    registry = ToolRegistry()
+    tool = WeatherTool()
+    registry.register_tool(tool)
+    return FunctionCallAgent("fc", llm, tool_registry=registry, **kwargs), tool
+
+
+def test_tool_results_are_fed_back_until_model_answers():
+    llm = ToolCallingLLM([
+        reply(tool_calls=[tool_call("c1", "weather", {"city": "北京"})]),
+        reply("北京今天晴"),
+    ])
+    agent, tool = make_agent(llm)
+
+    result = agent.run_structured("北京天气")
+
+    assert result["content"] == "北京今天晴"
+    assert result["iterations"] == 1
+    assert tool.calls == [{"city": "北京"}]
+    feedback = llm.rounds[1]["messages"][-2:]
+    assert feedback[0]["tool_calls"][0]["id"] == "c1"
+    assert feedback[1] == {"role": "tool", "tool_call_id": "c1", "content": "北京晴"}
+
+
+def test_tool_calls_in_one_round_run_in_parallel_and_keep_order():
+    barrier = threading.Barrier(2, timeout=2)
+
+    class BlockingTool(WeatherTool):
+        def run(self, parameters):
+            barrier.wait()
+            return super().run(parameters)
+
+    llm = ToolCallingLLM([
+        reply(tool_calls=[tool_call("a", "weather", {"city": "北京"}), tool_call("b", "weather", {"city": "上海"})]),
+        reply("都晴"),
+    ])
+    registry = ToolRegistry()
+    registry.register_tool(BlockingTool())
+    agent = FunctionCallAgent("fc", llm, tool_registry=registry)
+
+    records = agent.run_structured("两地天气")["tool_calls"]
+    assert [(r["id"], r["result"]) for r in records] == [("a", "北京晴"), ("b", "上海晴")]
+
+
+def test_invalid_arguments_are_reported_to_the_model():
+    llm = ToolCallingLLM([reply(tool_calls=[tool_call("c1", "weather", "{not json")]), reply("抱歉")])
+    agent, tool = make_agent(llm)
+
+    record = agent.run_structured("天气")["tool_calls"][0]
+    assert record["status"] == "error"
+    assert tool.calls == []
+
+
+def test_tool_choice_switches_to_none_after_max_iterations():
+    call = tool_call("c", "weather", {"city": "北京"})
+    llm = ToolCallingLLM([reply(tool_calls=[call]), reply(tool_calls=[call]), reply("好了")])
+    agent, _ = make_agent(llm, max_tool_iterations=2)
+
+    assert agent.run("天气") == "好了"
+    assert [r["tool_choice"] for r in llm.rounds] == ["auto", "auto", "none"]
+
+
+def test_loop_stops_when_server_ignores_tool_choice_none():
+    call = tool_call("c", "weather", {"city": "北京"})
+    llm = ToolCallingLLM([reply(tool_calls=[call])] * 10)
+    agent, tool = make_agent(llm, max_tool_iterations=2)
+
+    result = agent.run_structured("天气")
+
+    assert len(llm.rounds) == 3
+    assert result["iterations"] == 2
+    assert len(tool.calls) == 2
+    assert "最大工具调用轮数" in result["content"]
+
+
+def test_last_content_is_kept_when_cap_is_hit():
+    call = tool_call("c", "weather", {"city": "北京"})
+    llm = ToolCallingLLM([reply(tool_calls=[call]), reply("北京晴，不再查询", tool_calls=[call])])
+    agent, _ = make_agent(llm, max_tool_iterations=1)
+
+    assert agent.run("天气") == "北京晴，不再查询"
+
+
+def test_without_tools_falls_back_to_plain_invoke():
+    agent = FunctionCallAgent("fc", ToolCallingLLM([]))
+    assert agent.run_structured("你好") == {"content": "直接回答", "tool_calls": [], "iterations": 0}
+
+
+def test_tool_schema_maps_parameter_types():
+    schema = WeatherTool().to_openai_schema()["function"]
+    assert schema["name"] == "weather"
+    assert schema["parameters"]["properties"]["city"]["type"] == "string"
+    assert schema["parameters"]["properties"]["days"] == {"type": "integer", "description": "天数", "default": 1}
+    assert schema["parameters"]["required"] == ["city"]
+
+
+def test_function_tools_get_a_single_input_schema():
+    registry = ToolRegistry()
+    registry.register_function("echo", "回显", lambda text: text)
+    (schema,) = registry.get_openai_tools()
+    assert list(schema["function"]["parameters"]["properties"]) == ["input"]
+    assert registry.execute_tool_call("echo", {"input": "hi"}) == "hi"
@@ -0,0 +1,128 @@
+"""HistoryPolicy 滑动窗口与滚动摘要测试"""
+import threading
+
+from smart_agents.agents.simple_agent import SimpleAgent
+from smart_agents.core.config import Config
+from smart_agents.core.history import HistoryPolicy
+from smart_agents.core.message import Message
+from smart_agents.core.tokenizer import get_tokenizer
+
+
+def conversation(turns: int, words: int = 1) -> list[Message]:
+    history = []
+    for i in range(turns):
+        history.append(Message(f"question {i} " + "word " * words, "user"))
+        history.append(Message(f"answer {i} " + "word " * words, "assistant"))
+    return history
+
+
+class SummaryLLM:
+    model = "gpt-4o"
+
+    def __init__(self, gate: threading.Event | None = None):
+        self.gate = gate
+        self.prompts = []
+
+    def invoke(self, messages, **kwargs):
+        if self.gate is not None:
+            self.gate.wait(1)
+        self.prompts.append(messages[-1]["content"])
+        return f"summary #{len(self.prompts)}"
+
+
+def test_message_limit_evicts_oldest_in_place():
+    history = conversation(5)
+    policy = HistoryPolicy(max_messages=4)
+
+    evicted = policy.compact(history)
+
+    assert [m.content.split()[1] for m in evicted] == ["0", "0", "1", "1", "2", "2"]
+    assert len(history) == 4 and history[0].content.startswith("question 3")
+    assert policy.stats()["evicted"] == 6
+
+
+def test_window_never_starts_with_an_orphan_answer():
+    history = conversation(3)
+    HistoryPolicy(max_messages=3).compact(history)
+    assert history[0].role == "user"
+    assert len(history) == 2
+
+
+def test_token_limit_keeps_newest_messages():
+    history = conversation(10, words=30)
+    tokenizer = get_tokenizer("gpt-4o")
+    policy = HistoryPolicy(max_tokens=200)
+
+    policy.compact(history, SummaryLLM())
+
+    assert sum(tokenizer.count_message(m) for m in history) <= 200
+    assert history[-1].content.startswith("answer 9")
+
+
+def test_no_limits_keeps_everything():
+    history = conversation(3)
+    assert HistoryPolicy().compact(history) == []
+    assert len(history) == 6
+
+
+def test_evicted_messages_are_summarized_in_background():
+    gate = threading.Event()
+    llm = SummaryLLM(gate)
+    policy = HistoryPolicy(max_messages=2, summarize=True)
+    history = conversation(3)
+
+    policy.compact(history, llm)
+    assert policy.stats()["summary_pending"]  # 不阻塞当前对话
+    assert policy.summary_message() is None
+
+    gate.set()
+    policy.wait(1)
+    assert "question 0" in llm.prompts[0]
+    assert policy.build_messages(history)[0] == {"role": "system", "content": "以下是之前对话的摘要:\nsummary #1"}
+
+
+def test_later_summaries_fold_into_the_previous_one():
+    llm = SummaryLLM()
+    policy = HistoryPolicy(max_messages=2, summarize=True)
+    history = conversation(2)
+    policy.compact(history, llm)
+    policy.wait(1)
+
+    history.extend(conversation(1))
+    policy.compact(history, llm)
+    policy.wait(1)
+
+    assert "summary #1" in llm.prompts[1]
+    assert policy.stats()["summaries"] == 2
+
+
+def test_clear_resets_summary():
+    llm = SummaryLLM()
+    policy = HistoryPolicy(max_messages=2, summarize=True)
+    policy.compact(conversation(2), llm)
+    policy.clear()
+    assert policy.summary_message() is None
+    assert policy.stats()["evicted"] == 0
+
+
+class EchoLLM:
+    model = "gpt-4o"
+
+    def __init__(self):
+        self.requests = []
+
+    def invoke(self, messages, **kwargs):
+        self.requests.append(messages)
+        return f"reply {len(self.requests)}"
+
+
+def test_simple_agent_replays_only_the_window():
+    llm = EchoLLM()
+    agent = SimpleAgent("assistant", llm, config=Config(max_history_length=4))
+
+    for i in range(5):
+        agent.run(f"q{i}")
+
+    assert len(agent.get_history()) == 4
+    last_request = llm.requests[-1]
+    assert [m["content"] for m in last_request[1:]] == ["q2", "reply 3", "q3", "reply 4", "q4"]
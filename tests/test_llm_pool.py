@@ -0,0 +1,129 @@
+"""PooledLLM 端点释放与接口完整性测试"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from smart_agents.core.llm_pool import PooledLLM
+
+
+@pytest.fixture
+def pool(make_llm) -> PooledLLM:
+    endpoints = []
+    for _ in range(2):
+        llm = make_llm()
+        llm.stream_invoke = lambda messages, **kwargs: iter(["Thought: ", "x\n", "Action: ", "search[q]\n", "ignored"])
+        llm.invoke_with_tools = lambda messages, tools, tool_choice="auto", **kwargs: SimpleNamespace(content="ok", tool_calls=None)
+        endpoints.append(llm)
+    return PooledLLM(endpoints)
+
+
+def outstanding(pool: PooledLLM) -> list[int]:
+    return [endpoint["outstanding"] for endpoint in pool.stats()]
+
+
+def test_closing_stream_early_releases_endpoint(pool):
+    for _ in range(3):
+        stream = pool.stream_invoke([])
+        next(stream)
+        stream.close()
+
+    assert outstanding(pool) == [0, 0]
+    assert sum(endpoint["successes"] for endpoint in pool.stats()) == 3
+
+
+def test_failed_stream_fails_over_and_releases(pool):
+    def broken(messages, **kwargs):
+        raise ConnectionError("down")
+        yield  # pragma: no cover
+
+    pool.endpoints[0].llm.stream_invoke = broken
+    pool.endpoints[1].llm.stream_invoke = lambda messages, **kwargs: iter(["a", "b"])
+    pool.endpoints[1].ewma_latency = 1.0  # 让第一个端点优先被选中
+
+    assert "".join(pool.stream_invoke([])) == "ab"
+    assert outstanding(pool) == [0, 0]
+    assert pool.stats()[0]["failures"] == 1
+
+
+def test_async_stream_early_close_releases(make_llm):
+    llm = make_llm(asynchronous=True)
+
+    async def astream(messages, **kwargs):
+        for chunk in ["a", "b", "c"]:
+            yield chunk
+
+    llm.astream = astream
+    pool = PooledLLM([llm])
+
+    async def main():
+        stream = pool.astream([])
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert outstanding(pool) == [0]
+
+
+def test_pool_supports_function_calling(pool):
+    message = pool.invoke_with_tools([{"role": "user", "content": "hi"}], tools=[])
+    assert message.content == "ok"
+    assert outstanding(pool) == [0, 0]
+
+
+def api_error(code: int) -> Exception:
+    request = httpx.Request("POST", "http://127.0.0.1:9/v1/chat/completions")
+    error = openai.APIStatusError("error", response=httpx.Response(code, request=request), body=None)
+    # 与 SmartAgentLLM.invoke 一样把原始错误包装为 ValueError
+    try:
+        raise ValueError(f"LLM调用失败{error}") from error
+    except ValueError as wrapped:
+        return wrapped
+
+
+def failing_invoke(code: int, calls: list):
+    def invoke(messages, **kwargs):
+        calls.append(code)
+        raise api_error(code)
+    return invoke
+
+
+def test_client_errors_are_raised_without_failover(pool):
+    calls = []
+    for endpoint in pool.endpoints:
+        endpoint.llm.invoke = failing_invoke(400, calls)
+
+    for _ in range(5):
+        with pytest.raises(ValueError, match="LLM调用失败"):
+            pool.invoke([])
+
+    assert len(calls) == 5  # 每次只尝试一个端点
+    assert all(endpoint["healthy"] and endpoint["failures"] == 0 for endpoint in pool.stats())
+    assert outstanding(pool) == [0, 0]
+
+
+def test_server_errors_fail_over_and_count(pool):
+    calls = []
+    pool.endpoints[0].llm.invoke = failing_invoke(503, calls)
+    pool.endpoints[1].llm.invoke = lambda messages, **kwargs: "ok"
+    pool.endpoints[1].ewma_latency = 1.0
+
+    assert pool.invoke([]) == "ok"
+    assert calls == [503]
+    assert pool.stats()[0]["failures"] == 1
+
+
+def test_stream_client_error_is_not_retried_elsewhere(pool):
+    def rejected(messages, **kwargs):
+        raise api_error(422)
+        yield  # pragma: no cover
+
+    for endpoint in pool.endpoints:
+        endpoint.llm.stream_invoke = rejected
+
+    with pytest.raises(ValueError):
+        list(pool.stream_invoke([]))
+    assert sum(endpoint["requests"] for endpoint in pool.stats()) == 1
+    assert outstanding(pool) == [0, 0]
@@ -0,0 +1,115 @@
+"""PlanCache 计划缓存测试"""
+import time
+
+from smart_agents.agents.plan_solve_agent import PlanCache, Planner, extract_slots
+
+PLAN = [
+    {"id": 1, "step": "查询Python的性能", "deps": []},
+    {"id": 2, "step": "查询Java的性能", "deps": []},
+    {"id": 3, "step": "比较两者", "deps": [1, 2]},
+]
+
+
+class CountingLLM:
+    model = "fake"
+
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        return self.text
+
+    def stream_invoke(self, messages, **kwargs):
+        self.calls += 1
+        yield from (self.text[i:i + 5] for i in range(0, len(self.text), 5))
+
+
+PLAN_TEXT = '```python\n[{"id": 1, "step": "查询Python的性能", "deps": []}, {"id": 2, "step": "汇总", "deps": [1]}]\n```'
+
+
+def test_slots_replace_entities_in_chinese_questions_only_quotes_and_numbers_in_english():
+    assert extract_slots("比较Python和Java的性能？") == ("比较{slot0}和{slot1}的性能", ["Python", "Java"])
+    assert extract_slots('Compare "redis" and memcached in 2024?') == (
+        "compare {slot0} and memcached in {slot1}", ['"redis"', "2024"],
+    )
+
+
+def test_same_structure_reuses_plan_with_new_entities():
+    cache = PlanCache()
+    cache.set("比较Python和Java的性能", PLAN)
+
+    plan = cache.get("比较Go和Rust的性能")
+    assert [step["step"] for step in plan] == ["查询Go的性能", "查询Rust的性能", "比较两者"]
+    assert plan[2]["deps"] == [1, 2]
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_structure_or_slot_count_misses():
+    cache = PlanCache()
+    cache.set("比较Python和Java的性能", PLAN)
+
+    assert cache.get("比较Go的性能") is None
+    assert cache.get("介绍Python和Java的历史") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_entity_inside_longer_word_is_not_templated():
+    cache = PlanCache()
+    cache.set("介绍Java", [{"id": 1, "step": "查询Java和JavaScript的区别", "deps": []}])
+    assert cache.get("介绍Go")[0]["step"] == "查询Go和JavaScript的区别"
+
+
+def test_similar_questions_hit_only_when_enabled():
+    exact = PlanCache()
+    exact.set("比较Python和Java的性能", PLAN)
+    assert exact.get("请比较一下Go和Rust的性能") is None
+
+    similar = PlanCache(similarity_threshold=0.7)
+    similar.set("比较Python和Java的性能", PLAN)
+    plan = similar.get("请比较一下Go和Rust的性能")
+    assert plan[0]["step"] == "查询Go的性能"
+    assert similar.stats()["similar_hits"] == 1
+
+
+def test_plans_persist_on_disk(tmp_path):
+    path = str(tmp_path / "plans.db")
+    first = PlanCache(disk_path=path)
+    first.set("比较Python和Java的性能", PLAN)
+    first.close()
+
+    second = PlanCache(disk_path=path)
+    assert second.get("比较C和Go的性能")[1]["step"] == "查询Go的性能"
+    second.close()
+
+
+def test_expired_plans_are_not_reused(monkeypatch):
+    cache = PlanCache(ttl=10)
+    cache.set("比较Python和Java的性能", PLAN)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("比较Python和Java的性能") is None
+
+
+def test_planner_skips_the_llm_on_cache_hit():
+    llm = CountingLLM(PLAN_TEXT)
+    planner = Planner(llm, prompt_template="{question}", plan_cache=PlanCache())
+
+    planner.plan("分析Python的性能")
+    plan = planner.plan("分析Java的性能")
+    assert llm.calls == 1
+    assert plan[0]["step"] == "查询Java的性能"
+
+
+def test_streamed_plans_are_cached_only_when_complete():
+    cache = PlanCache()
+    truncated = CountingLLM(PLAN_TEXT[:PLAN_TEXT.index("{\"id\": 2")])
+    assert len(list(Planner(truncated, "{question}", cache).plan_stream("分析Python的性能"))) == 1
+    assert cache.get("分析Python的性能") is None
+
+    complete = CountingLLM(PLAN_TEXT)
+    planner = Planner(complete, "{question}", cache)
+    list(planner.plan_stream("分析Python的性能"))
+    assert [step["step"] for step in planner.plan_stream("分析Go的性能")] == ["查询Go的性能", "汇总"]
+    assert complete.calls == 1
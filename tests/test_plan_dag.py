@@ -0,0 +1,89 @@
+"""PlanAndSolveAgent 依赖图计划的整理与调度测试（离线，使用假 LLM）"""
+import threading
+
+from smart_agents.agents.plan_solve_agent import Executor, PlanAndSolveAgent, Planner, normalize_plan
+
+TEMPLATE = "{question}|{plan}|{history}|当前步骤{current_step}"
+
+
+class EchoLLM:
+    """记录每个步骤收到的依赖结果，回答为 "<步骤>的结果" """
+    model = "fake"
+
+    def __init__(self, plan_text: str = ""):
+        self.plan_text = plan_text
+        self.histories: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        if "当前步骤" not in prompt:
+            return self.plan_text
+        _, _, history, step = prompt.split("|")
+        step = step.removeprefix("当前步骤")
+        with self._lock:
+            self.histories[step] = history
+        return f"{step}的结果"
+
+
+def test_dependencies_on_later_or_unknown_steps_are_dropped():
+    plan = normalize_plan([
+        {"id": 1, "step": "A", "deps": [2]},
+        {"id": 2, "step": "B", "deps": [1, 1, 9]},
+        {"id": 3, "step": "C", "deps": 2},
+    ])
+    assert [step["deps"] for step in plan] == [[], [1], [2]]
+
+
+def test_legacy_string_plan_stays_sequential():
+    plan = normalize_plan(["A", "B", "C"])
+    assert [(step["id"], step["deps"]) for step in plan] == [(1, []), (2, [1]), (3, [1, 2])]
+
+
+def test_missing_or_duplicate_ids_are_renumbered_and_bad_items_skipped():
+    plan = normalize_plan([
+        {"id": 1, "step": "A"},
+        {"id": 1, "task": "B"},
+        {"description": "C", "dependencies": [1]},
+        {"id": 7},
+        42,
+    ])
+    assert [(step["id"], step["step"], step["deps"]) for step in plan] == [(1, "A", []), (2, "B", []), (3, "C", [1])]
+
+
+def test_step_prompt_only_contains_its_dependency_results():
+    llm = EchoLLM()
+    plan = [
+        {"id": 1, "step": "A", "deps": []},
+        {"id": 2, "step": "B", "deps": []},
+        {"id": 3, "step": "C", "deps": [2]},
+    ]
+    assert Executor(llm, TEMPLATE).execute("q", plan) == "C的结果"
+
+    assert llm.histories["A"] == ""
+    assert "B的结果" in llm.histories["C"]
+    assert "A的结果" not in llm.histories["C"]
+
+
+def test_empty_plan_returns_empty_answer():
+    assert Executor(EchoLLM(), TEMPLATE).execute("q", []) == ""
+
+
+def test_planner_parses_plan_without_code_fence():
+    llm = EchoLLM('计划：[{"id": 1, "step": "A", "deps": []}, {"id": 2, "step": "B", "deps": [1]}]')
+    plan = Planner(llm).plan("q")
+    assert [(step["step"], step["deps"]) for step in plan] == [("A", []), ("B", [1])]
+
+
+def test_agent_runs_the_plan_and_records_history():
+    llm = EchoLLM('```python\n[{"id": 1, "step": "查北京", "deps": []}, {"id": 2, "step": "汇总", "deps": [1]}]\n```')
+    agent = PlanAndSolveAgent("planner", llm, custom_prompts={"planner": "{question}", "executor": TEMPLATE})
+
+    assert agent.run("北京怎么样") == "汇总的结果"
+    assert "查北京的结果" in llm.histories["汇总"]
+    assert [message.content for message in agent.get_history()] == ["北京怎么样", "汇总的结果"]
+
+
+def test_agent_reports_unparseable_plan():
+    agent = PlanAndSolveAgent("planner", EchoLLM("我不知道"), custom_prompts={"planner": "{question}", "executor": TEMPLATE})
+    assert agent.run("q") == "无法生成有效的行动计划，任务终止。"
@@ -0,0 +1,120 @@
+"""PlanAndSolveAgent 增量计划解析与依赖调度测试（离线，使用假 LLM）"""
+import time
+import threading
+
+import pytest
+
+from smart_agents.agents.plan_solve_agent import Executor, StreamingPlanParser
+
+PLAN_OUTPUT = '''好的，计划如下：
+```python
+[
+    {"id": 1, "step": "查询 [北京] 的人口, 单位: 万", "deps": []},
+    {"id": 2, "step": "查询上海的人口（含 \\"常住\\" 人口）", "deps": []},
+    {"id": 3, "step": "比较两者, 给出结论", "deps": [1, 2]},
+]
+```
+'''
+
+
+def feed_in_chunks(text: str, size: int) -> tuple[StreamingPlanParser, list[list[dict]]]:
+    parser = StreamingPlanParser()
+    batches = [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return parser, batches
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(PLAN_OUTPUT)])
+def test_streaming_parser_is_independent_of_chunk_boundaries(size):
+    parser, _ = feed_in_chunks(PLAN_OUTPUT, size)
+
+    assert parser.finished
+    assert [step["id"] for step in parser.steps] == [1, 2, 3]
+    assert parser.steps[0]["step"] == "查询 [北京] 的人口, 单位: 万"
+    assert parser.steps[1]["step"] == '查询上海的人口（含 "常住" 人口）'
+    assert parser.steps[2]["deps"] == [1, 2]
+
+
+def test_streaming_parser_emits_each_step_as_soon_as_it_closes():
+    parser = StreamingPlanParser()
+    first_line_end = PLAN_OUTPUT.index("},") + 2
+
+    assert parser.feed(PLAN_OUTPUT[:first_line_end - 2]) == []
+    emitted = parser.feed(PLAN_OUTPUT[first_line_end - 2:first_line_end])
+    assert [step["id"] for step in emitted] == [1]
+
+
+def test_streaming_parser_handles_string_steps_and_skips_bad_elements():
+    parser, _ = feed_in_chunks('```python\n["第一步", not valid, "第二步, 含逗号"]\n```', 4)
+
+    assert [step["step"] for step in parser.steps] == ["第一步", "第二步, 含逗号"]
+    # 旧格式的字符串步骤依赖之前的全部步骤
+    assert parser.steps[1]["deps"] == [1]
+
+
+def test_streaming_parser_waits_for_code_fence():
+    parser = StreamingPlanParser()
+    assert parser.feed("思考中 [不是计划] ...") == []
+    assert not parser.finished
+
+
+class SleepyLLM:
+    """每次调用耗时固定，记录各步骤开始执行的时间"""
+    model = "fake"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.started: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        step = prompt.rsplit("当前步骤", 1)[-1]
+        with self._lock:
+            self.started[step] = time.monotonic()
+        time.sleep(self.delay)
+        return "done"
+
+
+def test_dependent_step_starts_when_dependency_finishes_not_on_next_plan_chunk():
+    llm = SleepyLLM(0.2)
+    executor = Executor(llm, prompt_template="{question}{plan}{history}当前步骤{current_step}")
+
+    def slow_planner():
+        yield {"id": 1, "step": "A", "deps": []}
+        yield {"id": 2, "step": "B", "deps": [1]}
+        # 规划器很久之后才产出下一个步骤
+        time.sleep(1.0)
+        yield {"id": 3, "step": "C", "deps": [2]}
+
+    began = time.monotonic()
+    assert executor.execute_stream("q", slow_planner()) == "done"
+
+    assert llm.started["B"] - began < 0.6
+    assert llm.started["C"] - began >= 1.0
+
+
+def test_independent_steps_run_in_parallel():
+    llm = SleepyLLM(0.3)
+    executor = Executor(llm, prompt_template="{question}{plan}{history}当前步骤{current_step}", max_workers=3)
+    plan = [
+        {"id": 1, "step": "A", "deps": []},
+        {"id": 2, "step": "B", "deps": []},
+        {"id": 3, "step": "C", "deps": [1, 2]},
+    ]
+
+    began = time.monotonic()
+    executor.execute("q", plan)
+
+    assert abs(llm.started["A"] - llm.started["B"]) < 0.1
+    assert time.monotonic() - began < 0.85
+
+
+def test_planner_error_propagates():
+    executor = Executor(SleepyLLM(0.0), prompt_template="{question}{plan}{history}{current_step}")
+
+    def broken_planner():
+        yield {"id": 1, "step": "A", "deps": []}
+        raise RuntimeError("planner failed")
+
+    with pytest.raises(RuntimeError, match="planner failed"):
+        executor.execute_stream("q", broken_planner())
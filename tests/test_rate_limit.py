@@ -0,0 +1,129 @@
+"""TokenBucket / RateLimiter 限流测试"""
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from smart_agents.core import rate_limit
+from smart_agents.core.llm import SmartAgentLLM
+from smart_agents.core.rate_limit import TokenBucket, RateLimiter, DEFAULT_COMPLETION_TOKENS, get_rate_limiter
+
+
+def test_bucket_allows_burst_up_to_capacity_then_reports_wait():
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+
+    assert [bucket.reserve(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 补充速率为 1 个/秒，第 4 个请求需要等待约 1 秒
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    # 预约式扣减：排队者依次顺延
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_bucket_clamps_oversized_requests_to_capacity():
+    bucket = TokenBucket(rate_per_minute=600, capacity=10)
+    assert bucket.reserve(1000) == 0.0
+    assert bucket.available == pytest.approx(0.0, abs=0.5)
+
+
+def test_bucket_refund_is_capped_at_capacity():
+    bucket = TokenBucket(rate_per_minute=60, capacity=5)
+    bucket.reserve(2)
+    bucket.refund(100)
+    assert bucket.available == pytest.approx(5)
+
+
+def test_limiter_throttles_by_requests_per_minute():
+    limiter = RateLimiter(rpm=600)
+    # 每秒补充 10 个请求名额，突发容量限制为 2
+    limiter._requests = TokenBucket(600, capacity=2)
+    request = {"messages": [{"role": "user", "content": "hi"}], "max_tokens": 10}
+
+    began = time.monotonic()
+    for _ in range(3):
+        limiter.acquire(request)
+    assert time.monotonic() - began == pytest.approx(0.1, abs=0.05)
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 3
+    assert stats["throttled"] == 1
+
+
+def test_limiter_estimates_prompt_plus_reserved_output():
+    limiter = RateLimiter(tpm=10_000)
+    request = {"messages": [{"role": "user", "content": "hello world"}]}
+    estimate = limiter.estimate_tokens(request)
+    assert estimate > DEFAULT_COMPLETION_TOKENS
+    assert limiter.estimate_tokens({**request, "max_tokens": 5}) == estimate - DEFAULT_COMPLETION_TOKENS + 5
+
+
+def test_limiter_reconcile_returns_unused_tokens():
+    limiter = RateLimiter(tpm=1000)
+    reserved = limiter.acquire({"messages": [], "max_tokens": 500})
+    before = limiter.stats()["available_tokens"]
+    limiter.reconcile(reserved, actual=100)
+    assert limiter.stats()["available_tokens"] == pytest.approx(before + reserved - 100, abs=1)
+
+
+def test_async_acquire_waits_without_blocking_loop():
+    limiter = RateLimiter(rpm=600)
+    limiter._requests = TokenBucket(600, capacity=1)
+    request = {"messages": [], "max_tokens": 1}
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        began = time.monotonic()
+        await asyncio.gather(limiter.aacquire(request), limiter.aacquire(request), ticker())
+        return began
+
+    began = asyncio.run(main())
+    # 第二个请求等待约 0.1 秒，期间事件循环仍在调度其他协程
+    assert ticks[0] - began < 0.05
+
+
+def test_shared_limiter_per_key_and_disabled_without_config(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+
+    assert get_rate_limiter("provider") is None
+    first = get_rate_limiter("provider", rpm=60)
+    assert get_rate_limiter("provider", rpm=60) is first
+    assert get_rate_limiter("other", rpm=60) is not first
+
+
+def test_limits_are_read_per_provider(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setenv("DEEPSEEK_RPM", "30")
+    monkeypatch.setenv("DEEPSEEK_TPM", "9000")
+    monkeypatch.delenv("VLLM_RPM", raising=False)
+    monkeypatch.delenv("VLLM_TPM", raising=False)
+
+    limiter = get_rate_limiter(("deepseek", "key"), provider="deepseek")
+    assert (limiter.rpm, limiter.tpm) == (30, 9000)
+    # 其他 provider 的配置不会限制本地服务
+    assert get_rate_limiter(("vllm", "key"), provider="vllm") is None
+
+
+class FailingCompletions:
+    def create(self, **request):
+        raise ConnectionError("down")
+
+
+def test_failed_request_refunds_reserved_tokens(monkeypatch):
+    limiter = RateLimiter(tpm=6000)
+    llm = SmartAgentLLM(
+        model="gpt-4o", apiKey="key", baseUrl="http://127.0.0.1:9/v1", provider="custom",
+        max_tokens=1000, rate_limiter=limiter,
+    )
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=FailingCompletions()))
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            llm.invoke([{"role": "user", "content": "hi"}])
+
+    assert limiter.stats()["available_tokens"] == pytest.approx(6000, abs=1)
+    assert limiter.stats()["throttled"] == 0
@@ -0,0 +1,100 @@
+"""ReActAgent 同一步多 Action 并行执行测试"""
+import asyncio
+import threading
+
+from smart_agents.agents.react_agent import ReActAgent
+
+
+class SlowRegistry:
+    """每次调用阻塞到所有调用都已开始，串行执行时会超时"""
+
+    def __init__(self, expected: int):
+        self.barrier = threading.Barrier(expected, timeout=2)
+        self.threads = set()
+
+    def get_tools_description(self):
+        return "- search: 搜索"
+
+    def execute_tool(self, name, tool_input):
+        self.threads.add(threading.get_ident())
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            return "serial"
+        return f"{tool_input}的结果"
+
+
+class ScriptedLLM:
+    model = "fake"
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+
+    def invoke(self, messages, **kwargs):
+        return self.outputs.pop(0)
+
+
+PARALLEL = "Thought: 分别查询\nAction: search[北京]\nAction: search[上海]\nAction: search[广州]"
+FINISH = "Thought: 都查到了\nAction: Finish[完成]"
+
+
+def test_actions_in_one_step_run_concurrently_in_order():
+    registry = SlowRegistry(expected=3)
+    agent = ReActAgent("react", ScriptedLLM([PARALLEL, FINISH]), tool_registry=registry)
+
+    assert agent.run("三地天气") == "完成"
+    assert len(registry.threads) == 3
+    observations = [line for line in agent.current_history if line.startswith("Observation")]
+    assert observations == ["Observation: 北京的结果", "Observation: 上海的结果", "Observation: 广州的结果"]
+
+
+def test_max_parallel_actions_caps_the_step():
+    registry = SlowRegistry(expected=2)
+    agent = ReActAgent("react", ScriptedLLM([PARALLEL, FINISH]), tool_registry=registry, max_parallel_actions=2)
+
+    agent.run("三地天气")
+    actions = [line for line in agent.current_history if line.startswith("Action")]
+    assert actions == ["Action: search[北京]", "Action: search[上海]"]
+
+
+def test_executor_is_closed_after_run():
+    agent = ReActAgent("react", ScriptedLLM([PARALLEL, FINISH]), tool_registry=SlowRegistry(expected=3))
+    executors = []
+    original = agent._execute_actions
+
+    def spy(calls):
+        results = original(calls)
+        executors.append(agent._tool_executor)
+        return results
+
+    agent._execute_actions = spy
+    agent.run("三地天气")
+
+    assert agent._tool_executor is None
+    assert executors[0].executor._shutdown
+
+
+def test_executor_is_closed_when_run_raises():
+    class FailingLLM(ScriptedLLM):
+        def invoke(self, messages, **kwargs):
+            if not self.outputs:
+                raise RuntimeError("boom")
+            return super().invoke(messages, **kwargs)
+
+    agent = ReActAgent("react", FailingLLM([PARALLEL]), tool_registry=SlowRegistry(expected=3))
+    try:
+        agent.run("三地天气")
+    except RuntimeError:
+        pass
+    assert agent._tool_executor is None
+
+
+def test_parallel_actions_work_inside_a_running_event_loop():
+    registry = SlowRegistry(expected=3)
+    agent = ReActAgent("react", ScriptedLLM([PARALLEL, FINISH]), tool_registry=registry)
+
+    async def main():
+        return agent.run("三地天气")
+
+    assert asyncio.run(main()) == "完成"
+    assert agent._tool_executor is None
@@ -0,0 +1,54 @@
+"""ReAct Scratchpad 观察结果压缩测试"""
+from smart_agents.agents.react_agent import ReActAgent, Scratchpad
+from smart_agents.core.tokenizer import Tokenizer
+
+
+def ranked_results(count: int) -> str:
+    return "\n".join(f"result {i}: some filler text for the search hit" for i in range(count))
+
+
+def test_irrelevant_observation_keeps_leading_passages():
+    scratchpad = Scratchpad(question="zzz", max_observation_tokens=30)
+    scratchpad.add_step("search[qqq]", ranked_results(10))
+
+    observation = scratchpad.steps[0]["observation"]
+    assert observation.startswith("result 0")
+    assert "result 9" not in observation
+
+
+def test_relevant_passages_are_kept_in_original_order():
+    observation = "\n".join([
+        "weather is sunny today",
+        "python release notes mention faster startup",
+        "unrelated sports news",
+        "python packaging guide",
+    ] * 5)
+    scratchpad = Scratchpad(question="python release", max_observation_tokens=30)
+    scratchpad.add_step("search[python]", observation)
+
+    kept = scratchpad.steps[0]["observation"].split(" ... ")
+    assert kept and all("python" in passage for passage in kept)
+
+
+def test_old_steps_are_compacted_once():
+    tokenizer = Tokenizer()
+    scratchpad = Scratchpad(question="zzz", tokenizer=tokenizer, keep_recent=1, old_observation_tokens=15)
+    scratchpad.add_step("search[a]", ranked_results(10))
+    scratchpad.add_step("search[b]", "short")
+
+    rendered = scratchpad.render()
+    assert tokenizer.count(scratchpad.steps[0]["compact"]) <= 15
+    assert scratchpad.render() == rendered
+
+
+class NoCallLLM:
+    model = "fake"
+
+    def invoke(self, messages, **kwargs):
+        raise AssertionError("读取 current_history 不应调用 LLM")
+
+
+def test_current_history_is_a_plain_attribute():
+    agent = ReActAgent("react", NoCallLLM(), summarize_steps=True)
+    agent.current_history = ["Action: search[x]"]
+    assert agent.current_history == ["Action: search[x]"]
@@ -0,0 +1,93 @@
+"""ReActAgent 流式模式与停止序列测试"""
+import pytest
+
+from smart_agents.agents.react_agent import ReActAgent, REACT_STOP_SEQUENCES
+
+
+class FakeRegistry:
+    def get_tools_description(self):
+        return "- search: 搜索"
+
+    def execute_tool(self, name, tool_input):
+        return f"{name} result for {tool_input}"
+
+
+class ScriptedLLM:
+    """按轮次返回预设输出，记录每次调用的参数与流式读取进度"""
+    model = "fake"
+
+    def __init__(self, outputs, chunk_size: int = 3):
+        self.outputs = list(outputs)
+        self.chunk_size = chunk_size
+        self.calls = []
+        self.consumed = []
+        self.closed = []
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append(kwargs)
+        return self.outputs.pop(0)
+
+    def stream_invoke(self, messages, **kwargs):
+        self.calls.append(kwargs)
+        text = self.outputs.pop(0)
+        self.consumed.append(0)
+        self.closed.append(False)
+        try:
+            for i in range(0, len(text), self.chunk_size):
+                self.consumed[-1] = i + self.chunk_size
+                yield text[i:i + self.chunk_size]
+        finally:
+            self.closed[-1] = True
+
+
+FINISH = "Thought: 已经知道了\nAction: Finish[答案]"
+
+
+def test_non_streaming_run_sends_no_stop_by_default():
+    llm = ScriptedLLM([FINISH])
+    ReActAgent("react", llm, tool_registry=FakeRegistry()).run("问题")
+    assert "stop" not in llm.calls[0]
+
+
+def test_streaming_run_sends_default_stop_sequences():
+    llm = ScriptedLLM([FINISH])
+    ReActAgent("react", llm, tool_registry=FakeRegistry(), stream=True).run("问题")
+    assert llm.calls[0]["stop"] == REACT_STOP_SEQUENCES
+
+
+def test_explicit_stop_sequences_are_opt_in_for_both_paths():
+    llm = ScriptedLLM([FINISH])
+    ReActAgent("react", llm, tool_registry=FakeRegistry(), stop_sequences=["\nObs"]).run("问题")
+    assert llm.calls[0]["stop"] == ["\nObs"]
+
+
+def test_stream_stops_reading_once_action_line_is_complete():
+    rambling = "Thought: 查一下\nAction: search[天气]\nThought: 我猜结果是晴天，" + "继续编造" * 50
+    llm = ScriptedLLM([rambling, FINISH])
+    agent = ReActAgent("react", llm, tool_registry=FakeRegistry(), stream=True)
+
+    assert agent.run("今天天气") == "答案"
+    assert llm.consumed[0] < len(rambling) // 2
+    assert llm.closed[0]
+    assert agent.current_history[:2] == ["Action: search[天气]", "Observation: search result for 天气"]
+
+
+def test_stream_cuts_hallucinated_observation():
+    llm = ScriptedLLM([])
+    agent = ReActAgent("react", llm, stream=True)
+    llm.outputs = ["Thought: t\nAction: search[a]\nObservation: 编造的结果"]
+    # 单个分片同时包含 Action 与编造的 Observation
+    llm.chunk_size = 1000
+    assert agent._stream_output([]) == "Thought: t\nAction: search[a]"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Thought: t\nAction: Finish[done]", "Thought: t\nAction: Finish[done]"),
+    ("Thought: t\nAction: Finish[do", None),
+    ("Thought: t\nAction: search[a]", None),  # 可能还有并行的 Action
+    ("Thought: t\nAction: search[a]\nAct", None),
+    ("Thought: t\nAction: search[a]\nAction: search[b]\nThought", "Thought: t\nAction: search[a]\nAction: search[b]"),
+])
+def test_complete_action_line(text, expected):
+    agent = ReActAgent("react", ScriptedLLM([]))
+    assert agent._complete_action_line(text) == expected
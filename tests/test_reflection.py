@@ -0,0 +1,100 @@
+"""ReflectionAgent 修改块应用与收敛检测测试"""
+import pytest
+
+from smart_agents.agents.reflection_agent import (
+    ReflectionAgent, ConvergenceDetector, apply_patch_blocks, parse_patch_blocks, changed_tokens, parse_score,
+)
+
+ORIGINAL = """def add(a, b):
+    return a - b
+
+
+def mul(a, b):
+    return a * b
+"""
+
+
+def test_parse_and_apply_patch_blocks():
+    response = """修改如下：
+<<<<<<< SEARCH
+    return a - b
+=======
+    return a + b
+>>>>>>> REPLACE
+"""
+    blocks = parse_patch_blocks(response)
+    assert blocks == [("    return a - b", "    return a + b")]
+    assert apply_patch_blocks(ORIGINAL, blocks) == ORIGINAL.replace("a - b", "a + b")
+
+
+def test_blocks_apply_in_order_against_updated_text():
+    blocks = [("return a - b", "return a + b"), ("return a + b", "return b + a")]
+    assert "return b + a" in apply_patch_blocks(ORIGINAL, blocks)
+
+
+def test_whitespace_tolerant_match():
+    assert "return a + b" in apply_patch_blocks(ORIGINAL, [("\n    return a - b\n\n", "    return a + b")])
+
+
+@pytest.mark.parametrize("blocks, message", [
+    ([], "未找到修改块"),
+    ([("   ", "x")], "SEARCH 部分为空"),
+    ([("not present", "x")], "匹配到 0 处"),
+    ([("return a", "x")], "匹配到 2 处"),
+    ([(ORIGINAL, "")], "回答为空"),
+])
+def test_unapplicable_blocks_raise(blocks, message):
+    with pytest.raises(ValueError, match=message):
+        apply_patch_blocks(ORIGINAL, blocks)
+
+
+def test_parse_score():
+    assert parse_score("评分: 7/10\n问题如下") == 7.0
+    assert parse_score("Score: 8.5 / 10") == 8.5
+    assert parse_score("无需改进") == 10.0
+    assert parse_score("没有评分") is None
+
+
+def test_localized_fix_in_long_answer_is_not_convergence():
+    code = "\n".join(f"def f{i}(a, b):\n    return a + b * {i}\n" for i in range(60))
+    fixed = code.replace("    return a + b * 7", "    if b is None:\n        return a\n    return a - b * 7")
+
+    assert changed_tokens(code, fixed) >= 3
+    assert not ConvergenceDetector().converged(code, fixed)
+    assert ConvergenceDetector().converged(code, code + " ")
+
+
+def test_score_plateau_needs_patience_rounds():
+    detector = ConvergenceDetector(min_score_delta=0.5, patience=2)
+    assert not detector.plateaued(6)
+    assert not detector.plateaued(6.2)
+    assert detector.plateaued(6.3)
+
+
+class ScriptedLLM:
+    model = "fake"
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        if "审查" in prompt:
+            return "需要补充细节"
+        return f"版本 {len(self.prompts)}: " + "内容 " * len(self.prompts)
+
+
+def test_default_agent_keeps_original_prompt_and_runs_all_iterations():
+    llm = ScriptedLLM()
+    agent = ReflectionAgent("reflector", llm, max_iterations=2)
+    agent.run("写一段介绍")
+
+    assert agent.last_run_stats["stop_reason"] == "max_iterations"
+    assert not any("评分: X/10" in prompt for prompt in llm.prompts)
+
+
+def test_convergence_adds_score_instruction_to_reflect_prompt():
+    llm = ScriptedLLM()
+    ReflectionAgent("reflector", llm, max_iterations=1, convergence=True).run("写一段介绍")
+    assert any("审查" in prompt and "评分: X/10" in prompt for prompt in llm.prompts)
@@ -0,0 +1,97 @@
+"""ReflectionAgent 多候选 + 多评审测试"""
+import itertools
+import threading
+
+import pytest
+
+from smart_agents.agents.reflection_agent import ReflectionAgent
+
+PROMPTS = {
+    "initial": "生成:{task}",
+    "reflect": "反思:{content}",
+    "refine": "优化:{last_attempt}|{feedback}",
+}
+CRITICS = {
+    "accuracy": "准确性:{content}",
+    "style": "风格:{content}",
+}
+
+
+class CandidateLLM:
+    """候选依次取自 candidates，评审意见由 reviews[(评审员, 候选)] 给出"""
+    model = "fake"
+
+    def __init__(self, candidates, reviews, barrier=None):
+        self.candidates = iter(candidates)
+        self.reviews = reviews
+        self.barrier = barrier
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.prompts.append(prompt)
+            if prompt.startswith("生成:"):
+                return next(self.candidates)
+        if prompt.startswith("优化:"):
+            return "优化后的回答"
+        if prompt.startswith("反思:"):
+            return "无需改进"
+        if self.barrier is not None:
+            self.barrier.wait()
+        critic, content = prompt.split(":", 1)
+        return self.reviews[(critic, content)]
+
+
+def make_agent(llm, candidates=3, **kwargs):
+    return ReflectionAgent(
+        "reflector", llm, custom_prompts=PROMPTS, critic_prompts=CRITICS, num_candidates=candidates, **kwargs
+    )
+
+
+def test_best_candidate_is_refined_with_only_the_critics_that_want_changes():
+    llm = CandidateLLM(["A", "B", "C"], {
+        ("准确性", "A"): "评分: 5/10\n有错误", ("风格", "A"): "评分: 6/10\n啰嗦",
+        ("准确性", "B"): "评分: 9/10\n缺少来源", ("风格", "B"): "无需改进",
+        ("准确性", "C"): "评分: 7/10\n一般", ("风格", "C"): "评分: 7/10\n一般",
+    })
+    agent = make_agent(llm, max_iterations=2)
+
+    assert agent.run("任务") == "优化后的回答"
+    refine = next(prompt for prompt in llm.prompts if prompt.startswith("优化:"))
+    assert refine.startswith("优化:B|")
+    assert "【accuracy】" in refine and "缺少来源" in refine
+    assert "【style】" not in refine
+
+
+def test_stops_without_refining_when_every_critic_approves_the_best():
+    llm = CandidateLLM(["A", "B"], {
+        ("准确性", "A"): "评分: 4/10\n错误", ("风格", "A"): "评分: 4/10\n错误",
+        ("准确性", "B"): "无需改进", ("风格", "B"): "无需改进",
+    })
+    agent = make_agent(llm, candidates=2)
+
+    assert agent.run("任务") == "B"
+    assert agent.last_run_stats["stop_reason"] == "no_improvement_needed"
+    assert not any(prompt.startswith(("优化:", "反思:")) for prompt in llm.prompts)
+
+
+def test_duplicate_and_empty_candidates_are_reviewed_once():
+    llm = CandidateLLM(["A", "", "A"], {("准确性", "A"): "无需改进", ("风格", "A"): "无需改进"})
+    make_agent(llm).run("任务")
+    assert len([prompt for prompt in llm.prompts if not prompt.startswith("生成:")]) == 2
+
+
+def test_critics_review_all_candidates_concurrently():
+    reviews = {(critic, content): "无需改进" for critic, content in itertools.product(["准确性", "风格"], "AB")}
+    # 4 次评审必须同时进行才能通过屏障
+    llm = CandidateLLM(["A", "B"], reviews, barrier=threading.Barrier(4, timeout=2))
+    assert make_agent(llm, candidates=2).run("任务") in ("A", "B")
+
+
+def test_all_empty_candidates_raise_instead_of_returning_empty_answer():
+    agent = make_agent(CandidateLLM(["", "", ""], {}))
+    with pytest.raises(RuntimeError, match="候选均为空"):
+        agent.run("任务")
+    assert agent.get_history() == []
@@ -0,0 +1,84 @@
+"""HedgePolicy 对冲请求测试"""
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+from smart_agents.core.resilience import HedgePolicy
+
+
+def warmed_policy(latency: float = 0.05, **config) -> HedgePolicy:
+    policy = HedgePolicy(min_samples=5, **config)
+    for _ in range(5):
+        policy.record(latency)
+    return policy
+
+
+def test_no_hedge_before_enough_samples():
+    policy = HedgePolicy(min_samples=5)
+    assert policy.call(lambda: "ok") == "ok"
+    assert policy.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    policy = warmed_policy()
+
+    def primary():
+        time.sleep(1.0)
+        return "primary"
+
+    began = time.monotonic()
+    assert policy.call(primary, lambda: "hedge") == "hedge"
+    assert time.monotonic() - began < 0.5
+    assert policy.stats()["hedge_wins"] == 1
+
+
+def test_concurrent_load_does_not_trigger_hedges():
+    policy = warmed_policy(latency=0.1)
+    calls = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            calls.append(1)
+        time.sleep(0.1)
+        return "ok"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=64) as pool:
+        assert list(pool.map(lambda _: policy.call(request), range(64))) == ["ok"] * 64
+
+    # 排队时间不计入对冲计时，且进行中的对冲数量有上限
+    assert len(calls) - 64 <= policy.max_in_flight
+
+
+def test_hedges_in_flight_are_capped():
+    policy = warmed_policy(max_in_flight=1)
+    release = threading.Event()
+
+    def stuck():
+        release.wait(2)
+        return "late"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(policy.call, stuck) for _ in range(3)]
+        time.sleep(0.3)
+        release.set()
+        assert [future.result() for future in futures] == ["late"] * 3
+
+    stats = policy.stats()
+    assert stats["hedged"] == 1
+    assert stats["hedges_skipped"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_async_hedge():
+    policy = warmed_policy()
+
+    async def slow():
+        await asyncio.sleep(1.0)
+        return "primary"
+
+    async def fast():
+        return "hedge"
+
+    assert asyncio.run(policy.acall(slow, fast)) == "hedge"
@@ -0,0 +1,66 @@
+"""SemanticCache 近似命中测试"""
+import pytest
+
+from smart_agents.core.semantic_cache import SemanticCache, key_tokens
+
+
+@pytest.fixture
+def cache() -> SemanticCache:
+    cache = SemanticCache()
+    cache.add("qa", "What is the capital of France?", "Paris")
+    cache.add("qa", "请计算 123 乘以 456", "56088")
+    cache.add("qa", "reverse a list in Python", "list[::-1]")
+    cache.add("zh", "法国的首都在哪里", "巴黎")
+    cache.add("zh", "黑洞是怎么形成的", "恒星坍缩")
+    cache.add("zh", "TCP和UDP的区别", "连接与可靠性")
+    return cache
+
+
+@pytest.mark.parametrize("question", [
+    "What is the capital of Spain?",
+    "请计算 123 乘以 457",
+    "reverse a list in Java",
+])
+def test_different_entities_or_numbers_do_not_hit(cache, question):
+    assert cache.lookup("qa", question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "德国的首都在哪里",
+    "法国的人口是多少",
+    "黑洞是怎么消失的",
+    "TCP和IP的区别",
+])
+def test_chinese_entity_or_predicate_changes_do_not_hit(cache, question):
+    assert cache.lookup("zh", question) is None
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("法国的首都是哪里", "巴黎"),
+    ("法国的首都在哪里呢", "巴黎"),
+    ("TCP和UDP有什么区别", "连接与可靠性"),
+])
+def test_chinese_rewording_hits(cache, question, answer):
+    hit = cache.lookup("zh", question)
+    assert hit is not None and hit[0] == answer
+
+
+def test_near_duplicate_hits(cache):
+    hit = cache.lookup("qa", "what is the capital of France")
+    assert hit is not None and hit[0] == "Paris"
+
+
+def test_namespaces_are_isolated(cache):
+    assert cache.lookup("other", "What is the capital of France?") is None
+
+
+def test_key_token_check_can_be_disabled():
+    cache = SemanticCache(threshold=0.9, match_key_tokens=False)
+    cache.add("qa", "What is the capital of France?", "Paris")
+    assert cache.lookup("qa", "What is the capital of Spain?") is not None
+
+
+def test_key_tokens_ignore_stopwords_and_case():
+    assert key_tokens("What's the capital of France?") == key_tokens("what is THE capital of france")
+    assert key_tokens("版本 3.11 的新特性") == frozenset({"3.11", "版", "本", "新", "特", "性"})
+    assert key_tokens("请问法国的首都在哪里") == key_tokens("法国首都是哪儿")
@@ -0,0 +1,99 @@
+"""SimpleAgent 流式工具标签识别与工具调用超时测试"""
+import time
+
+import pytest
+
+from smart_agents.agents.simple_agent import SimpleAgent
+
+
+class ChunkedLLM:
+    """按给定分片流式返回文本"""
+    model = "fake"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream_invoke(self, messages, **kwargs):
+        yield from self.chunks
+
+
+def make_agent(chunks) -> SimpleAgent:
+    agent = SimpleAgent("assistant", ChunkedLLM(chunks))
+    agent._execute_tool_call = lambda name, parameters: f"{name}({parameters})"
+    return agent
+
+
+def split_every(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+RESPONSE = "先查一下[TOOL_CALL:search:Python 3.13]，再算[TOOL_CALL:calculator:2*(3+4)]。数组 a[0] 不是工具。"
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 11, len(RESPONSE)])
+def test_tags_are_detected_across_any_chunk_boundary(size):
+    agent = make_agent(split_every(RESPONSE, size))
+    submitted = []
+    text = "".join(agent._stream_segment([], submitted))
+
+    assert "[TOOL_CALL:" not in text
+    assert text == "先查一下，再算。数组 a[0] 不是工具。"
+    calls = [call for call, _ in submitted]
+    assert calls[0]["tool_name"] == "search"
+    assert calls[0]["parameters"] == "Python 3.13"
+    assert (calls[1]["tool_name"], calls[1]["parameters"]) == ("calculator", "2*(3+4)")
+    assert agent._collect_tool_results(submitted)[0] == "search(Python 3.13)"
+
+
+def test_text_before_a_tag_is_yielded_before_the_tag_closes():
+    agent = make_agent(["答案是", "[TOOL_CA", "LL:search:x]", "完毕"])
+    stream = agent._stream_segment([], [])
+    assert next(stream) == "答案是"
+
+
+def test_partial_prefix_at_end_of_stream_is_flushed():
+    agent = make_agent(["结尾是 [TOOL"])
+    assert "".join(agent._stream_segment([], [])) == "结尾是 [TOOL"
+
+
+def test_tags_pass_through_when_tools_disabled():
+    agent = make_agent(split_every(RESPONSE, 3))
+    assert "".join(agent._stream_segment([], None)) == RESPONSE
+
+
+def sleepy_agent(delay: float, workers: int, timeout: float) -> SimpleAgent:
+    agent = SimpleAgent("assistant", ChunkedLLM([]), max_tool_workers=workers, tool_timeout=timeout)
+    agent._execute_tool_call = lambda name, parameters: (time.sleep(delay), f"ok {parameters}")[1]
+    return agent
+
+
+def tool_calls(count: int) -> list[dict]:
+    return [{"tool_name": "slow", "parameters": str(i)} for i in range(count)]
+
+
+def test_queue_time_does_not_count_against_tool_timeout():
+    agent = sleepy_agent(delay=0.3, workers=2, timeout=0.5)
+    assert agent._execute_tool_calls(tool_calls(4)) == ["ok 0", "ok 1", "ok 2", "ok 3"]
+
+
+def test_runaway_calls_do_not_block_later_calls():
+    agent = sleepy_agent(delay=2.0, workers=2, timeout=0.1)
+    began = time.monotonic()
+    results = agent._execute_tool_calls(tool_calls(4))
+    assert all("超时" in result for result in results)
+    assert time.monotonic() - began < 1.0
+
+    # 线程池被超时调用占满后换用新的线程池，后续调用不受影响
+    agent._execute_tool_call = lambda name, parameters: f"ok {parameters}"
+    began = time.monotonic()
+    assert agent._execute_tool_calls(tool_calls(2)) == ["ok 0", "ok 1"]
+    assert time.monotonic() - began < 0.2
+
+
+def test_submitted_call_records_its_start_time():
+    agent = sleepy_agent(delay=0.0, workers=1, timeout=1.0)
+    before = time.monotonic()
+    future, started = agent._submit_tool_call(tool_calls(1)[0])
+    assert future.result(timeout=1) == "ok 0"
+    assert started.wait(timeout=0)
+    assert before <= started.started_at <= time.monotonic()
@@ -0,0 +1,80 @@
+"""SingleFlight 请求合并测试"""
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+import pytest
+
+from smart_agents.core.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_execute_once():
+    flight = SingleFlight()
+    executions = []
+    gate = threading.Event()
+
+    def fetch():
+        executions.append(1)
+        gate.wait(1)
+        return "result"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "key", fetch) for _ in range(8)]
+        time.sleep(0.1)
+        gate.set()
+        results = [future.result() for future in futures]
+
+    assert results == ["result"] * 8
+    assert len(executions) == 1
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 7
+    assert stats["in_flight"] == 0
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["executions"] == 2
+
+
+def test_followers_receive_leader_exception_and_key_is_released():
+    flight = SingleFlight()
+    gate = threading.Event()
+
+    def failing():
+        gate.wait(1)
+        raise ValueError("upstream")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, "key", failing) for _ in range(4)]
+        time.sleep(0.1)
+        gate.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="upstream"):
+                future.result()
+
+    # 失败后不缓存结果，下一次调用重新执行
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_async_calls_are_coalesced_and_survive_caller_cancellation():
+    flight = SingleFlight()
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        cancelled = asyncio.create_task(flight.do_async("key", fetch))
+        others = [asyncio.create_task(flight.do_async("key", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(main()) == ["result"] * 3
+    assert len(executions) == 1
@@ -0,0 +1,140 @@
+"""Tokenizer 计数与 ContextBudget 上下文预算测试"""
+import pytest
+
+from smart_agents.agents.react_agent import ReActAgent
+from smart_agents.agents.simple_agent import SimpleAgent
+from smart_agents.core.config import Config
+from smart_agents.core.message import Message
+from smart_agents.core.tokenizer import (
+    ContextBudget, Tokenizer, TRUNCATION_SUFFIX, estimate_tokens, get_context_window,
+)
+
+
+def test_estimate_counts_cjk_per_character():
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_truncate_respects_budget_and_marks_cut():
+    tokenizer = Tokenizer("gpt-4o")
+    text = "token budget " * 200
+    truncated = tokenizer.truncate(text, 50)
+    assert tokenizer.count(truncated) <= 50
+    assert truncated.endswith(TRUNCATION_SUFFIX)
+    assert tokenizer.truncate("short", 50) == "short"
+
+
+def test_message_token_count_is_cached_until_content_changes():
+    tokenizer = Tokenizer("gpt-4o")
+    message = Message("hello world", "user")
+    first = message.token_count(tokenizer)
+    assert message.token_count(tokenizer) == first
+    message.content = "hello world " * 10
+    assert message.token_count(tokenizer) > first
+
+
+def test_context_window_lookup_uses_prefix_and_default():
+    assert get_context_window("gpt-4o-2024-08-06") == 128000
+    assert get_context_window("unknown-model") == 8192
+
+
+def test_fit_keeps_required_parts_and_newest_history():
+    budget = ContextBudget(model="gpt-4o", context_window=300, reserve_output=100)
+    history = [{"role": "user", "content": f"message {i} " + "filler " * 20} for i in range(10)]
+
+    fitted = budget.fit(system_prompt="system", question="question", history=history)
+
+    assert fitted["history"] == history[-len(fitted["history"]):]
+    assert 0 < fitted["dropped_history"] < 10
+    assert fitted["total_tokens"] <= budget.available
+
+
+def test_fit_truncates_tools_before_observations():
+    budget = ContextBudget(model="gpt-4o", context_window=400, reserve_output=100)
+    fitted = budget.fit(question="q", tools="tool " * 1000, observations=["obs"])
+
+    assert fitted["tools"].endswith(TRUNCATION_SUFFIX)
+    assert fitted["observations"] == []
+
+
+def test_fit_caps_each_observation_and_prefers_recent_ones():
+    budget = ContextBudget(model="gpt-4o", context_window=400, reserve_output=100)
+    observations = ["old " * 300, "new " * 300]
+
+    fitted = budget.fit(question="q", observations=observations, max_observation_tokens=60)
+
+    old, new = fitted["observations"]
+    assert new.startswith("new") and old.startswith("old")
+    assert budget.tokenizer.count(new) <= 60 and budget.tokenizer.count(old) <= 60
+
+    tight = ContextBudget(model="gpt-4o", context_window=180, reserve_output=100).fit(question="q", observations=observations)
+    assert len(tight["observations"]) == 1 and tight["observations"][0].startswith("new")
+
+
+class RecordingLLM:
+    """记录请求消息的 LLM 替身"""
+    model = "gpt-4o"
+    max_tokens = 100
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def context_budget(self, reserve_output=None, context_window=None):
+        return ContextBudget(model=self.model, context_window=context_window, reserve_output=self.max_tokens)
+
+    def invoke(self, messages, **kwargs):
+        self.requests.append(messages)
+        return self.replies.pop(0)
+
+
+def test_simple_agent_drops_oldest_history_to_fit_context_window():
+    llm = RecordingLLM(["answer"])
+    agent = SimpleAgent("assistant", llm, config=Config(context_window=400))
+    for i in range(20):
+        agent.add_message(Message(f"turn {i} " + "filler " * 20, "user" if i % 2 == 0 else "assistant"))
+
+    agent.run("latest question")
+
+    messages = llm.requests[0]
+    assert messages[0]["role"] == "system"
+    assert messages[-1]["content"] == "latest question"
+    assert messages[-2]["content"].startswith("turn 19")
+    assert not any(message["content"].startswith("turn 0 ") for message in messages)
+    assert Tokenizer("gpt-4o").count_messages(messages) <= 300
+
+
+def test_simple_agent_truncates_tool_results_to_remaining_budget():
+    llm = RecordingLLM(["[TOOL_CALL:search:x]", "done"])
+    agent = SimpleAgent("assistant", llm, config=Config(context_window=600))
+    agent.enable_tool_calling = True
+    agent.tool_registry = object()
+    agent._get_tools_section = lambda: ""
+    agent._execute_tool_call = lambda name, parameters: "result " * 2000
+
+    assert agent.run("question") == "done"
+    assert Tokenizer("gpt-4o").count_messages(llm.requests[1]) <= 500
+
+
+class FakeRegistry:
+    def get_tools_description(self):
+        return "- search: 搜索"
+
+    def execute_tool(self, name, tool_input):
+        return f"observation for {tool_input} " + "detail " * 150
+
+
+def test_react_prompt_keeps_recent_steps_within_budget():
+    replies = [f"Thought: step {i}\nAction: search[q{i}]" for i in range(6)] + ["Thought: done\nAction: Finish[ok]"]
+    llm = RecordingLLM(replies)
+    agent = ReActAgent(
+        "react", llm, tool_registry=FakeRegistry(), config=Config(context_window=1500),
+        max_steps=8, keep_recent_steps=10,
+    )
+
+    assert agent.run("question") == "ok"
+
+    last_prompt = llm.requests[-1][0]["content"]
+    assert Tokenizer("gpt-4o").count(last_prompt) <= 1400
+    assert "search[q5]" in last_prompt
+    assert "search[q0]" not in last_prompt
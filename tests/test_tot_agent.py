@@ -0,0 +1,139 @@
+"""TreeOfThoughtsAgent 束搜索与 token 预算测试"""
+import time
+import itertools
+import threading
+
+import pytest
+
+from smart_agents.agents.tot_agent import TreeOfThoughtsAgent
+
+PROMPTS = {
+    "propose": "扩展|{steps}",
+    "evaluate": "评估|{steps}",
+    "answer": "作答|{steps}",
+}
+
+
+class SearchLLM:
+    """
+    扩展时依次给出 thoughts 中的候选，评估时按 scores 中出现在路径末尾的关键字打分
+
+    delay 模拟调用耗时，使并发调用的预留相互重叠；on_call 在每次调用开始时执行
+    """
+    model = "fake"
+
+    def __init__(self, thoughts, scores, max_tokens=None, fail_on=None, delay=0.0, on_call=None):
+        self.thoughts = itertools.cycle(thoughts)
+        self.scores = scores
+        self.max_tokens = max_tokens
+        self.fail_on = fail_on
+        self.delay = delay
+        self.on_call = on_call
+        self.prompts = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            thought = next(self.thoughts) if prompt.startswith("扩展") else None
+        try:
+            if self.on_call is not None:
+                self.on_call(prompt)
+            time.sleep(self.delay)
+            if self.fail_on and self.fail_on in prompt:
+                raise RuntimeError("boom")
+            if thought is not None:
+                return thought
+            if prompt.startswith("作答"):
+                return "综合作答"
+            last = prompt.rsplit("\n", 1)[-1]
+            score = next((value for key, value in self.scores.items() if key in last), 5)
+            return f"评分: {score}/10"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def make_agent(llm, **kwargs):
+    return TreeOfThoughtsAgent("tot", llm, custom_prompts=PROMPTS, **kwargs)
+
+
+def test_high_scoring_final_answer_stops_the_search():
+    llm = SearchLLM(["思路甲", "思路乙", "最终答案: 42"], {"思路甲": 6, "思路乙": 2, "42": 9})
+    agent = make_agent(llm, breadth=3, beam_width=2, max_depth=4, token_budget=None)
+
+    assert agent.run("问题") == "42"
+    stats = agent.last_run_stats
+    assert stats["stop_reason"] == "accepted"
+    assert stats["depth"] == 1
+    assert stats["pruned"] == 1  # 思路乙低于剪枝阈值
+
+
+def test_beam_keeps_only_the_best_nodes():
+    llm = SearchLLM(["A", "B", "C"], {"A": 9, "B": 7, "C": 4})
+    agent = make_agent(llm, breadth=3, beam_width=2, max_depth=2, token_budget=None)
+    agent.run("问题")
+
+    second_layer = [prompt for prompt in llm.prompts if prompt.startswith("扩展|1.")]
+    assert {prompt.split("\n")[0] for prompt in second_layer} == {"扩展|1. A", "扩展|1. B"}
+    assert len(second_layer) == 6
+
+
+def test_without_final_answer_best_path_is_answered_directly():
+    llm = SearchLLM(["A"], {"A": 6})
+    agent = make_agent(llm, breadth=1, beam_width=1, max_depth=2, token_budget=None)
+
+    assert agent.run("问题") == "综合作答"
+    assert agent.last_run_stats["stop_reason"] == "max_depth"
+    assert llm.prompts[-1].startswith("作答|1. A\n2. A")
+
+
+def test_expansions_run_concurrently():
+    llm = SearchLLM(["A", "B", "C", "D"], {}, delay=0.05)
+    make_agent(llm, breadth=4, beam_width=1, max_depth=1, token_budget=None, max_concurrency=4).run("问题")
+    assert llm.peak > 1
+
+
+def test_concurrent_calls_never_reserve_past_the_budget():
+    in_flight = []
+
+    def check_budget(prompt):
+        # 每次调用开始时，已结算与正在进行的调用的预留合计不超过预算
+        if not prompt.startswith("作答"):
+            in_flight.append(agent._tokens_used)
+
+    llm = SearchLLM(["A", "B", "C", "D"], {}, max_tokens=100, delay=0.05, on_call=check_budget)
+    agent = make_agent(llm, breadth=4, beam_width=4, max_depth=3, token_budget=500, max_concurrency=8)
+
+    assert agent.run("问题") == "综合作答"
+    stats = agent.last_run_stats
+    assert stats["stop_reason"] == "token_budget"
+    assert stats["skipped_calls"] > 0
+    assert in_flight and max(in_flight) <= 500
+    # 每次调用至少预留 100 个输出 token，同一批并发调用中最多 4 个能进入预算
+    assert llm.peak <= 4
+
+
+def test_reservation_is_reconciled_to_actual_usage():
+    llm = SearchLLM(["最终答案: 1"], {"1": 9}, max_tokens=1000)
+    agent = make_agent(llm, breadth=1, beam_width=1, max_depth=1, token_budget=None)
+    agent.run("问题")
+
+    expected = sum(
+        agent.tokenizer.count_messages([{"role": "user", "content": prompt}]) for prompt in llm.prompts
+    ) + agent.tokenizer.count("最终答案: 1") + agent.tokenizer.count("评分: 9/10")
+    assert agent.last_run_stats["tokens_used"] == expected
+
+
+def test_failed_call_releases_its_reservation():
+    llm = SearchLLM(["A"], {}, max_tokens=1000, fail_on="扩展")
+    agent = make_agent(llm, breadth=1, beam_width=1, max_depth=1, token_budget=1500)
+
+    with pytest.raises(RuntimeError):
+        agent.run("问题")
+    assert agent._tokens_used == 0